@@ -13,18 +13,131 @@ _
 """
 
 
+import sys
 import json
+from array import array
 from random import choice
 from Const import *
-from typing import Dict, List, Optional
-from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from dataclasses import dataclass, field, fields
 
 
+def slotted(cls):
+    """
+    为 dataclass 添加 __slots__ (dataclass 的 slots 参数需要 Python 3.10)
+    需放在 @dataclass 之上
+    """
+    names = tuple(f.name for f in fields(cls))
+    namespace = dict(cls.__dict__)
+    namespace["__slots__"] = names
+    for name in names:
+        namespace.pop(name, None)
+    namespace.pop("__dict__", None)
+    namespace.pop("__weakref__", None)
+    return type(cls)(cls.__name__, cls.__bases__, namespace)
+
+
+class CodeTable:
+    """
+    字符串编码表
+    将字符串驻留并映射为从 0 开始的连续整数编码
+    """
+    def __init__(self) -> None:
+        self.codes: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def code(self, value: str) -> int:
+        """
+        返回字符串的编码, 不存在时分配新编码
+        """
+        code = self.codes.get(value)
+        if code is None:
+            value = sys.intern(value)
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def intern(self, value: str) -> str:
+        """
+        返回表中与 value 相等的唯一字符串对象
+        """
+        return self.values[self.code(value)]
+
+    def value(self, code: int) -> str:
+        return self.values[code]
+
+
+class TagSet(int):
+    """
+    标签集合
+    以整数位掩码表示卡片或抽卡结果所属的标签组 (标签位见 Const.TAG_FLAGS, 只支持其中的标签), 不可变
+    支持 tag in tags / 迭代 / len, 可直接与标签位进行 & | 运算
+    *写入 json 等外部数据时使用 to_list / from_tags 转换
+    """
+    __slots__ = ()
+
+    @staticmethod
+    def flag(tag: str) -> int:
+        """
+        返回标签对应的标签位, 未知标签抛出 ValueError
+        """
+        flag = TAG_FLAGS.get(tag)
+        if flag is None:
+            raise ValueError(f"TagSet: 未知标签 '{tag}', 可用标签: {list(TAG_FLAGS)}")
+        return flag
+
+    @staticmethod
+    def from_tags(tags) -> "TagSet":
+        mask = 0
+        for tag in tags:
+            mask |= TagSet.flag(tag)
+        return TagSet(mask)
+
+    def __contains__(self, tag: str) -> bool:
+        return bool(self & TAG_FLAGS.get(tag, 0))
+
+    def __iter__(self):
+        for tag, flag in TAG_FLAGS.items():
+            if self & flag:
+                yield tag
+
+    def __len__(self) -> int:
+        return bin(self).count("1")
+
+    def __or__(self, other: int) -> "TagSet":
+        return TagSet(int(self) | other)
+
+    __ror__ = __or__
+
+    def __str__(self) -> str:
+        return str(self.to_list())
+
+    def __repr__(self) -> str:
+        return f"TagSet({self.to_list()})"
+
+    def add(self, tag: str) -> "TagSet":
+        """
+        返回加入 tag 后的标签集合
+        """
+        return self | TagSet.flag(tag)
+
+    def to_list(self) -> List[str]:
+        return list(self)
+
+
+STANDARD_TAGS = TagSet(FLAG_STANDARD)       # 只含常驻组的标签集合
+
+
+@slotted
 @dataclass
 class Card:
     """
     卡片类，封装卡片的各种属性
     每个卡片都是全局单例
+    id 为 CardSystem 分配的卡片编号, 未注册的卡片为 -1, 不参与比较
     """
     content: str            # 卡片内容
     game: str               # 卡片所属游戏
@@ -34,6 +147,7 @@ class Card:
     title: str = ""         # 卡片称号，用于抽卡界面显示
     profession: str = ""    # 卡片职业类型  智识/单手剑/击破
     image_path: str = ""    # 图片路径
+    id: int = field(default=-1, compare=False, repr=False)     # 卡片编号
     
     def __str__(self) -> str:
         return f"Card({self.content}, {self.star}, {self.type}, {self.attribute}, {self.profession}, {self.image_path})"
@@ -93,10 +207,13 @@ class PackedCard:
     """
     对卡片的二次封装，用于在抽卡时使用
     """
-    def __init__(self, card: Card, real_tag: str = TAG_STANDARD, tags: List[str] = [TAG_STANDARD], rarity: str = ""):
+    __slots__ = ("card", "real_tag", "tags", "rarity", "rarity_using_star", "rarity_color")
+
+    def __init__(self, card: Card, real_tag: str = TAG_STANDARD, tags: TagSet = STANDARD_TAGS, rarity: str = ""):
         self.card = card                # 卡片对象
         self.real_tag = real_tag        # 卡片被抽出时，所属的标签组
-        self.tags = tags                # 卡片所属的所有标签组
+        # 卡片所属的所有标签组
+        self.tags = tags if isinstance(tags, TagSet) else TagSet.from_tags(tags)
         self.rarity = rarity            # 卡片稀有度映射
         self.rarity_using_star = True   # 是否使用星级表示稀有度
         self.rarity_color = ""          # 稀有度代表色
@@ -124,6 +241,11 @@ class SingleTagCardGroup:
 
         # 排除的卡片，抽卡将不抽出这些卡片，同时也不视为存在于卡组中
         self.exclude_cards: Dict[str, Dict[int, List[str]]] = {}
+
+        # (类型, 星级) -> 可抽取 (已去除排除卡片) 的卡片元组, 抽卡时按需生成, 卡片或排除卡片变化时失效
+        self.buckets: Dict[Tuple[str, int], Tuple[Card, ...]] = {}
+        # 卡片或排除卡片变化时递增, 供 CardGroup 判断索引是否过期
+        self.version = 0
     
     def __str__(self) -> str:
         cards_info = "\n".join([
@@ -187,6 +309,8 @@ class SingleTagCardGroup:
             target[card.content] = card
             self.count += 1
             self.max_star = max(self.max_star, card.star)
+            self.buckets.pop((card.type, card.star), None)
+            self.version += 1
     
     def add_exclude_card(self, card: Card):
         """
@@ -199,6 +323,8 @@ class SingleTagCardGroup:
             self.exclude_cards[card.type][card.star] = []
 
         self.exclude_cards[card.type][card.star].append(card.content)
+        self.buckets.pop((card.type, card.star), None)
+        self.version += 1
     
     def has_exclude_card(self, card: Card) -> bool:
         """
@@ -211,6 +337,8 @@ class SingleTagCardGroup:
         清空排除卡片
         """
         self.exclude_cards = {}
+        self.buckets = {}
+        self.version += 1
     
     def random_card(self, type_: str, star: int) -> Card:
         """
@@ -219,15 +347,25 @@ class SingleTagCardGroup:
         if type_ not in self.cards or star not in self.cards[type_]:
             return Card.none()
 
-        target = self.cards[type_][star]
-
-        if self.exclude_cards and type_ in self.exclude_cards and star in self.exclude_cards[type_]:
-            target = {k: v for k, v in target.items() if k not in self.exclude_cards[type_][star]}
-
-        if not target:
+        bucket = self.bucket(type_, star)
+        if not bucket:
             return Card.none()
 
-        return choice(list(target.values()))
+        return choice(bucket)
+
+    def bucket(self, type_: str, star: int) -> Tuple[Card, ...]:
+        """
+        获取指定类型和星级的可抽取卡片元组 (缓存)
+        """
+        key = (type_, star)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            excluded = set(self.exclude_cards.get(type_, {}).get(star, ()))
+            bucket = self.buckets[key] = tuple(
+                card for content, card in self.cards[type_][star].items()
+                if content not in excluded
+            )
+        return bucket
     
     def remove_card(self, type_: str, star: int, content: str):
         """
@@ -237,6 +375,8 @@ class SingleTagCardGroup:
         if content in target:
             del target[content]
             self.count -= 1
+            self.buckets.pop((type_, star), None)
+            self.version += 1
             if star >= self.max_star:
                 # 更新最高星级
                 self.max_star = max([max(stars.keys()) for stars in self.cards.values()])
@@ -269,6 +409,13 @@ class SingleTagCardGroup:
         """
         return [card for stars in self.cards.values() for card_dict in stars.values() for card in card_dict.values()]
 
+    def has_card(self, type_: str, star: int, content: str) -> bool:
+        """
+        判断卡组中是否存在未被排除的卡片
+        """
+        return content in self.cards.get(type_, {}).get(star, {}) and \
+            content not in self.exclude_cards.get(type_, {}).get(star, [])
+
 class CardGroup:
     """
     完整卡组类
@@ -299,6 +446,12 @@ class CardGroup:
         self.max_star = standard_card_group.max_star
         # 卡片总数
         self.count = standard_card_group.count
+
+        # 卡片 (类型, 星级, 名称) -> 包含该卡片 (且未排除) 的标签组
+        self.card_tags: Dict[Tuple[str, int, str], TagSet] = {}
+        # card_tags 对应的各标签组版本, 与标签组当前版本不一致时重建索引
+        self.card_tags_versions: Dict[str, int] = {}
+        self.rebuild_card_tags()
     
     def __str__(self) -> str:
         cards_info = "\n".join([
@@ -317,12 +470,14 @@ class CardGroup:
     
     def add_tag_group(self, tag: str, card_group: Optional[SingleTagCardGroup] = None):
         """
-        添加标签组
+        添加标签组, tag 须为 Const.TAG_FLAGS 中的标签, 否则抛出 ValueError
         """
+        TagSet.flag(tag)
         if tag not in self.single_tag_card_groups:
             self.single_tag_card_groups[tag] = SingleTagCardGroup(self.name + f"-{tag}") if not card_group else card_group
             self.max_star = max(self.max_star, self.single_tag_card_groups[tag].max_star)
             self.count += self.single_tag_card_groups[tag].count
+            self.rebuild_card_tags()
 
     def add_type(self, type_: str, tag: str = TAG_STANDARD):
         """
@@ -358,37 +513,96 @@ class CardGroup:
         
         target = self.single_tag_card_groups[tag].card_contents(card.type, card.star)
         if card.content not in target:
+            version = self.single_tag_card_groups[tag].version
             self.single_tag_card_groups[tag].add_card(card)
             self.count += 1
             self.max_star = max(self.max_star, card.star)
+            self.update_card_tags(card.type, card.star, card.content, tag, version)
+
+    def rebuild_card_tags(self):
+        """
+        重建卡片标签索引
+        """
+        index: Dict[Tuple[str, int, str], int] = {}
+        for tag, group in self.single_tag_card_groups.items():
+            flag = TagSet.flag(tag)
+            for type_, star_dict in group.cards.items():
+                for star, card_dict in star_dict.items():
+                    excluded = set(group.exclude_cards.get(type_, {}).get(star, []))
+                    for content in card_dict.keys():
+                        if content not in excluded:
+                            key = (type_, star, content)
+                            index[key] = index.get(key, 0) | flag
+
+        self.card_tags = {key: TagSet(mask) for key, mask in index.items()}
+        self.card_tags_versions = {tag: group.version for tag, group in self.single_tag_card_groups.items()}
+
+    def update_card_tags(self, type_: str, star: int, content: str, tag: str, version: int):
+        """
+        标签组 tag 中的单张卡片变化后, 增量更新索引
+        version 为变化前该标签组的版本, 若索引在变化前已过期, 则不更新, 留待下次使用时重建
+        """
+        if self.card_tags_versions.get(tag) != version:
+            return
+
+        key = (type_, star, content)
+        tags = TagSet.from_tags(
+            t for t, group in self.single_tag_card_groups.items() if group.has_card(type_, star, content)
+        )
+        if tags:
+            self.card_tags[key] = tags
+        else:
+            self.card_tags.pop(key, None)
+        self.card_tags_versions[tag] = self.single_tag_card_groups[tag].version
+
+    def card_tags_expired(self) -> bool:
+        """
+        判断卡片标签索引是否过期 (标签组在 CardGroup 之外被直接修改时)
+        """
+        versions = self.card_tags_versions
+        if len(versions) != len(self.single_tag_card_groups):
+            return True
+        for tag, group in self.single_tag_card_groups.items():
+            if versions.get(tag) != group.version:
+                return True
+        return False
+
+    def tags_of(self, card: Card, tag: str = TAG_STANDARD) -> TagSet:
+        """
+        从 tag 组中抽出卡片时, 卡片所属的所有标签组 (包含 tag)
+        """
+        if self.card_tags_expired():
+            self.rebuild_card_tags()
+
+        tags = self.card_tags.get((card.type, card.star, card.content))
+        if tags is None:
+            return TagSet(TagSet.flag(tag))
+        if tag not in tags:
+            return tags.add(tag)
+        return tags
 
     def random_card(self, type_: str, star: int, tag: str = TAG_STANDARD) -> PackedCard:
         """
         随机抽取一个卡片
         """
-        if tag not in self.single_tag_card_groups or \
-              type_ not in self.single_tag_card_groups[tag].types() or \
-                  star not in self.single_tag_card_groups[tag].stars(type_):
+        card = self.draw_card(type_, star, tag)
+        if card is None:
             return PackedCard(Card.none())
-        
-        card = self.single_tag_card_groups[tag].random_card(type_, star)
 
-        tags = [tag]
+        return PackedCard(card, tag, self.tags_of(card, tag))
 
-        # 检查卡片是否存在于其他标签组
-        for t in self.single_tag_card_groups.keys():
-            if t == tag:
-                continue
-            if card.type not in self.single_tag_card_groups[t].types():
-                continue
-            if card.star not in self.single_tag_card_groups[t].stars(card.type):
-                continue
-            if card.content not in self.single_tag_card_groups[t].card_contents(card.type, card.star):
-                continue
-            if not self.single_tag_card_groups[t].has_exclude_card(card):
-                tags.append(t)
-
-        return PackedCard(card, tag, tags)
+    def draw_card(self, type_: str, star: int, tag: str = TAG_STANDARD) -> Optional[Card]:
+        """
+        从 tag 组中随机抽取一个卡片, 不封装为 PackedCard (随机数消耗与 random_card 相同)
+        tag 组中没有该类型和星级时返回 None
+        """
+        group = self.single_tag_card_groups.get(tag)
+        if group is None:
+            return None
+        stars = group.cards.get(type_)
+        if stars is None or star not in stars:
+            return None
+        return group.random_card(type_, star)
 
     def remove_card(self, type_: str, star: int, content: str, tag: str = TAG_STANDARD):
         """
@@ -397,9 +611,11 @@ class CardGroup:
         if tag not in self.single_tag_card_groups:
             return
         
+        version = self.single_tag_card_groups[tag].version
         self.count -= self.single_tag_card_groups[tag].count
         self.single_tag_card_groups[tag].remove_card(type_, star, content)   # 删除卡片
         self.count += self.single_tag_card_groups[tag].count     # 通过两次加减卡片数，自动适配卡片删除成功/失败时的卡片数量变化
+        self.update_card_tags(type_, star, content, tag, version)
         # 更新最高星级
         self.max_star = max([group.max_star for group in self.single_tag_card_groups.values()])
     
@@ -415,6 +631,7 @@ class CardGroup:
             # 取消排除
             for group in self.single_tag_card_groups.values():
                 group.clear_exclude_card()
+            self.rebuild_card_tags()
             return
         
         # 定义优先级顺序(从高到低)
@@ -436,6 +653,8 @@ class CardGroup:
                 for card in higher_group.all_cards():
                     lower_group.add_exclude_card(card)
 
+        self.rebuild_card_tags()
+
 
 class WishResult:
     """
@@ -454,16 +673,202 @@ class WishResult:
     def get_one(self) -> PackedCard:
         return self.cards[0]
 
+    def get(self, index: int) -> PackedCard:
+        return self.cards[index]
+
+
+class ColumnarWishResult:
+    """
+    列式抽卡结果封装类
+    接口与 WishResult 相同, 但按列保存抽卡结果, 只在取出单个结果时才构造 PackedCard
+    列 (array.array, 可直接用 numpy.frombuffer 读取):
+        card_ids: 卡片编号 (card_table 下标)
+        stars: 星级
+        type_ids: 类型编号 (type_table 下标)
+        real_tag_ids: 实际抽出标签编号 (tag_table 下标)
+        tag_masks: 所属标签组位掩码 (即 TagSet 的值)
+        orders: 抽数序号
+    *构造出的 PackedCard 中稀有度信息为默认值
+    """
+    def __init__(self):
+        self.count = 0
+        self.max_star = 0
+
+        self.card_ids = array("l")
+        self.stars = array("h")
+        self.type_ids = array("H")
+        self.real_tag_ids = array("B")
+        self.tag_masks = array("Q")
+        self.orders = array("q")
+
+        self.card_table: List[Card] = []
+        self.type_table: List[str] = []
+        self.tag_table: List[str] = []
+        self._card_index: Dict[int, int] = {}    # id(卡片) -> 卡片编号
+        self._type_index: Dict[str, int] = {}
+        self._tag_index: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, index: int) -> PackedCard:
+        return self.get(index)
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield self.get(index)
+
+    def _tag_id(self, tag: str) -> int:
+        tag_id = self._tag_index.get(tag)
+        if tag_id is None:
+            tag_id = self._tag_index[tag] = len(self.tag_table)
+            self.tag_table.append(tag)
+        return tag_id
+
+    def add(self, packed_card: PackedCard, order: Optional[int] = None):
+        """
+        追加单个结果
+        order: 抽数序号, 默认为结果中的位置 (从 1 开始)
+        """
+        card = packed_card.card
+        card_id = self._card_index.get(id(card))
+        if card_id is None:
+            card_id = self._card_index[id(card)] = len(self.card_table)
+            self.card_table.append(card)
+        type_id = self._type_index.get(card.type)
+        if type_id is None:
+            type_id = self._type_index[card.type] = len(self.type_table)
+            self.type_table.append(card.type)
+
+        self.count += 1
+        self.card_ids.append(card_id)
+        self.stars.append(card.star)
+        self.type_ids.append(type_id)
+        self.real_tag_ids.append(self._tag_id(packed_card.real_tag))
+        self.tag_masks.append(packed_card.tags)
+        self.orders.append(self.count if order is None else order)
+        self.max_star = max(self.max_star, card.star)
+
+    def get(self, index: int) -> PackedCard:
+        """
+        构造第 index 个结果的 PackedCard
+        """
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError(f"ColumnarWishResult: 下标 {index} 越界")
+        return PackedCard(
+            self.card_table[self.card_ids[index]],
+            self.tag_table[self.real_tag_ids[index]],
+            TagSet(self.tag_masks[index])
+        )
+
+    def get_one(self) -> PackedCard:
+        return self.get(0)
+
+    @property
+    def cards(self) -> List[PackedCard]:
+        """
+        构造所有结果的 PackedCard 列表 (与 WishResult.cards 兼容)
+        """
+        return list(self)
+
+    def columns(self) -> Dict[str, array]:
+        return {
+            "card_id": self.card_ids,
+            "star": self.stars,
+            "type_id": self.type_ids,
+            "real_tag_id": self.real_tag_ids,
+            "tag_mask": self.tag_masks,
+            "order": self.orders,
+        }
+
+
+class WishAggregate:
+    """
+    抽卡结果汇总类
+    只保存计数, 不保存单次抽卡结果, 内存占用与抽数无关
+    counts: (星级, 类型, 实际抽出标签) -> 抽出次数
+    card_counts: (星级, 类型, 卡片内容) -> 抽出次数
+    gaps: 星级 -> 间隔抽数 -> 次数, 间隔抽数为距上一张同星级卡片 (或汇总开始) 的抽数
+    """
+    def __init__(self):
+        self.count = 0
+        self.max_star = 0
+        self.counts: Dict[Tuple[int, str, str], int] = {}
+        self.card_counts: Dict[Tuple[int, str, str], int] = {}
+        self.gaps: Dict[int, Dict[int, int]] = {}
+        self.last: Dict[int, int] = {}      # 星级 -> 最近一次抽出该星级的抽数序号
+
+    def __str__(self) -> str:
+        return f"WishAggregate(count={self.count}, max_star={self.max_star})"
+
+    def add(self, packed_card: PackedCard):
+        self.add_card(packed_card.card, packed_card.real_tag)
+
+    def add_card(self, card: Card, tag: str):
+        """
+        计入一次抽卡, tag 为卡片被抽出时所属的标签组
+        """
+        star = card.star
+        self.count += 1
+        if star > self.max_star:
+            self.max_star = star
+
+        key = (star, card.type, tag)
+        self.counts[key] = self.counts.get(key, 0) + 1
+        card_key = (star, card.type, card.content)
+        self.card_counts[card_key] = self.card_counts.get(card_key, 0) + 1
+
+        gap = self.count - self.last.get(star, 0)
+        self.last[star] = self.count
+        histogram = self.gaps.setdefault(star, {})
+        histogram[gap] = histogram.get(gap, 0) + 1
+
+    def count_of(self, star: Optional[int] = None, type_: Optional[str] = None, tag: Optional[str] = None) -> int:
+        """
+        统计匹配 (星级, 类型, 标签) 的抽出次数, 未指定的项不限制
+        """
+        return sum(
+            count for (s, t, g), count in self.counts.items()
+            if (star is None or s == star) and (type_ is None or t == type_) and (tag is None or g == tag)
+        )
+
+    def rate(self, star: Optional[int] = None, type_: Optional[str] = None, tag: Optional[str] = None) -> float:
+        return self.count_of(star, type_, tag) / self.count if self.count else 0.0
 
+    def mean_gap(self, star: int) -> float:
+        """
+        指定星级的平均间隔抽数
+        """
+        histogram = self.gaps.get(star, {})
+        total = sum(histogram.values())
+        return sum(gap * n for gap, n in histogram.items()) / total if total else 0.0
+
+
+@slotted
 @dataclass
 class LogicResult:
     star: int
     type_: str
-    tags: List[str] = field(default_factory=lambda: [TAG_STANDARD])     # 卡片标签组 (卡片可同时属于多个标签组，但不同标签组之间有优先级)
+    tags: TagSet = STANDARD_TAGS    # 卡片标签组 (卡片可同时属于多个标签组，但不同标签组之间有优先级)
 
     def __str__(self) -> str:
         return f"LogicResult({self.star}, '{self.type_}', {self.tags})"
 
+    def card_tag(self) -> str:
+        """
+        按标签优先级 (Appoint > Fes > UP > 常驻) 返回抽取卡片时使用的标签组
+        """
+        tags = self.tags
+        if tags & FLAG_APPOINT:
+            return TAG_APPOINT
+        if tags & FLAG_FES:
+            return TAG_FES
+        if tags & FLAG_UP:
+            return TAG_UP
+        return TAG_STANDARD
+
 
 if __name__ == '__main__':
     p = SingleTagCardGroup("test-standard")
@@ -15,23 +15,32 @@ _
 
 from Base import *
 from WishRule import WishLogic
-from WishRecorder import WishRecorder
+from WishRecorder import WishRecorder, create_recorder
+from typing import Iterator, Union
 
 
 class CardPool:
     """
     卡池类
     集成抽卡逻辑、卡组管理、抽卡记录三部分功能
+    recorder_storage: 抽卡记录的存储方式, 见 WishRecorder.create_recorder
+    recorder_async: 是否由后台线程写入抽卡记录
+    recorder_details_format: details 记录格式 (csv / binary)
     """
     def __init__(self, name: str, logic: WishLogic, card_group: CardGroup, recorder_dir: str,
-                 auto_record_to_file: bool = True, none_flag: bool = False) -> None:
+                 auto_record_to_file: bool = True, none_flag: bool = False,
+                 recorder_storage: str = RECORDER_STORAGE_PROFILE, recorder_async: bool = False,
+                 recorder_details_format: str = DETAILS_FORMAT_CSV) -> None:
         self.none_flag = none_flag
         if none_flag:
             return
         self.name = name
         self.logic = logic
         self.card_group = card_group
-        self.recorder = WishRecorder(recorder_dir, self.card_group.max_star, auto_to_file=auto_record_to_file)
+        self.recorder: WishRecorder = create_recorder(
+            recorder_dir, self.card_group.max_star, auto_to_file=auto_record_to_file,
+            storage=recorder_storage, async_write=recorder_async, details_format=recorder_details_format
+        )
     
     def __str__(self) -> str:
         return "\n".join((
@@ -39,6 +48,9 @@ class CardPool:
             f"logic: <{self.logic.name}>",
             f"card group: <{self.card_group.name}>",
             f"record dir path: '{self.recorder.dir}'",
+            f"record storage: {self.recorder.storage}",
+            f"async record: {self.recorder.async_write}",
+            f"details format: {self.recorder.details_format}",
             f"auto record: {self.recorder.auto_to_file}"
         ))
     
@@ -48,16 +60,7 @@ class CardPool:
         """
         logic_result = self.logic.wish()
 
-        if TAG_APPOINT in logic_result.tags:
-            tag = TAG_APPOINT
-        elif TAG_FES in logic_result.tags:
-            tag = TAG_FES
-        elif TAG_UP in logic_result.tags:
-            tag = TAG_UP
-        else:
-            tag = TAG_STANDARD
-
-        packed_card = self.card_group.random_card(logic_result.type_, logic_result.star, tag)
+        packed_card = self.card_group.random_card(logic_result.type_, logic_result.star, logic_result.card_tag())
 
         self.logic.callback(packed_card)
 
@@ -88,18 +91,71 @@ class CardPool:
 
         return result
     
-    def wish_count(self, count: int) -> WishResult:
+    def wish_count(self, count: int, columnar: bool = False) -> Union[WishResult, ColumnarWishResult]:
         """
         指定次数抽卡
+        columnar: 是否使用列式结果 (ColumnarWishResult), 抽数较大时占用内存更少
         """
-        result = WishResult()
-
+        if not columnar:
+            result = WishResult()
+            for _ in range(count):
+                packed_card = self._wish()
+                result.add(packed_card)
+            return result
+
+        columnar_result = ColumnarWishResult()
         for _ in range(count):
             packed_card = self._wish()
-            result.add(packed_card)
+            columnar_result.add(packed_card, self.recorder.total_counter)
+        return columnar_result
+
+    def wish_stream(self, count: int) -> Iterator[PackedCard]:
+        """
+        指定次数抽卡, 逐个生成抽卡结果
+        与 wish_count 结果相同, 但不保存结果列表; 抽卡在迭代时才进行
+        """
+        for _ in range(count):
+            yield self._wish()
+
+    def wish_aggregate(self, count: int, record: bool = False) -> WishAggregate:
+        """
+        指定次数抽卡, 只返回汇总计数 (见 WishAggregate)
+        record: 是否写入抽卡记录, 默认不写入
+                为 False 时在逻辑副本上从卡池当前状态开始抽卡, 卡池的逻辑状态和抽卡记录均不变
+                每抽不生成 PackedCard, 逻辑结果原地复用, 内存占用与抽数无关, 适用于大量抽卡的出率验证
+                为 True 时推进卡池逻辑, 每抽照常生成并写入记录 (不使用汇总的快速路径), 开销与逐次抽卡相同
+        """
+        result = WishAggregate()
+        if record:
+            for _ in range(count):
+                packed_card = self._wish()
+                result.add(packed_card)
+            return result
+
+        logic = self.logic.copy()
+        logic.ctx.result_buffer = LogicResult(star=0, type_="")
+        wish = logic.wish
+        callback_card = logic.callback_card
+        draw_card = self.card_group.draw_card
+        tags_of = self.card_group.tags_of
+        add_card = result.add_card
+        none_card = Card.none()
+
+        for _ in range(count):
+            logic_result = wish()
+            tag = logic_result.card_tag()
+            card = draw_card(logic_result.type_, logic_result.star, tag)
+            if card is None:
+                card = none_card
+                tag = TAG_STANDARD
+                tags = STANDARD_TAGS
+            else:
+                tags = tags_of(card, tag)
+            callback_card(card.star, tags)
+            add_card(card, tag)
 
         return result
-    
+
     def reset(self, with_records: bool = True):
         """
         重置卡池
@@ -17,6 +17,7 @@ VERSION = "3.0.1"
 
 # NOTE: 抽卡部分
 MAX_PROBABILITY = 10000
+STAR_WEIGHT_TABLE_LIMIT = 1 << 16   # 星级累积权重表的最大条目数, 超出时改为逐抽计算
 
 # NOTE: 卡组内卡片分类标签
 TAG_UP = "up"               # UP 组
@@ -24,9 +25,49 @@ TAG_FES = "fes"             # Fes 组, 包含于 UP 组
 TAG_APPOINT = "appoint"     # Appoint (定轨) 组, 包含于 UP 组和 Fes 组
 TAG_STANDARD = "standard"   # 常驻组
 
+# NOTE: 标签位, 标签集合 (Base.TagSet) 以位掩码表示
+FLAG_STANDARD = 1 << 0
+FLAG_UP = 1 << 1
+FLAG_FES = 1 << 2
+FLAG_APPOINT = 1 << 3
+TAG_FLAGS = {               # 标签 -> 标签位, 固定不变 (位掩码会被缓存和传给工作进程), 不支持其他标签
+    TAG_STANDARD: FLAG_STANDARD,
+    TAG_UP: FLAG_UP,
+    TAG_FES: FLAG_FES,
+    TAG_APPOINT: FLAG_APPOINT,
+}
+
 # NOTE: 记录模块缓存大小
 CACHE_SIZE = 10
 
+# NOTE: 抽卡记录存储方式
+RECORDER_STORAGE_PROFILE = "profile"    # 每次写入时重写 profile.json, 并追加 details.csv / interval.csv
+RECORDER_STORAGE_JOURNAL = "journal"    # 追加写入单个日志文件, 定期压缩为 profile.json 快照
+JOURNAL_COMPACT_SIZE = 1 << 20          # 日志文件达到该大小 (字节) 时压缩
+
+# NOTE: details 记录格式
+DETAILS_FORMAT_CSV = "csv"              # details.csv 文本行
+DETAILS_FORMAT_BINARY = "binary"        # details.bin 定长二进制行 (见 WishRecordBinary)
+DETAILS_FILES = {
+    DETAILS_FORMAT_CSV: "details.csv",
+    DETAILS_FORMAT_BINARY: "details.bin",
+}
+
+# NOTE: 抽卡记录索引
+INDEX_BLOCK_SIZE = 4096                 # 索引块的记录数
+INDEX_VERSION = 1                       # 索引文件格式版本, 不一致时重建索引
+INDEX_READ_SIZE = 1 << 22               # 建立索引时每次读取的字节数
+
+# NOTE: 抽卡记录后台写入
+RECORDER_QUEUE_SIZE = 1 << 16           # 待写入记录队列的容量, 队列满时抽卡等待写入线程
+RECORDER_FLUSH_INTERVAL = 1.0           # 记录在写入线程中最长的等待时间 (秒)
+
+# NOTE: 卡片系统启动缓存格式版本, 缓存内容的类型结构变化时递增
+SYSTEM_CACHE_VERSION = 5
+
+# NOTE: 数据目录热重载的检查间隔 (毫秒)
+HOT_RELOAD_INTERVAL = 1000
+
 # NOTE: 路径
 BASE_DIR = os.getcwd()                                                                      # 项目根目录
 CARDS_DIR = os.path.join(BASE_DIR, r"Data/Cards")                                           # 卡片 配置目录
@@ -36,6 +77,7 @@ CARD_GROUP_DIR = os.path.join(BASE_DIR, r"Data/CardGroups")
 LOGIC_CONFIG_DIR = os.path.join(BASE_DIR, r"Data/LogicConfig")                              # 抽卡逻辑 配置目录
 CARD_POOL_DIR = os.path.join(BASE_DIR, r"Data/CardPools")                                   # 卡池 配置目录
 STAR_RARITY_MAP_FILE = os.path.join(BASE_DIR, r"Data/Config/StarRarityMap.json")            # 星级-稀有度 配置文件
+SYSTEM_CACHE_FILE = os.path.join(BASE_DIR, r"Data/Cache/SystemCache.pickle")               # 卡片系统 启动缓存文件
 
 PROFESSION_IMAGE_PATH_CONFIG_FILE = os.path.join(BASE_DIR, r"Data/ImagePathConfig/Profession.json")
                                                                                             # 职业 图片路径 配置文件
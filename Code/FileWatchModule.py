@@ -0,0 +1,269 @@
+r"""
+Wishes v3.0
+-----------
+
+Module
+_
+    FileWatchModule
+
+Description
+_
+    数据目录文件监视模块
+    - InotifyWatcher: Linux inotify (通过 ctypes 调用 libc, 无需额外依赖)
+    - PollingWatcher: 在后台线程中定时扫描文件的 (修改时间, 大小), 适用于所有平台
+    监视器只收集发生变化的 json 文件路径, 不在后台线程中应用, 由调用方在合适的时机取出并应用
+"""
+
+
+import os
+import sys
+import ctypes
+import ctypes.util
+import struct
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Set, Tuple
+
+
+def scan_json_files(dir_path: str, files: Dict[str, Tuple[int, int]]):
+    """
+    递归记录目录下所有 json 文件的 (修改时间, 大小)
+    """
+    if not os.path.isdir(dir_path):
+        return
+    with os.scandir(dir_path) as it:
+        entries = sorted(it, key=lambda entry: entry.name)
+    for entry in entries:
+        if entry.is_dir():
+            scan_json_files(entry.path, files)
+        elif entry.name.endswith(".json"):
+            stat = entry.stat()
+            files[entry.path] = (stat.st_mtime_ns, stat.st_size)
+
+
+class FileWatcher(ABC):
+    """
+    文件监视器基类
+    递归监视 dirs 下的所有 json 文件
+    """
+    def __init__(self, dirs: Iterable[str]) -> None:
+        self.dirs: List[str] = [os.path.abspath(dir_path) for dir_path in dirs]
+
+    def snapshot(self) -> Dict[str, Tuple[int, int]]:
+        """
+        监视目录下所有 json 文件的 (修改时间, 大小)
+        """
+        files: Dict[str, Tuple[int, int]] = {}
+        for dir_path in self.dirs:
+            scan_json_files(dir_path, files)
+        return files
+
+    @abstractmethod
+    def changes(self) -> Set[str]:
+        """
+        返回自上次调用以来新增、修改或删除的 json 文件路径, 不阻塞
+        """
+        pass
+
+    def close(self):
+        pass
+
+
+class PollingWatcher(FileWatcher):
+    """
+    轮询监视器
+    后台线程每隔 interval 秒扫描一次, 变化的文件累积到下次调用 changes 时取出, 扫描不占用调用线程
+    interval: 扫描间隔 (秒)
+    """
+    def __init__(self, dirs: Iterable[str], interval: float = 1.0) -> None:
+        super().__init__(dirs)
+        if interval <= 0:
+            raise ValueError(f"PollingWatcher: 扫描间隔必须为正数, 而非 {interval}")
+        self.interval = interval
+        self.files = self.snapshot()
+        self.pending: Set[str] = set()
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="PollingWatcher", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.scan()
+            except OSError:
+                pass    # 扫描期间文件被删除等, 下次扫描重试
+
+    def scan(self):
+        """
+        扫描一次, 将与上次扫描相比发生变化的文件加入待取出的集合
+        """
+        files = self.snapshot()
+        old_files = self.files
+        self.files = files
+        res = {path for path, stat in files.items() if old_files.get(path) != stat}
+        res.update(path for path in old_files if path not in files)
+        if res:
+            with self.lock:
+                self.pending |= res
+
+    def changes(self) -> Set[str]:
+        with self.lock:
+            res, self.pending = self.pending, set()
+        return res
+
+    def close(self):
+        self.stop_event.set()
+        self.thread.join()
+
+
+# inotify 常量 (linux/inotify.h)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+
+class InotifyWatcher(FileWatcher):
+    """
+    inotify 监视器 (仅 Linux)
+    为每个目录添加监视, 新建的子目录自动加入监视; 文件在写入关闭、移入、移出、删除时视为变化
+    事件队列溢出或目录被整体移出时, 报告所有已知文件和当前文件 (由调用方重新加载)
+    *inotify 不可用时构造抛出 OSError
+    """
+    mask: int = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    event_format: str = "iIII"     # wd, mask, cookie, len
+
+    def __init__(self, dirs: Iterable[str]) -> None:
+        super().__init__(dirs)
+        libc_name = ctypes.util.find_library("c")
+        if not sys.platform.startswith("linux") or libc_name is None:
+            raise OSError("InotifyWatcher: 当前平台不支持 inotify")
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "InotifyWatcher: inotify_init1 失败")
+
+        self.watches: Dict[int, str] = {}   # 监视描述符 -> 目录路径
+        self.files: Set[str] = set()        # 已知的 json 文件
+        try:
+            for dir_path in self.dirs:
+                self.add_tree(dir_path, self.files, strict=True)
+        except OSError:
+            self.close()
+            raise
+
+    def add_tree(self, dir_path: str, files: Set[str], strict: bool = False):
+        """
+        监视目录及其所有子目录, 并将其中的 json 文件加入 files
+        strict: 添加监视失败时是否抛出 OSError (如超出 max_user_watches)
+        """
+        if not os.path.isdir(dir_path):
+            return
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dir_path), self.mask)
+        if wd < 0:
+            if strict:
+                raise OSError(ctypes.get_errno(), f"InotifyWatcher: 无法监视目录 '{dir_path}'")
+            return
+        self.watches[wd] = dir_path
+        with os.scandir(dir_path) as it:
+            entries = list(it)
+        for entry in entries:
+            if entry.is_dir():
+                self.add_tree(entry.path, files, strict)
+            elif entry.name.endswith(".json"):
+                files.add(entry.path)
+
+    def read_events(self) -> List[Tuple[int, int, str]]:
+        """
+        读出所有待处理事件 (监视描述符, 事件掩码, 文件名)
+        """
+        events = []
+        header_size = struct.calcsize(self.event_format)
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = struct.unpack_from(self.event_format, data, offset)
+                offset += header_size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+                offset += length
+                events.append((wd, mask, name))
+        return events
+
+    def changes(self) -> Set[str]:
+        if self.fd < 0:
+            return set()
+
+        res: Set[str] = set()
+        rescan = False
+        for wd, mask, name in self.read_events():
+            if mask & IN_Q_OVERFLOW:
+                rescan = True
+                continue
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            dir_path = self.watches.get(wd)
+            if dir_path is None or not name:
+                continue
+            path = os.path.join(dir_path, name)
+
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    found: Set[str] = set()
+                    self.add_tree(path, found)
+                    self.files.update(found)
+                    res.update(found)
+                elif mask & IN_MOVED_FROM:
+                    # 目录被整体移出时其中的文件没有单独的事件
+                    rescan = True
+                continue
+
+            # 新建的文件等到写入关闭时再处理
+            if not name.endswith(".json") or mask & IN_CREATE:
+                continue
+            if mask & (IN_MOVED_FROM | IN_DELETE):
+                self.files.discard(path)
+            else:
+                self.files.add(path)
+            res.add(path)
+
+        if rescan:
+            files = set(self.snapshot())
+            res.update(self.files)
+            res.update(files)
+            self.files = files
+        return res
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+            self.watches.clear()
+
+
+def create_watcher(dirs: Iterable[str], interval: float = 1.0, use_inotify: bool = True) -> FileWatcher:
+    """
+    创建文件监视器
+    Linux 下优先使用 inotify, 不可用时 (其他平台、超出监视数量限制等) 使用轮询
+    interval: 轮询监视器的扫描间隔 (秒)
+    """
+    dirs = list(dirs)
+    if use_inotify:
+        try:
+            return InotifyWatcher(dirs)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(dirs, interval)
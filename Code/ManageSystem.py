@@ -14,30 +14,322 @@ _
 
 import os
 import json
+import pickle
+from bisect import bisect_left, bisect_right, insort
 from Const import *
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from Base import *
 from CardPool import CardPool
 from WishRule import WishLogic
 from WishRule import WishLogic
-from typing import Dict, List, Sequence, Tuple
+from WishRecorder import create_recorder
+from FileWatchModule import FileWatcher, create_watcher, scan_json_files
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+
+class CardSearchIndex:
+    """
+    卡片名称搜索索引
+    对卡片内容 (content) 和称号 (title) 建立单字和二元字组 (bigram) 倒排索引, 逐字切分, 适用于中日韩文本
+    查询时对各字组的倒排集合求交集得到候选, 再逐个确认候选确实包含查询文本
+    匹配不区分大小写; 最近的查询结果会被缓存, 翻页时无需重新排序
+    """
+    fields: Tuple[str, ...] = ("content", "title")
+    cache_size: int = 32    # 缓存的查询结果数
+
+    def __init__(self) -> None:
+        # 字组 -> 卡片编号集合
+        self.grams: Dict[str, Set[int]] = {}
+        # 卡片编号 -> 各字段的规范化文本
+        self.texts: Dict[int, Tuple[str, ...]] = {}
+        # (查询文本, 是否前缀匹配) -> 排序后的卡片编号, 索引变化时清空
+        self.cache: "OrderedDict[Tuple[str, bool], List[int]]" = OrderedDict()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return text.casefold()
+
+    @staticmethod
+    def split(text: str) -> Set[str]:
+        """
+        文本的所有单字和二元字组
+        """
+        grams = set(text)
+        grams.update(text[i:i + 2] for i in range(len(text) - 1))
+        return grams
+
+    def add(self, card: Card):
+        texts = tuple(self.normalize(getattr(card, field)) for field in self.fields)
+        self.texts[card.id] = texts
+        self.cache.clear()
+        for text in texts:
+            for gram in self.split(text):
+                self.grams.setdefault(gram, set()).add(card.id)
+
+    def remove(self, card: Card):
+        texts = self.texts.pop(card.id, None)
+        if texts is None:
+            return
+        self.cache.clear()
+        for text in texts:
+            for gram in self.split(text):
+                ids = self.grams.get(gram)
+                if ids is not None:
+                    ids.discard(card.id)
+                    if not ids:
+                        del self.grams[gram]
+
+    def candidates(self, query: str) -> Set[int]:
+        """
+        可能包含 query 的卡片编号 (query 已规范化且不为空)
+        """
+        if len(query) == 1:
+            return set(self.grams.get(query, ()))
+        bigrams = sorted(
+            {query[i:i + 2] for i in range(len(query) - 1)},
+            key=lambda gram: len(self.grams.get(gram, ()))
+        )
+        res: Optional[Set[int]] = None
+        for gram in bigrams:
+            ids = self.grams.get(gram)
+            if not ids:
+                return set()
+            res = set(ids) if res is None else res & ids
+            if not res:
+                return set()
+        return res or set()
+
+    def search(self, query: str, prefix: bool = False) -> List[int]:
+        """
+        返回匹配 query 的卡片编号, 按匹配程度排序:
+        内容完全匹配 > 内容前缀匹配 > 内容包含 > 称号前缀匹配 > 称号包含
+        同一档次内依次按匹配位置、内容长度、卡片编号排序
+        prefix: 是否只返回前缀匹配的卡片
+        """
+        query = self.normalize(query)
+        if not query:
+            return []
+
+        key = (query, prefix)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+
+        ranked = []
+        for card_id in self.candidates(query):
+            content, title = self.texts[card_id]
+            position = content.find(query)
+            if position == 0:
+                rank = 0 if content == query else 1
+            elif position > 0 and not prefix:
+                rank = 2
+            else:
+                position = title.find(query)
+                if position == 0:
+                    rank = 3
+                elif position > 0 and not prefix:
+                    rank = 4
+                else:
+                    continue
+            ranked.append((rank, position, len(content), card_id))
+        ranked.sort()
+        res = [item[3] for item in ranked]
+
+        self.cache[key] = res
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return res
+
+
+class CardPage:
+    """
+    卡片分页查询结果
+    cursor: 下一页的游标, 没有下一页时为 None
+    """
+    def __init__(self, cards: List[Card], cursor: Optional[str] = None) -> None:
+        self.cards = cards
+        self.cursor = cursor
+
+    @staticmethod
+    def encode_cursor(sort_key: str, reverse: bool, entry: Tuple[object, int]) -> str:
+        """
+        游标为本页最后一张卡片的 (排序值, 卡片编号), 与卡片的增删无关
+        """
+        return json.dumps([sort_key, reverse, entry[0], entry[1]], ensure_ascii=False)
+
+    @staticmethod
+    def decode_cursor(cursor: str, sort_key: str, reverse: bool) -> Tuple[object, int]:
+        try:
+            key, rev, value, card_id = json.loads(cursor)
+        except (ValueError, TypeError):
+            raise ValueError(f"CardPage: 无效的游标 '{cursor}'")
+        if key != sort_key or rev != reverse:
+            raise ValueError(f"CardPage: 游标与排序方式不一致 '{cursor}'")
+        return (value, card_id)
+
+
+def load_card_files(file_paths: List[str]) -> List[Card]:
+    """
+    按顺序加载一批卡片 json 文件
+    """
+    return [Card.load_from_json(file_path) for file_path in file_paths]
 
 
 class CardSystem:
     """
     卡片管理系统
     卡片管理层级: 游戏 -> 类型 -> 星级 -> 卡片名称: 卡片对象
+    workers: 并行加载卡片文件的线程 (进程) 数, 默认为 min(32, CPU 核心数 + 4), 为 1 时顺序加载
+    use_process: 是否使用进程池加载 (卡片数量很大、解析耗时占主导时使用), 默认使用线程池
+    *并行加载的结果 (包括卡片顺序) 与顺序加载完全相同
     """
-    def __init__(self, cards_dir: str, dir_config: Dict[str, Dict[str, Sequence[int]]]):
-        self.card_container: Dict[str, Dict[str, Dict[int, Dict[str, Card]]]] = {
-            game: {
-                type_: {
-                    star: self.load_cards(os.path.join(cards_dir, game, type_, f"Star{star}"))
-                    for star in star_list
-                }
-                for type_, star_list in type_dict.items()
-            }
+    batch_size: int = 64    # 并行加载时每个任务加载的文件数
+    index_fields: Tuple[str, ...] = ("content", "game", "type", "star", "attribute", "profession")    # 建立倒排索引的卡片属性
+    sort_fields: Tuple[str, ...] = ("star", "content", "game")    # 维护排序视图的卡片属性
+
+    def __init__(
+            self,
+            cards_dir: str,
+            dir_config: Dict[str, Dict[str, Sequence[int]]],
+            workers: Optional[int] = None,
+            use_process: bool = False
+            ):
+        dir_keys = [
+            (game, type_, star)
             for game, type_dict in dir_config.items()
+            for type_, star_list in type_dict.items()
+            for star in star_list
+        ]
+        dir_paths = [os.path.join(cards_dir, game, type_, f"Star{star}") for game, type_, star in dir_keys]
+
+        if workers is None:
+            workers = min(32, (os.cpu_count() or 1) + 4)
+        if workers <= 1:
+            dir_files = [self.list_card_files(dir_path) for dir_path in dir_paths]
+            dir_cards = [load_card_files(files) for files in dir_files]
+        else:
+            dir_files, dir_cards = self.load_cards_parallel(dir_paths, workers, use_process)
+
+        self.cards_dir = cards_dir
+        # 卡片目录 (用于判断热重载的文件是否属于卡片系统)
+        self.card_dirs: Set[str] = {os.path.abspath(dir_path) for dir_path in dir_paths}
+        # 卡片文件路径 -> 卡片对象 (同一目录下内容重复的文件对应同一卡片)
+        self.card_files: Dict[str, Card] = {}
+        self.card_container: Dict[str, Dict[str, Dict[int, Dict[str, Card]]]] = {
+            game: {type_: {} for type_ in type_dict.keys()} for game, type_dict in dir_config.items()
         }
+        for (game, type_, star), files, cards in zip(dir_keys, dir_files, dir_cards):
+            card_dict = {card.content: card for card in cards}
+            self.card_container[game][type_][star] = card_dict
+            for file, card in zip(files, cards):
+                self.card_files[os.path.abspath(file)] = card_dict[card.content]
+
+        # 卡片编号 -> 卡片对象, 卡片编号按加载顺序从 0 开始分配
+        self.cards: List[Card] = []
+        # 游戏 / 类型 / 属性 / 职业的字符串编码表
+        self.game_codes = CodeTable()
+        self.type_codes = CodeTable()
+        self.attribute_codes = CodeTable()
+        self.profession_codes = CodeTable()
+
+        # 倒排索引: 卡片属性 -> 属性值 -> 卡片编号列表 (升序)
+        # 另有组合索引 "bucket": (游戏, 类型, 星级) -> 卡片编号列表
+        self.index: Dict[str, Dict[object, List[int]]] = {field: {} for field in self.index_fields + ("bucket",)}
+        # 已被同名卡片替换 (不再属于系统) 的卡片编号
+        self.replaced_ids: Set[int] = set()
+        # (卡片属性, 属性值) -> 倒排列表对应的集合, 求交集时按需生成, 倒排列表变化时失效
+        self.posting_sets: Dict[Tuple[str, object], Set[int]] = {}
+        # 卡片名称搜索索引
+        self.search_index = CardSearchIndex()
+        # (查询文本, 是否前缀匹配, 过滤条件) -> 过滤后的搜索结果, 翻页时无需重新过滤, 索引变化时清空
+        self.search_cache: "OrderedDict[Tuple[str, bool, Tuple[Tuple[str, object], ...]], List[int]]" = OrderedDict()
+        # 排序视图: 卡片属性 -> 按 (属性值, 卡片编号) 升序排列的列表, 按需生成, 之后增量维护
+        self.sorted_views: Dict[str, List[Tuple[object, int]]] = {}
+
+        for type_dict in self.card_container.values():
+            for star_dict in type_dict.values():
+                for card_dict in star_dict.values():
+                    for card in card_dict.values():
+                        self.register_card(card)
+
+    def register_card(self, card: Card):
+        """
+        为卡片分配编号, 并驻留卡片的游戏、类型、属性和职业字符串
+        """
+        card.game = self.game_codes.intern(card.game)
+        card.type = self.type_codes.intern(card.type)
+        card.attribute = self.attribute_codes.intern(card.attribute)
+        card.profession = self.profession_codes.intern(card.profession)
+        card.id = len(self.cards)
+        self.cards.append(card)
+        self.index_card(card)
+
+    def index_values(self, card: Card) -> List[Tuple[str, object]]:
+        """
+        卡片在各个索引中的 (索引名, 键)
+        """
+        res: List[Tuple[str, object]] = [(field, getattr(card, field)) for field in self.index_fields]
+        res.append(("bucket", (card.game, card.type, card.star)))
+        return res
+
+    def index_card(self, card: Card):
+        """
+        将已分配编号的卡片加入倒排索引、搜索索引和排序视图
+        """
+        for field, value in self.index_values(card):
+            insort(self.index[field].setdefault(value, []), card.id)
+            self.posting_sets.pop((field, value), None)
+        self.search_index.add(card)
+        self.search_cache.clear()
+        for sort_key, view in self.sorted_views.items():
+            insort(view, (getattr(card, sort_key), card.id))
+
+    def unindex_card(self, card: Card):
+        """
+        将卡片从倒排索引、搜索索引和排序视图中移除
+        """
+        for field, value in self.index_values(card):
+            posting = self.index[field].get(value)
+            if posting is not None and card.id in posting:
+                posting.remove(card.id)
+                if not posting:
+                    del self.index[field][value]
+            self.posting_sets.pop((field, value), None)
+        self.search_index.remove(card)
+        self.search_cache.clear()
+        for sort_key, view in self.sorted_views.items():
+            entry = (getattr(card, sort_key), card.id)
+            i = bisect_left(view, entry)
+            if i < len(view) and view[i] == entry:
+                del view[i]
+
+    def unregister_card(self, card: Card):
+        """
+        将卡片从索引中移除 (卡片编号保留, 不再分配给其他卡片)
+        """
+        self.unindex_card(card)
+        self.replaced_ids.add(card.id)
+
+    def get_card_by_id(self, card_id: int) -> Card:
+        """
+        根据卡片编号查找卡片
+        若编号不存在，则返回空卡片: Card.none()
+        """
+        if 0 <= card_id < len(self.cards):
+            return self.cards[card_id]
+        return Card.none()
+
+    def card_codes(self, card: Card) -> Tuple[int, int, int, int]:
+        """
+        返回卡片的 (游戏, 类型, 属性, 职业) 编码
+        """
+        return (
+            self.game_codes.code(card.game),
+            self.type_codes.code(card.type),
+            self.attribute_codes.code(card.attribute),
+            self.profession_codes.code(card.profession),
+        )
     
     @staticmethod
     def load_cards(dir_path: str) -> Dict[str, Card]:
@@ -49,12 +341,50 @@ class CardSystem:
         if not os.path.exists(dir_path):
             return cards
         
-        for filename in os.listdir(dir_path):
-            if filename.endswith(".json"):
-                filepath = os.path.join(dir_path, filename)
-                card = Card.load_from_json(filepath)
-                cards[card.content] = card
+        for card in load_card_files(CardSystem.list_card_files(dir_path)):
+            cards[card.content] = card
         return cards
+
+    @staticmethod
+    def list_card_files(dir_path: str) -> List[str]:
+        """
+        列出目录下的所有卡片 json 文件, 目录不存在时返回空列表
+        """
+        if not os.path.exists(dir_path):
+            return []
+        return [
+            os.path.join(dir_path, filename)
+            for filename in os.listdir(dir_path)
+            if filename.endswith(".json")
+        ]
+
+    @classmethod
+    def load_cards_parallel(
+            cls,
+            dir_paths: List[str],
+            workers: int,
+            use_process: bool = False
+            ) -> Tuple[List[List[str]], List[List[Card]]]:
+        """
+        并行加载多个目录下的卡片
+        先并行列出各目录的文件, 再将所有文件分批并行加载
+        返回各目录的文件列表和按文件顺序排列的卡片列表
+        """
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            dir_files = list(executor.map(cls.list_card_files, dir_paths))
+
+        file_paths = [file_path for files in dir_files for file_path in files]
+        batches = [file_paths[i:i + cls.batch_size] for i in range(0, len(file_paths), cls.batch_size)]
+        if use_process and len(batches) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                batch_cards = list(executor.map(load_card_files, batches))
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                batch_cards = list(executor.map(load_card_files, batches))
+
+        loaded = iter([card for cards in batch_cards for card in cards])
+        dir_cards = [[next(loaded) for _ in files] for files in dir_files]
+        return dir_files, dir_cards
     
     def get_card(
             self,
@@ -76,25 +406,10 @@ class CardSystem:
             except KeyError:
                 return Card.none()
         
-        # 确定搜索游戏范围
-        games = [game] if game and game in self.card_container else self.card_container.keys()
-
-        for g in games:
-            # 确定类型搜索范围
-            types = [type_] if type_ and type_ in self.card_container[g] else self.card_container[g].keys()
-
-            for t in types:
-                # 确定星级搜索范围
-                stars = [star] if star and star in self.card_container[g][t] else self.card_container[g][t].keys()
-
-                for s in stars:
-                    # 在当前星级中查找卡片
-                    card_dict = self.card_container[g][t][s]
-                    if content in card_dict:
-                        return card_dict[content]   # 找到
-
-        # 未找到
-        return Card.none()
+        if content is None:
+            return Card.none()
+        res = self.get_cards(game, type_, star, content, num=1)
+        return res[0] if res else Card.none()
 
     def get_cards(
             self,
@@ -102,33 +417,248 @@ class CardSystem:
             type_: Optional[str] = None,
             star: Optional[int] = None,
             content: Optional[str] = None,
+            attribute: Optional[str] = None,
+            profession: Optional[str] = None,
+            sort_key: Optional[str] = None,
+            reverse: bool = False,
+            start: int = 0,
+            num: int = -1
         ) -> List[Card]:
         """
         筛选所有符合条件的卡片，
         返回为列表
+        game / type_ / star 为空或系统中不存在时不作限制; content 不为 None 时必须完全匹配
+        attribute / profession 为空时不作限制
+        sort_key: 排序依据的卡片属性 (如 "star"), 默认按卡片编号 (加载顺序) 排列
+                  值相同时按卡片编号排列, reverse 为 True 时整体逆序
+        start / num: 返回排序后的第 start 个起的 num 个卡片, num 为负数时返回全部
         """
-        res: List[Card] = []
+        filters = self._filters(game, type_, star, content, attribute, profession)
+        if start < 0:
+            start = 0
+        stop = None if num < 0 else start + num
 
-        games = [game] if game and game in self.card_container else self.card_container.keys()
-        
-        for g in games:
-            types = [type_] if type_ and type_ in self.card_container[g] else self.card_container[g].keys()
-
-            for t in types:
-                stars = [star] if star and star in self.card_container[g][t] else \
-                    self.card_container[g][t].keys()
-                
-                for s in stars:
-                    if content in self.card_container[g][t][s]:
-                        res.append(self.card_container[g][t][s][content])
-                        continue
-                    if content is not None:
-                        continue
-                    for card in self.card_container[g][t][s].values():
-                        res.append(card)
-                
+        if sort_key is None:
+            ids = self.query_ids(filters)[start:stop]
+        else:
+            ids = [card_id for _, card_id in self.sorted_entries(filters, sort_key, reverse, None, start, num)]
+        return [self.cards[card_id] for card_id in ids]
+
+    def get_card_page(
+            self,
+            game: Optional[str] = None,
+            type_: Optional[str] = None,
+            star: Optional[int] = None,
+            content: Optional[str] = None,
+            attribute: Optional[str] = None,
+            profession: Optional[str] = None,
+            sort_key: str = "star",
+            reverse: bool = False,
+            cursor: Optional[str] = None,
+            num: int = 20
+        ) -> CardPage:
+        """
+        按游标分页查询卡片, 过滤条件与 get_cards 相同
+        sort_key: 排序依据 (star / content / game 有预排序视图), 值相同时按卡片编号排列
+        cursor: 上一页返回的游标, 为 None 时返回第一页
+        """
+        filters = self._filters(game, type_, star, content, attribute, profession)
+        after = CardPage.decode_cursor(cursor, sort_key, reverse) if cursor else None
+        entries = self.sorted_entries(filters, sort_key, reverse, after, 0, num + 1)
+
+        next_cursor = None
+        if len(entries) > num:
+            entries = entries[:num]
+            next_cursor = CardPage.encode_cursor(sort_key, reverse, entries[-1])
+        return CardPage([self.cards[card_id] for _, card_id in entries], next_cursor)
+
+    def sorted_view(self, sort_key: str) -> List[Tuple[object, int]]:
+        """
+        按 (属性值, 卡片编号) 升序排列的所有卡片
+        sort_fields 中的属性缓存并增量维护, 其他属性每次重新排序
+        """
+        view = self.sorted_views.get(sort_key)
+        if view is None:
+            view = sorted(
+                (getattr(card, sort_key), card.id)
+                for card in self.cards if card.id not in self.replaced_ids
+            )
+            if sort_key in self.sort_fields:
+                self.sorted_views[sort_key] = view
+        return view
+
+    def sorted_entries(
+            self,
+            filters: Dict[str, object],
+            sort_key: str,
+            reverse: bool = False,
+            after: Optional[Tuple[object, int]] = None,
+            start: int = 0,
+            num: int = -1
+        ) -> List[Tuple[object, int]]:
+        """
+        按排序返回满足过滤条件的 (排序值, 卡片编号)
+        after: 只返回排在 after 之后的卡片 (游标)
+        过滤条件较宽时沿排序视图顺序扫描并逐个检查, 扫描量与 start + num 成正比;
+        过滤条件较严时先取出所有满足条件的卡片再排序
+        """
+        cards = self.cards
+        limit = None if num < 0 else start + num
+
+        view: Optional[List[Tuple[object, int]]] = None
+        if not filters:
+            view = self.sorted_view(sort_key)
+        elif limit is not None and sort_key in self.sort_fields:
+            view = self.sorted_view(sort_key)
+            smallest = min(len(self.index[field].get(value, ())) for field, value in filters.items()) # type: ignore
+            # 预计扫描数 (limit * 总数 / 候选数) 超过候选数时改为先取出候选
+            if limit * len(view) > smallest * smallest:
+                view = None
+        if view is None:
+            view = sorted((getattr(cards[card_id], sort_key), card_id) for card_id in self.query_ids(filters))
+            filters = {}
+
+        if reverse:
+            end = len(view) if after is None else bisect_left(view, after)
+            indices = range(end - 1, -1, -1)
+        else:
+            begin = 0 if after is None else bisect_right(view, after)
+            indices = range(begin, len(view))
+
+        if not filters:
+            return [view[i] for i in indices[start:limit]]
+
+        checks = list(filters.items())
+        res = []
+        skipped = 0
+        for i in indices:
+            entry = view[i]
+            card = cards[entry[1]]
+            if all(getattr(card, field) == value for field, value in checks):
+                if skipped < start:
+                    skipped += 1
+                    continue
+                res.append(entry)
+                if limit is not None and len(res) >= limit - start:
+                    break
         return res
-    
+
+    def search_cards(
+            self,
+            text: str,
+            game: Optional[str] = None,
+            type_: Optional[str] = None,
+            star: Optional[int] = None,
+            attribute: Optional[str] = None,
+            profession: Optional[str] = None,
+            prefix: bool = False,
+            start: int = 0,
+            num: int = -1
+        ) -> List[Card]:
+        """
+        按卡片内容和称号搜索卡片 (包含 text 即匹配, prefix 为 True 时只匹配前缀), 结果按匹配程度排序
+        其余过滤条件与 get_cards 相同
+        start / num: 返回第 start 个起的 num 个结果, num 为负数时返回全部
+        """
+        filters = self._filters(game, type_, star, None, attribute, profession)
+        if filters:
+            ids = self._filtered_search(text, prefix, filters)
+        else:
+            ids = self.search_index.search(text, prefix)
+
+        if start < 0:
+            start = 0
+        stop = None if num < 0 else start + num
+        return [self.cards[card_id] for card_id in ids[start:stop]]
+
+    def _filtered_search(self, text: str, prefix: bool, filters: Dict[str, object]) -> List[int]:
+        """
+        搜索结果中满足过滤条件的卡片编号, 最近的结果会被缓存, 每次查询只求一次过滤集合
+        """
+        key = (text, prefix, tuple(filters.items()))
+        if key in self.search_cache:
+            self.search_cache.move_to_end(key)
+            return self.search_cache[key]
+
+        allowed = set(self.query_ids(filters))
+        res = [card_id for card_id in self.search_index.search(text, prefix) if card_id in allowed]
+
+        self.search_cache[key] = res
+        if len(self.search_cache) > self.search_index.cache_size:
+            self.search_cache.popitem(last=False)
+        return res
+
+    def _filters(
+            self,
+            game: Optional[str],
+            type_: Optional[str],
+            star: Optional[int],
+            content: Optional[str],
+            attribute: Optional[str],
+            profession: Optional[str]
+            ) -> Dict[str, object]:
+        """
+        将查询条件转换为 query_ids 的过滤条件
+        游戏、类型、星级不在卡片目录配置中时忽略该条件; 已配置但没有卡片时照常过滤 (结果为空)
+        """
+        filters: Dict[str, object] = {}
+        type_dicts = list(self.card_container.values())
+        if game and game in self.card_container:
+            filters["game"] = game
+            type_dicts = [self.card_container[game]]
+        star_dicts = [star_dict for type_dict in type_dicts for star_dict in type_dict.values()]
+        if type_ and any(type_ in type_dict for type_dict in type_dicts):
+            filters["type"] = type_
+            star_dicts = [type_dict[type_] for type_dict in type_dicts if type_ in type_dict]
+        if star and any(star in star_dict for star_dict in star_dicts):
+            filters["star"] = star
+        if content is not None:
+            filters["content"] = content
+        if attribute:
+            filters["attribute"] = attribute
+        if profession:
+            filters["profession"] = profession
+        return filters
+
+    def query_ids(self, filters: Dict[str, object]) -> List[int]:
+        """
+        返回满足所有过滤条件 (属性 -> 取值) 的卡片编号 (升序)
+        从最短的倒排列表开始, 依次与其余倒排列表求交集
+        同时指定游戏、类型和星级时使用组合索引
+        """
+        if "game" in filters and "type" in filters and "star" in filters:
+            filters = dict(filters)
+            filters["bucket"] = (filters.pop("game"), filters.pop("type"), filters.pop("star"))
+        elif not filters:
+            return [card_id for card_id in range(len(self.cards)) if card_id not in self.replaced_ids]
+
+        postings = []
+        for field, value in filters.items():
+            posting = self.index[field].get(value) # type: ignore
+            if not posting:
+                return []
+            postings.append((len(posting), field, posting))
+        postings.sort(key=lambda item: item[0])
+
+        if len(postings) == 1:
+            return list(postings[0][2])
+        ids = set(postings[0][2])
+        for _, field, _ in postings[1:]:
+            ids.intersection_update(self.posting_set(field, filters[field]))
+            if not ids:
+                return []
+        return sorted(ids)
+
+    def posting_set(self, field: str, value) -> Set[int]:
+        """
+        倒排列表对应的集合 (缓存), 用于求交集
+        """
+        key = (field, value)
+        posting_set = self.posting_sets.get(key)
+        if posting_set is None:
+            posting_set = self.posting_sets[key] = set(self.index[field].get(value, ()))
+        return posting_set
+
     def has_card(self, card: Card) -> bool:
         """
         判断卡片是否存在于系统中
@@ -143,6 +673,7 @@ class CardSystem:
         """
         if self.has_card(card):     # 检验卡片是否已存在
             return
+        self.register_card(card)
         
         # 确定卡片所属游戏是否存在
         if card.game not in self.card_container:
@@ -161,8 +692,64 @@ class CardSystem:
             type_dict[card.star] = {card.content: card}
             return
         # 最终添加卡片
+        replaced = type_dict[card.star].get(card.content)
+        if replaced is not None:
+            self.unregister_card(replaced)
         type_dict[card.star][card.content] = card
-    
+
+    def remove_card(self, card: Card):
+        """
+        从系统中移除卡片
+        """
+        card_dict = self.card_container.get(card.game, {}).get(card.type, {}).get(card.star, {})
+        if card_dict.get(card.content) is card:
+            del card_dict[card.content]
+        self.unregister_card(card)
+
+    def update_card(self, card: Card, new_card: Card):
+        """
+        使用 new_card 的称号、属性、职业和图片路径原地更新卡片 (两者的游戏、类型、星级、内容相同)
+        卡组中对该卡片的引用保持有效
+        """
+        self.unindex_card(card)
+        card.title = new_card.title
+        card.attribute = self.attribute_codes.intern(new_card.attribute)
+        card.profession = self.profession_codes.intern(new_card.profession)
+        card.image_path = new_card.image_path
+        self.index_card(card)
+
+    def reload_card_file(self, file: str) -> Set[str]:
+        """
+        重新加载单个卡片文件, 文件已删除时移除对应卡片
+        返回新增、移除或改变了位置 (游戏、类型、星级、内容) 的卡片内容
+        只修改其他属性的卡片原地更新, 不包含在返回值中
+        *不属于卡片目录配置的文件不做处理
+        """
+        file = os.path.abspath(file)
+        if os.path.dirname(file) not in self.card_dirs:
+            return set()
+
+        new_card = Card.load_from_json(file) if os.path.exists(file) else None
+        card = self.card_files.pop(file, None)
+
+        def key(c: Card) -> Tuple[str, str, int, str]:
+            return (c.game, c.type, c.star, c.content)
+
+        if card is not None and new_card is not None and key(card) == key(new_card):
+            self.update_card(card, new_card)
+            self.card_files[file] = card
+            return set()
+
+        res = set()
+        if card is not None and all(other is not card for other in self.card_files.values()):
+            self.remove_card(card)
+            res.add(card.content)
+        if new_card is not None:
+            self.add_card(new_card)
+            self.card_files[file] = self.card_container[new_card.game][new_card.type][new_card.star][new_card.content]
+            res.add(new_card.content)
+        return res
+
     def games(self) -> List[str]:
         """
         返回系统中所有游戏的名称列表
@@ -236,19 +823,33 @@ class CardSystem:
         return res
 
 
+def group_config_contents(config: Dict[str, Dict[str, List[Dict]]]) -> Set[Optional[str]]:
+    """
+    卡组配置 (类型 -> 星级 -> 卡片信息列表) 中引用的卡片内容, 未指定内容的引用记为 None
+    """
+    return {
+        card_info_dict.get("content")
+        for star_dict in config.values()
+        for card_info_list in star_dict.values()
+        for card_info_dict in card_info_list
+    }
+
+
 class StandardGroupSystem:
     """
     常驻卡组管理系统
     """
     def __init__(self, card_group_dir: str, card_system: CardSystem):
+        self.dir = card_group_dir
         self.card_groups: dict[str, SingleTagCardGroup] = {}
         self.card_system = card_system
+        self.group_files: Dict[str, str] = {}                       # 文件路径 -> 卡组名称
+        self.group_refs: Dict[str, Set[Optional[str]]] = {}         # 卡组名称 -> 引用的卡片内容
 
         for filename in os.listdir(card_group_dir):
             if filename.endswith(".json"):
                 filepath = os.path.join(card_group_dir, filename)
-                group = self.load_group_from_json(filepath)
-                self.card_groups[group.name] = group
+                self.reload_group_file(filepath)
 
     def load_group_from_json(self, file: str) -> SingleTagCardGroup:
         """
@@ -259,6 +860,7 @@ class StandardGroupSystem:
         
         group = SingleTagCardGroup(config["name"])
         del config["name"]
+        self.group_refs[group.name] = group_config_contents(config)
 
         card_info_dicts = (
             card_info_dict
@@ -276,6 +878,38 @@ class StandardGroupSystem:
                 group.add_card(card)
         
         return group
+
+    def reload_group_file(self, file: str) -> Set[str]:
+        """
+        (重新) 加载单个常驻卡组文件, 文件已删除时移除对应卡组
+        返回受影响的卡组名称
+        """
+        file = os.path.abspath(file)
+        group = self.load_group_from_json(file) if os.path.exists(file) else None
+        old_name = self.group_files.pop(file, None)
+
+        res = set()
+        if group is not None:
+            self.card_groups[group.name] = group
+            self.group_files[file] = group.name
+            res.add(group.name)
+        if old_name is not None:
+            res.add(old_name)
+            if old_name not in self.group_files.values():
+                self.card_groups.pop(old_name, None)
+                self.group_refs.pop(old_name, None)
+        return res
+
+    def reload_groups_with(self, contents: Set[str]) -> Set[str]:
+        """
+        重新加载引用了 contents 中任一卡片的常驻卡组, 返回受影响的卡组名称
+        """
+        res = set()
+        for file, name in list(self.group_files.items()):
+            refs = self.group_refs.get(name, set())
+            if None in refs or not refs.isdisjoint(contents):
+                res |= self.reload_group_file(file)
+        return res
     
     def get_group(self, name: str) -> SingleTagCardGroup:
         """
@@ -291,15 +925,18 @@ class CardGroupSystem:
     卡组管理系统
     """
     def __init__(self, card_group_dir: str, card_system: CardSystem, standard_group_system: StandardGroupSystem):
+        self.dir = card_group_dir
         self.card_groups: dict[str, CardGroup] = {}
         self.card_system = card_system                          # 卡片系统
         self.standard_group_system = standard_group_system      # 常驻卡组管理系统
+        self.group_files: Dict[str, str] = {}                   # 文件路径 -> 卡组名称
+        self.group_refs: Dict[str, Set[Optional[str]]] = {}     # 卡组名称 -> 引用的卡片内容 (不含常驻卡组)
+        self.group_standards: Dict[str, str] = {}               # 卡组名称 -> 常驻卡组名称
 
         for filename in os.listdir(card_group_dir):
             if filename.endswith(".json"):
                 filepath = os.path.join(card_group_dir, filename)
-                group = self.load_group_from_json(filepath)
-                self.card_groups[group.name] = group
+                self.reload_group_file(filepath)
 
     def load_group_from_json(self, file: str) -> CardGroup:
         """
@@ -314,10 +951,13 @@ class CardGroupSystem:
             version=config["version"],
             is_official=config["is_official"]
         )
+        self.group_standards[group.name] = config[TAG_STANDARD]
+        self.group_refs[group.name] = set()
 
         # 加载其他卡片 (UP, Fes, Appoint)
         for tag in (TAG_UP, TAG_FES, TAG_APPOINT):
             if tag in config:
+                self.group_refs[group.name] |= group_config_contents(config[tag])
                 tag_group = self.load_single_group_from_config(config[tag], f"{group.name}-{tag}")
                 group.add_tag_group(tag, tag_group)
         
@@ -325,7 +965,7 @@ class CardGroupSystem:
             group.set_exclude(config["exclude"])
 
         return group
-    
+
     def load_single_group_from_config(self, config: Dict[str, Dict[int, List[Dict]]], name: str = "") -> SingleTagCardGroup:
         """
         从配置字典中加载单标签卡组
@@ -349,6 +989,40 @@ class CardGroupSystem:
         
         return group
     
+    def reload_group_file(self, file: str) -> Set[str]:
+        """
+        (重新) 加载单个卡组文件, 文件已删除时移除对应卡组
+        返回受影响的卡组名称
+        """
+        file = os.path.abspath(file)
+        group = self.load_group_from_json(file) if os.path.exists(file) else None
+        old_name = self.group_files.pop(file, None)
+
+        res = set()
+        if group is not None:
+            self.card_groups[group.name] = group
+            self.group_files[file] = group.name
+            res.add(group.name)
+        if old_name is not None:
+            res.add(old_name)
+            if old_name not in self.group_files.values():
+                self.card_groups.pop(old_name, None)
+                self.group_refs.pop(old_name, None)
+                self.group_standards.pop(old_name, None)
+        return res
+
+    def reload_groups_with(self, contents: Set[str], standard_names: Set[str]) -> Set[str]:
+        """
+        重新加载引用了 contents 中任一卡片或使用了 standard_names 中任一常驻卡组的卡组
+        返回受影响的卡组名称
+        """
+        res = set()
+        for file, name in list(self.group_files.items()):
+            refs = self.group_refs.get(name, set())
+            if None in refs or not refs.isdisjoint(contents) or self.group_standards.get(name) in standard_names:
+                res |= self.reload_group_file(file)
+        return res
+
     def has_group(self, name: str) -> bool:
         """
         检查是否包含某个卡组
@@ -370,12 +1044,93 @@ class CardGroupSystem:
         return list(self.card_groups.keys())
 
 
+class SystemCache:
+    """
+    卡片系统启动缓存
+    将加载完成的 CardSystem / StandardGroupSystem / CardGroupSystem 以 pickle 格式整体保存到单个文件
+    以卡片、常驻卡组、卡组目录下所有 json 文件的修改时间和大小作为缓存键, 任一源文件变化时缓存自动失效并重建
+    """
+    def __init__(
+            self,
+            cache_file: str,
+            cards_dir: str,
+            dir_config: Dict[str, Dict[str, Sequence[int]]],
+            standard_group_dir: str,
+            card_group_dir: str
+            ) -> None:
+        self.cache_file = cache_file
+        self.cards_dir = cards_dir
+        self.dir_config = dir_config
+        self.standard_group_dir = standard_group_dir
+        self.card_group_dir = card_group_dir
+
+    def signature(self) -> Dict:
+        """
+        缓存键
+        """
+        files: Dict[str, Tuple[int, int]] = {}
+        for dir_path in (self.cards_dir, self.standard_group_dir, self.card_group_dir):
+            scan_json_files(dir_path, files)
+        return {
+            "version": SYSTEM_CACHE_VERSION,
+            "wishes_version": VERSION,
+            "dir_config": self.dir_config,
+            "files": files,
+        }
+
+    def load(self, signature: Dict) -> Optional[Tuple[CardSystem, StandardGroupSystem, CardGroupSystem]]:
+        """
+        读取缓存, 缓存不存在、损坏或已失效时返回 None
+        """
+        if not os.path.exists(self.cache_file):
+            return None
+        try:
+            with open(self.cache_file, "rb") as f:
+                data = pickle.load(f)
+        except Exception:
+            return None
+        if not isinstance(data, dict) or data.get("signature") != signature:
+            return None
+        return data["systems"]
+
+    def save(self, signature: Dict, systems: Tuple[CardSystem, StandardGroupSystem, CardGroupSystem]):
+        """
+        写入缓存 (先写入临时文件再替换, 避免写入中断时留下损坏的缓存)
+        """
+        temp_file = self.cache_file + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            with open(temp_file, "wb") as f:
+                pickle.dump({"signature": signature, "systems": systems}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_file, self.cache_file)
+        except OSError as e:
+            print(f"\033[31mSystemCache: 缓存写入失败: {e}\033[0m")
+
+    def load_systems(self) -> Tuple[CardSystem, StandardGroupSystem, CardGroupSystem]:
+        """
+        加载卡片系统、常驻卡组系统和卡组系统
+        缓存有效时直接从缓存读取, 否则从源文件加载并更新缓存
+        """
+        signature = self.signature()
+        systems = self.load(signature)
+        if systems is not None:
+            return systems
+
+        card_system = CardSystem(self.cards_dir, self.dir_config)
+        standard_group_system = StandardGroupSystem(self.standard_group_dir, card_system)
+        card_group_system = CardGroupSystem(self.card_group_dir, card_system, standard_group_system)
+        systems = (card_system, standard_group_system, card_group_system)
+        self.save(signature, systems)
+        return systems
+
+
 class WishLogicSystem:
     """
     抽卡逻辑管理系统
     """
     def __init__(self, logic_config_dir: str) -> None:
         self.dir = logic_config_dir
+        self.logic_files: Dict[str, str] = {}   # 文件路径 -> 抽卡逻辑名称
         # 管理层级: 抽卡逻辑名称: 抽卡逻辑对象 (模板原型)
         self.logics: Dict[str, WishLogic] = self.load_all_logics(logic_config_dir)
         
@@ -387,8 +1142,10 @@ class WishLogicSystem:
         for filename in os.listdir(rule_config_dir):
             try:
                 if filename.endswith(".json"):
-                    logic = self.load_logic(os.path.join(rule_config_dir, filename))
+                    file = os.path.join(rule_config_dir, filename)
+                    logic = self.load_logic(file)
                     logics[logic.name] = logic
+                    self.logic_files[os.path.abspath(file)] = logic.name
             except Exception as e:
                 print(f"\033[31mWishRuleSystem: {filename} 加载失败: {e}\033[0m")
         
@@ -422,6 +1179,26 @@ class WishLogicSystem:
         #             del config[key][star_key]
         
         return WishLogic(config)
+
+    def reload_logic_file(self, file: str) -> Set[str]:
+        """
+        (重新) 加载单个抽卡逻辑文件, 文件已删除时移除对应抽卡逻辑
+        返回受影响的抽卡逻辑名称
+        """
+        file = os.path.abspath(file)
+        logic = self.load_logic(file) if os.path.exists(file) else None
+        old_name = self.logic_files.pop(file, None)
+
+        res = set()
+        if logic is not None:
+            self.logics[logic.name] = logic
+            self.logic_files[file] = logic.name
+            res.add(logic.name)
+        if old_name is not None:
+            res.add(old_name)
+            if old_name not in self.logic_files.values():
+                self.logics.pop(old_name, None)
+        return res
     
     def get_logic(self, name: str) -> WishLogic:
         """
@@ -446,6 +1223,7 @@ class CardPoolSystem:
         self.card_pool_dir = card_pool_dir
         # 管理层级: 卡池名称: 卡池对象
         self.card_pool_group: dict[str, CardPool] = {}
+        self.card_pool_files: Dict[str, str] = {}   # 文件路径 -> 卡池名称
         self.card_group_system = card_group_system
         self.wish_logic_system = wish_logic_system
 
@@ -468,11 +1246,101 @@ class CardPoolSystem:
         logic.load_state(logic_state)       # 加载抽卡逻辑状态
 
         auto_record_to_file = data["auto_record_to_file"]
+        recorder_storage = data.get("recorder_storage", RECORDER_STORAGE_PROFILE)
+        recorder_async = data.get("recorder_async", False)
+        recorder_details_format = data.get("recorder_details_format", DETAILS_FORMAT_CSV)
 
-        card_pool = CardPool(name, logic, card_group, data["recorder_dir"], auto_record_to_file=auto_record_to_file)
+        card_pool = CardPool(
+            name, logic, card_group, data["recorder_dir"],
+            auto_record_to_file=auto_record_to_file, recorder_storage=recorder_storage, recorder_async=recorder_async,
+            recorder_details_format=recorder_details_format
+        )
         self.card_pool_group[name] = card_pool
+        self.card_pool_files[os.path.abspath(card_pool_config_file)] = name
 
         return card_pool
+
+    def update_card_pool(self, card_pool: CardPool, data: Dict):
+        """
+        按卡池配置数据原地更新卡池, 保持卡池当前的逻辑状态和抽卡记录
+        *仅在切换抽卡逻辑时加载配置中的逻辑状态
+        """
+        if card_pool.card_group.name != data["card_group"]:
+            card_pool.card_group = self.card_group_system.get_group(data["card_group"])
+
+        if card_pool.logic.name != data["logic"]:
+            card_pool.logic = self.wish_logic_system.get_logic(data["logic"])
+            card_pool.set_logic_state(data["logic_state"])
+
+        recorder = card_pool.recorder
+        recorder_storage = data.get("recorder_storage", RECORDER_STORAGE_PROFILE)
+        recorder_async = data.get("recorder_async", False)
+        recorder_details_format = data.get("recorder_details_format", DETAILS_FORMAT_CSV)
+        if (recorder.dir, recorder.storage, recorder.async_write, recorder.details_format) != \
+                (data["recorder_dir"], recorder_storage, recorder_async, recorder_details_format):
+            recorder.compact()
+            recorder.close()
+            card_pool.recorder = create_recorder(
+                data["recorder_dir"], card_pool.card_group.max_star, storage=recorder_storage,
+                async_write=recorder_async, details_format=recorder_details_format
+            )
+        card_pool.recorder.auto_to_file = data["auto_record_to_file"]
+
+    def reload_card_pool_file(self, file: str) -> Set[str]:
+        """
+        (重新) 加载单个卡池文件, 文件已删除时移除对应卡池, 并写入其全部记录、结束写入线程
+        已存在的同名卡池原地更新 (见 update_card_pool), 否则加载为新卡池
+        返回受影响的卡池名称
+        """
+        file = os.path.abspath(file)
+        data = None
+        if os.path.exists(file):
+            with open(file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        old_name = self.card_pool_files.pop(file, None)
+
+        res = set()
+        if data is not None:
+            name = data["name"]
+            if name in self.card_pool_group:
+                self.update_card_pool(self.card_pool_group[name], data)
+                self.card_pool_files[file] = name
+            else:
+                self.load_card_pool(file)
+            res.add(name)
+        if old_name is not None:
+            res.add(old_name)
+            if old_name not in self.card_pool_files.values():
+                card_pool = self.card_pool_group.pop(old_name, None)
+                if card_pool is not None:
+                    card_pool.recorder.compact()
+                    card_pool.recorder.close()
+        return res
+
+    def rebind_card_groups(self, names: Set[str]) -> Set[str]:
+        """
+        将使用 names 中卡组的卡池切换到卡组系统中的当前卡组对象, 返回受影响的卡池名称
+        """
+        res = set()
+        for card_pool in self.card_pool_group.values():
+            if card_pool.card_group.name in names:
+                card_pool.card_group = self.card_group_system.get_group(card_pool.card_group.name)
+                res.add(card_pool.name)
+        return res
+
+    def rebind_logics(self, names: Set[str]) -> Set[str]:
+        """
+        将使用 names 中抽卡逻辑的卡池切换到逻辑系统中的当前逻辑对象, 并迁移卡池当前的逻辑状态
+        返回受影响的卡池名称
+        """
+        res = set()
+        for card_pool in self.card_pool_group.values():
+            if card_pool.logic.name in names:
+                state = card_pool.get_logic_state()
+                card_pool.logic = self.wish_logic_system.get_logic(card_pool.logic.name)
+                card_pool.set_logic_state(state)
+                res.add(card_pool.name)
+        return res
     
     def save_card_pool(self, name: str, file: str):
         """
@@ -488,13 +1356,16 @@ class CardPoolSystem:
             "logic": card_pool.logic.name,
             "recorder_dir": card_pool.recorder.dir,
             "auto_record_to_file": card_pool.recorder.auto_to_file,
+            "recorder_storage": card_pool.recorder.storage,
+            "recorder_async": card_pool.recorder.async_write,
+            "recorder_details_format": card_pool.recorder.details_format,
             "logic_state": card_pool.get_logic_state()
         }
 
         with open(file, "w", encoding="utf-8") as f:
             json.dump(data, f, indent=4, ensure_ascii=False)
         
-        card_pool.recorder._write_file()
+        card_pool.recorder.flush()
     
     def has_card_pool(self, name: str) -> bool:
         """
@@ -527,4 +1398,126 @@ class CardPoolSystem:
         返回卡池个数
         """
         return len(self.card_pool_group.keys())
-    
\ No newline at end of file
+
+    def close(self):
+        """
+        等待所有卡池的后台写入完成并结束写入线程 (程序退出时调用)
+        """
+        for card_pool in self.card_pool_group.values():
+            if card_pool.recorder.writer is not None:
+                card_pool.recorder.close()
+    
+
+class HotReloader:
+    """
+    数据目录热重载
+    监视卡片、常驻卡组、卡组、抽卡逻辑和卡池目录, 将文件变化增量应用到各管理系统:
+        卡片: 原地更新卡片; 卡片增删或改变位置时, 重建引用该卡片的常驻卡组和卡组
+        常驻卡组: 重建该常驻卡组, 以及使用它的卡组
+        卡组: 重建该卡组
+        抽卡逻辑: 重建该抽卡逻辑
+        卡池: 原地更新或加载该卡池 (见 CardPoolSystem.reload_card_pool_file)
+    使用了被重建卡组或抽卡逻辑的卡池切换到新对象, 卡池的逻辑状态和抽卡记录保持不变
+    watcher: 文件监视器, 默认由 create_watcher 创建
+    *变化只在调用 reload 时于调用线程中应用, 不会与抽卡同时进行
+    """
+    def __init__(
+            self,
+            card_system: CardSystem,
+            standard_group_system: StandardGroupSystem,
+            card_group_system: CardGroupSystem,
+            wish_logic_system: WishLogicSystem,
+            card_pool_system: CardPoolSystem,
+            watcher: Optional[FileWatcher] = None
+            ) -> None:
+        self.card_system = card_system
+        self.standard_group_system = standard_group_system
+        self.card_group_system = card_group_system
+        self.wish_logic_system = wish_logic_system
+        self.card_pool_system = card_pool_system
+
+        # 监视目录 -> 文件类别, 按目录顺序处理
+        self.dirs: Dict[str, str] = {
+            os.path.abspath(card_system.cards_dir): "cards",
+            os.path.abspath(standard_group_system.dir): "standard_groups",
+            os.path.abspath(card_group_system.dir): "card_groups",
+            os.path.abspath(wish_logic_system.dir): "logics",
+            os.path.abspath(card_pool_system.card_pool_dir): "card_pools",
+        }
+        self.watcher = watcher if watcher is not None else create_watcher(self.dirs.keys())
+
+    def category(self, file: str) -> Optional[str]:
+        """
+        文件所属的类别, 不在监视目录中时返回 None
+        """
+        for dir_path, category in self.dirs.items():
+            if file.startswith(dir_path + os.sep):
+                return category
+        return None
+
+    def reload(self) -> Dict[str, Set[str]]:
+        """
+        取出文件监视器收集的变化并应用, 见 apply
+        """
+        files = self.watcher.changes()
+        if not files:
+            return {}
+        return self.apply(files)
+
+    def apply(self, files: Set[str]) -> Dict[str, Set[str]]:
+        """
+        应用一批文件变化
+        返回各类别中受影响的名称 (cards 为卡片内容, 其余为卡组、抽卡逻辑、卡池名称), 没有变化的类别不包含在内
+        单个文件加载失败时跳过该文件并输出错误信息
+        """
+        categorized: Dict[str, List[str]] = {category: [] for category in self.dirs.values()}
+        for file in sorted(os.path.abspath(file) for file in files):
+            category = self.category(file)
+            if category is not None:
+                categorized[category].append(file)
+
+        def each(category: str, reload_file) -> Set[str]:
+            res: Set[str] = set()
+            for file in categorized[category]:
+                try:
+                    res |= reload_file(file)
+                except Exception as e:
+                    print(f"\033[31mHotReloader: {file} 加载失败: {e}\033[0m")
+            return res
+
+        # 卡片
+        card_files = self.card_system.card_files
+        touched: Set[str] = set()
+        for file in categorized["cards"]:
+            old_card = card_files.get(file)
+            if old_card is not None:
+                touched.add(old_card.content)
+        moved = each("cards", self.card_system.reload_card_file)
+        touched |= moved
+        touched.update(card_files[file].content for file in categorized["cards"] if file in card_files)
+
+        # 卡组
+        standard_groups = each("standard_groups", self.standard_group_system.reload_group_file)
+        if moved:
+            standard_groups |= self.standard_group_system.reload_groups_with(moved)
+        card_groups = each("card_groups", self.card_group_system.reload_group_file)
+        if moved or standard_groups:
+            card_groups |= self.card_group_system.reload_groups_with(moved, standard_groups)
+
+        # 抽卡逻辑和卡池
+        logics = each("logics", self.wish_logic_system.reload_logic_file)
+        card_pools = each("card_pools", self.card_pool_system.reload_card_pool_file)
+        card_pools |= self.card_pool_system.rebind_card_groups(card_groups)
+        card_pools |= self.card_pool_system.rebind_logics(logics)
+
+        res = {
+            "cards": touched,
+            "standard_groups": standard_groups,
+            "card_groups": card_groups,
+            "logics": logics,
+            "card_pools": card_pools,
+        }
+        return {category: names for category, names in res.items() if names}
+
+    def close(self):
+        self.watcher.close()
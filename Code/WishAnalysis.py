@@ -0,0 +1,224 @@
+r"""
+Wishes v3.0
+-----------
+
+Module
+_
+    WishAnalysis
+
+Description
+_
+    Wishes 抽卡逻辑解析分析模块
+    不进行抽样, 通过对规则状态的动态规划直接计算精确的抽数分布
+"""
+
+
+from Const import *
+from WishRule import (
+    WishLogic, StarCounterRule, StarProbabilityRule, StarPityRule,
+    StarProbabilityIncreaseRule, StarProbabilityIntervalIncreaseRule,
+)
+from typing import Dict, List, Optional, Tuple
+
+
+class PullDistribution:
+    """
+    抽数分布
+    pmf[k] 为第 k 抽恰好抽出目标的概率 (pmf[0] 恒为 0)
+    tail 为计算截止时仍未抽出目标的概率 (存在保底时为 0)
+    """
+    def __init__(self, pmf: List[float], tail: float = 0.0) -> None:
+        self.pmf = pmf
+        self.tail = tail
+
+        self.cdf: List[float] = []
+        total = 0.0
+        for p in pmf:
+            total += p
+            self.cdf.append(total)
+
+    def __str__(self) -> str:
+        return f"PullDistribution(max={self.max_pulls()}, mean={self.mean():.4f}, tail={self.tail:.3e})"
+
+    def max_pulls(self) -> int:
+        """
+        分布中概率不为 0 的最大抽数
+        """
+        for k in range(len(self.pmf) - 1, -1, -1):
+            if self.pmf[k] > 0:
+                return k
+        return 0
+
+    def probability(self, pulls: int) -> float:
+        """
+        恰好在第 pulls 抽抽出目标的概率
+        """
+        return self.pmf[pulls] if 0 <= pulls < len(self.pmf) else 0.0
+
+    def cumulative(self, pulls: int) -> float:
+        """
+        在 pulls 抽内 (含) 抽出目标的概率
+        """
+        if pulls < 0:
+            return 0.0
+        return self.cdf[min(pulls, len(self.cdf) - 1)]
+
+    def mean(self) -> float:
+        """
+        期望抽数 (以已计算部分为准, tail 不为 0 时偏小)
+        """
+        return sum(k * p for k, p in enumerate(self.pmf))
+
+    def variance(self) -> float:
+        mean = self.mean()
+        return sum((k - mean) ** 2 * p for k, p in enumerate(self.pmf))
+
+    def quantile(self, q: float) -> int:
+        """
+        最小的抽数 k, 使得 k 抽内抽出目标的概率不小于 q
+        若计算范围内达不到 q, 返回 -1
+        """
+        for k, c in enumerate(self.cdf):
+            if c >= q - 1e-12:
+                return k
+        return -1
+
+
+class StarTransition:
+    """
+    星级子系统的状态转移
+    状态为影响星级决定的星级计数器取值 (仅包含被 StarPityRule 和概率增长规则读取的星级)
+    按 WishLogic 中的规则顺序, 精确复现 StarPityRule / 概率增长规则 / StarProbabilityRule /
+    StarCounterRule 对星级和星级计数器的操作; 其他规则不影响星级, 不参与计算
+    """
+    def __init__(self, logic: WishLogic) -> None:
+        self.rules = [
+            rule for rule in logic.rules
+            if isinstance(rule, (
+                StarCounterRule, StarProbabilityRule, StarPityRule,
+                StarProbabilityIncreaseRule, StarProbabilityIntervalIncreaseRule
+            ))
+        ]
+
+        counter_rule = logic.ctx.rule_bridge.get(StarCounterRule.tag)
+        probability_rule = logic.ctx.rule_bridge.get(StarProbabilityRule.tag)
+        if not isinstance(counter_rule, StarCounterRule):
+            raise ValueError(f"StarTransition: 抽卡逻辑 '{logic.name}' 缺少 {StarCounterRule.tag}")
+        if not isinstance(probability_rule, StarProbabilityRule):
+            raise ValueError(f"StarTransition: 抽卡逻辑 '{logic.name}' 缺少 {StarProbabilityRule.tag}")
+        self.probability_rule = probability_rule
+
+        # 参与状态的星级
+        read_stars = set()
+        for rule in self.rules:
+            if isinstance(rule, StarPityRule):
+                read_stars.update(rule.star_pity.keys())
+            elif isinstance(rule, (StarProbabilityIncreaseRule, StarProbabilityIntervalIncreaseRule)):
+                read_stars.update(star for star, _, _ in rule.weight_table.axes) # type: ignore
+        self.stars: Tuple[int, ...] = tuple(star for star in counter_rule.star_counter.keys() if star in read_stars)
+
+        # 状态 -> [(概率, 抽出星级, 下一状态)]
+        self.cache: Dict[Tuple[int, ...], List[Tuple[float, int, Tuple[int, ...]]]] = {}
+
+    def state_of(self, star_counter: Dict[int, int]) -> Tuple[int, ...]:
+        return tuple(star_counter.get(star, 0) for star in self.stars)
+
+    def transitions(self, state: Tuple[int, ...]) -> List[Tuple[float, int, Tuple[int, ...]]]:
+        """
+        返回从 state 出发抽一次的所有结果: (概率, 抽出星级, 下一状态)
+        """
+        if state in self.cache:
+            return self.cache[state]
+
+        base_cum_weights = self.probability_rule.base_cum_weights
+        # 分支: [概率, 星级, 计数器, 累积权重]
+        branches = [[1.0, 0, dict(zip(self.stars, state)), base_cum_weights]]
+
+        for rule in self.rules:
+            if isinstance(rule, StarPityRule):
+                for branch in branches:
+                    star_counter = branch[2]
+                    for star, threshold in rule.star_pity.items():
+                        if star_counter.get(star, 0) + 1 >= threshold:
+                            branch[1] = star
+                            star_counter[star] = 0
+                            break
+            elif isinstance(rule, (StarProbabilityIncreaseRule, StarProbabilityIntervalIncreaseRule)):
+                for branch in branches:
+                    branch[3] = rule.weight_table.lookup(branch[2]) # type: ignore
+            elif isinstance(rule, StarProbabilityRule):
+                new_branches = []
+                for branch in branches:
+                    probability, decided, star_counter, cum_weights = branch
+                    if decided:
+                        new_branches.append(branch)
+                        continue
+                    total = cum_weights[-1] if cum_weights else 0
+                    previous = 0
+                    for star, cum in zip(rule.stars, cum_weights):
+                        if cum > previous:
+                            new_branches.append([probability * (cum - previous) / total, star, dict(star_counter), cum_weights])
+                        previous = cum
+                branches = new_branches
+
+        for rule in self.rules:
+            if isinstance(rule, StarCounterRule):
+                for branch in branches:
+                    star_counter = branch[2]
+                    for star in star_counter.keys():
+                        star_counter[star] += 1
+                    if branch[1] in star_counter:
+                        star_counter[branch[1]] = 0
+            elif isinstance(rule, StarPityRule) and rule.reset_lower_pity:
+                for branch in branches:
+                    star_counter = branch[2]
+                    for star in star_counter.keys():
+                        if star < branch[1]:
+                            star_counter[star] = 0
+
+        res = [(branch[0], branch[1], self.state_of(branch[2])) for branch in branches]
+        self.cache[state] = res
+        return res
+
+
+def star_pull_distribution(
+        logic: WishLogic,
+        star: Optional[int] = None,
+        state: Optional[Dict] = None,
+        max_pulls: int = 100_000,
+        tolerance: float = 1e-15
+        ) -> PullDistribution:
+    """
+    计算从当前逻辑状态出发, 抽出下一个指定星级卡片所需抽数的精确分布
+    star: 目标星级, 默认为 StarProbabilityRule 中的最高星级
+    state: 逻辑状态字典 (与 CardPool.get_logic_state 格式相同), 默认使用 logic 的当前状态
+    max_pulls / tolerance: 无保底时的截止条件, 截止时剩余概率记入 tail
+    *logic 本身不会被修改
+    """
+    if state is not None:
+        logic = logic.copy()
+        logic.load_state(state)
+
+    transition = StarTransition(logic)
+    if star is None:
+        star = max(transition.probability_rule.stars, default=0)
+
+    counter_rule: StarCounterRule = logic.ctx.rule_bridge[StarCounterRule.tag] # type: ignore
+    distribution: Dict[Tuple[int, ...], float] = {transition.state_of(counter_rule.star_counter): 1.0}
+
+    pmf = [0.0]
+    remaining = 1.0
+    while distribution and len(pmf) <= max_pulls and remaining > tolerance:
+        hit = 0.0
+        next_distribution: Dict[Tuple[int, ...], float] = {}
+        for current, probability in distribution.items():
+            for p, drawn, next_state in transition.transitions(current):
+                if drawn == star:
+                    hit += probability * p
+                else:
+                    next_distribution[next_state] = next_distribution.get(next_state, 0.0) + probability * p
+        pmf.append(hit)
+        remaining = sum(next_distribution.values())
+        distribution = next_distribution
+
+    return PullDistribution(pmf, tail=remaining if remaining > tolerance else 0.0)
@@ -0,0 +1,355 @@
+r"""
+Wishes v3.0
+-----------
+
+Module
+_
+    WishMarkov
+
+Description
+_
+    Wishes 马尔可夫链模块
+    将 WishLogic 展开为有限状态马尔可夫链, 不经抽样直接计算长期出率, 首达抽数分布和多步分布
+    链的状态由各规则的 markov_state 组成, 转移通过枚举规则执行中的所有随机分支得到
+    *依赖 numpy, to_scipy 额外依赖 scipy
+"""
+
+
+import numpy as np
+from Const import *
+from Base import Card, PackedCard, CardGroup, TagSet
+from WishRule import WishLogic
+from WishAnalysis import PullDistribution
+from typing import Dict, List, Optional, Tuple
+
+
+# 链的输出符号: (星级, 类型, 实际抽出标签)
+Symbol = Tuple[int, str, str]
+
+
+class BranchRandom:
+    """
+    枚举随机分支的随机数源
+    按给定的选择序列回放随机抽取, 超出序列后选择第一个可能结果, 并记录其余可能结果
+    """
+    def __init__(self) -> None:
+        self.script: List[int] = []         # 回放的选择序列
+        self.path: List[int] = []           # 本次执行的实际选择序列
+        self.probability = 1.0              # 本次执行路径的概率
+        self.alternatives: List[Tuple[int, List[int]]] = []     # (位置, 其余可选下标)
+
+    def start(self, script: List[int]):
+        self.script = script
+        self.path = []
+        self.probability = 1.0
+        self.alternatives = []
+
+    def choices(self, population, weights=None, *, cum_weights=None, k=1) -> list:
+        if k != 1:
+            raise ValueError("BranchRandom: 仅支持单次抽取 (k=1)")
+
+        if cum_weights is not None:
+            previous = 0
+            weights = []
+            for cum in cum_weights:
+                weights.append(cum - previous)
+                previous = cum
+        total = sum(weights) # type: ignore
+        options = [i for i, weight in enumerate(weights) if weight > 0] # type: ignore
+
+        position = len(self.path)
+        if position < len(self.script):
+            index = self.script[position]
+        else:
+            index = options[0]
+            if len(options) > 1:
+                self.alternatives.append((position, options[1:]))
+
+        self.path.append(index)
+        self.probability *= weights[index] / total # type: ignore
+        return [population[index]]
+
+    def hit(self, weight: int) -> bool:
+        weight = min(max(weight, 0), MAX_PROBABILITY)
+        return self.choices((True, False), (weight, MAX_PROBABILITY - weight))[0]
+
+
+class WishMarkovChain:
+    """
+    抽卡逻辑的马尔可夫链
+    从初始状态出发, 广度优先展开所有可达状态, 转移以稀疏行 (CSR) 形式保存
+    每条转移附带输出符号 (星级, 类型, 实际抽出标签), 用于统计出率和首达抽数
+    card_group: 提供时按实际卡片组计算每抽卡片的标签 (如 UP 卡片恰为 Appoint 卡片的情况)
+                不提供时, 卡片标签仅由逻辑结果决定
+    """
+    def __init__(
+            self,
+            logic: WishLogic,
+            card_group: Optional[CardGroup] = None,
+            state: Optional[Dict] = None,
+            max_states: int = 1_000_000
+            ) -> None:
+        self.logic = logic.copy()
+        if state is not None:
+            self.logic.load_state(state)
+        self.rng = BranchRandom()
+        self.logic.set_random(self.rng) # type: ignore
+        self.card_group = card_group
+        self.max_states = max_states
+
+        self.states: List[Tuple] = []
+        self.state_index: Dict[Tuple, int] = {}
+        self.symbols: List[Symbol] = []
+        self.symbol_index: Dict[Symbol, int] = {}
+        self.packed_cache: Dict[Tuple[int, str, str], Tuple[List[PackedCard], List[int]]] = {}
+
+        self.build()
+
+    def __str__(self) -> str:
+        return f"WishMarkovChain({self.logic.name}, states={self.size}, transitions={len(self.probs)}, symbols={len(self.symbols)})"
+
+    @property
+    def size(self) -> int:
+        return len(self.states)
+
+    def add_state(self, state: Tuple) -> int:
+        if state not in self.state_index:
+            if len(self.states) >= self.max_states:
+                raise OverflowError(f"WishMarkovChain: 状态数超过上限 {self.max_states}")
+            self.state_index[state] = len(self.states)
+            self.states.append(state)
+        return self.state_index[state]
+
+    def add_symbol(self, symbol: Symbol) -> int:
+        if symbol not in self.symbol_index:
+            self.symbol_index[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+        return self.symbol_index[symbol]
+
+    def packed_cards(self, type_: str, star: int, tag: str) -> Tuple[List[PackedCard], List[int]]:
+        """
+        逻辑结果对应的可能卡片 (按卡片标签组合合并) 及其权重
+        """
+        key = (star, type_, tag)
+        if key in self.packed_cache:
+            return self.packed_cache[key]
+
+        if self.card_group is None:
+            res = ([PackedCard(Card("", "", star, type_, ""), tag, TagSet(TagSet.flag(tag)))], [1])
+        else:
+            groups = self.card_group.single_tag_card_groups
+            group = groups.get(tag)
+            cards = []
+            if group is not None and type_ in group.cards and star in group.cards[type_]:
+                cards = [card for card in group.cards[type_][star].values() if not group.has_exclude_card(card)]
+
+            if not cards:
+                res = ([PackedCard(Card.none())], [1])
+            else:
+                # 标签组合 -> [代表卡片, 卡片数]
+                combos: Dict[TagSet, list] = {}
+                for card in cards:
+                    combo = combos.setdefault(self.card_group.tags_of(card, tag), [card, 0])
+                    combo[1] += 1
+                res = (
+                    [PackedCard(card, tag, tags) for tags, (card, _) in combos.items()],
+                    [count for _, count in combos.values()]
+                )
+
+        self.packed_cache[key] = res
+        return res
+
+    def expand(self, state: Tuple) -> List[Tuple[float, int, Tuple]]:
+        """
+        枚举从 state 出发抽一次的所有结果: (概率, 输出符号编号, 下一状态)
+        """
+        logic = self.logic
+        rng = self.rng
+        res: Dict[Tuple[int, Tuple], float] = {}
+
+        stack: List[List[int]] = [[]]
+        while stack:
+            script = stack.pop()
+            logic.load_markov_state(state)
+            rng.start(script)
+
+            result = logic.wish()
+            tag = result.card_tag()
+
+            # 卡片选择同样作为一次随机分支
+            packed_cards, weights = self.packed_cards(result.type_, result.star, tag)
+            packed_card = rng.choices(packed_cards, weights)[0]
+            logic.callback(packed_card)
+
+            key = (self.add_symbol((result.star, result.type_, tag)), logic.markov_state())
+            res[key] = res.get(key, 0.0) + rng.probability
+
+            path = rng.path
+            for position, options in rng.alternatives:
+                for index in options:
+                    stack.append(path[:position] + [index])
+
+        return [(probability, symbol, next_state) for (symbol, next_state), probability in res.items()]
+
+    def build(self):
+        """
+        展开所有可达状态, 生成 CSR 形式的转移矩阵
+        """
+        self.initial = self.add_state(self.logic.markov_state())
+
+        row_ptr = [0]
+        cols: List[int] = []
+        probs: List[float] = []
+        edge_symbols: List[int] = []
+
+        current = 0
+        while current < len(self.states):
+            for probability, symbol, next_state in self.expand(self.states[current]):
+                cols.append(self.add_state(next_state))
+                probs.append(probability)
+                edge_symbols.append(symbol)
+            row_ptr.append(len(cols))
+            current += 1
+
+        self.row_ptr = np.array(row_ptr, dtype=np.int64)
+        self.cols = np.array(cols, dtype=np.int64)
+        self.probs = np.array(probs, dtype=np.float64)
+        self.edge_symbols = np.array(edge_symbols, dtype=np.int64)
+        self.rows = np.repeat(np.arange(self.size, dtype=np.int64), np.diff(self.row_ptr))
+
+    def initial_distribution(self) -> np.ndarray:
+        distribution = np.zeros(self.size)
+        distribution[self.initial] = 1.0
+        return distribution
+
+    def step(self, distribution: np.ndarray, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        分布推进一抽, mask 为 False 的转移被丢弃
+        """
+        weights = distribution[self.rows] * self.probs
+        if mask is not None:
+            weights = weights * mask
+        return np.bincount(self.cols, weights=weights, minlength=self.size)
+
+    def distribution(self, draws: int, initial: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        从初始分布出发抽 draws 次后的状态分布
+        """
+        distribution = self.initial_distribution() if initial is None else initial
+        for _ in range(draws):
+            distribution = self.step(distribution)
+        return distribution
+
+    def stationary(self, tolerance: float = 1e-13, max_iterations: int = 1_000_000) -> np.ndarray:
+        """
+        平稳分布 (从初始状态出发的长期状态分布)
+        安装 scipy 时直接求解稀疏线性方程组 pi (P - I) = 0, sum(pi) = 1
+        否则 (或方程组奇异, 即存在多个常返类时) 使用幂迭代
+        """
+        try:
+            from scipy.sparse import csr_matrix
+            from scipy.sparse.linalg import spsolve
+        except ImportError:
+            return self.stationary_iteration(tolerance, max_iterations)
+
+        # 以归一化条件替换初始状态对应的方程
+        keep = self.cols != self.initial
+        rows = np.concatenate((self.cols[keep], np.arange(self.size), np.full(self.size, self.initial)))
+        cols = np.concatenate((self.rows[keep], np.arange(self.size), np.arange(self.size)))
+        data = np.concatenate((self.probs[keep], -(np.arange(self.size) != self.initial).astype(np.float64), np.ones(self.size)))
+        matrix = csr_matrix((data, (rows, cols)), shape=(self.size, self.size))
+        rhs = np.zeros(self.size)
+        rhs[self.initial] = 1.0
+
+        with np.errstate(all="ignore"):
+            distribution = spsolve(matrix, rhs)
+        if not np.all(np.isfinite(distribution)) or np.abs(distribution.sum() - 1) > 1e-9 or distribution.min() < -1e-9:
+            return self.stationary_iteration(tolerance, max_iterations)
+        return np.maximum(distribution, 0.0)
+
+    def stationary_iteration(self, tolerance: float = 1e-13, max_iterations: int = 1_000_000) -> np.ndarray:
+        """
+        幂迭代求平稳分布
+        使用惰性链 (P + I) / 2, 避免周期链不收敛
+        """
+        distribution = self.initial_distribution()
+        for _ in range(max_iterations):
+            next_distribution = (distribution + self.step(distribution)) / 2
+            if np.abs(next_distribution - distribution).sum() < tolerance:
+                return next_distribution
+            distribution = next_distribution
+        return distribution
+
+    def symbol_rates(self, distribution: Optional[np.ndarray] = None) -> Dict[Symbol, float]:
+        """
+        给定状态分布下, 下一抽各输出符号的概率
+        默认使用平稳分布, 即长期出率
+        """
+        if distribution is None:
+            distribution = self.stationary()
+        rates = np.bincount(
+            self.edge_symbols,
+            weights=distribution[self.rows] * self.probs,
+            minlength=len(self.symbols)
+        )
+        return {symbol: float(rate) for symbol, rate in zip(self.symbols, rates)}
+
+    def expected_counts(self, draws: int, initial: Optional[np.ndarray] = None) -> Dict[Symbol, float]:
+        """
+        从初始分布出发抽 draws 次, 各输出符号的期望出现次数
+        """
+        distribution = self.initial_distribution() if initial is None else initial
+        counts = np.zeros(len(self.symbols))
+        for _ in range(draws):
+            weights = distribution[self.rows] * self.probs
+            counts += np.bincount(self.edge_symbols, weights=weights, minlength=len(self.symbols))
+            distribution = np.bincount(self.cols, weights=weights, minlength=self.size)
+        return {symbol: float(count) for symbol, count in zip(self.symbols, counts)}
+
+    def symbol_mask(self, star: Optional[int] = None, type_: Optional[str] = None, tag: Optional[str] = None) -> np.ndarray:
+        """
+        输出符号匹配 (未指定的项不限制) 的转移掩码
+        """
+        matched = np.array([
+            (star is None or symbol[0] == star) and
+            (type_ is None or symbol[1] == type_) and
+            (tag is None or symbol[2] == tag)
+            for symbol in self.symbols
+        ], dtype=bool)
+        return matched[self.edge_symbols]
+
+    def first_passage(
+            self,
+            star: Optional[int] = None,
+            type_: Optional[str] = None,
+            tag: Optional[str] = None,
+            initial: Optional[np.ndarray] = None,
+            max_pulls: int = 100_000,
+            tolerance: float = 1e-15
+            ) -> PullDistribution:
+        """
+        首达抽数分布: 从初始分布出发, 首次抽出匹配 (星级, 类型, 标签) 的卡片所需抽数
+        例: first_passage(star=5, tag=TAG_UP) 为抽出第一个 5 星 UP 所需抽数
+        """
+        hit_mask = self.symbol_mask(star, type_, tag)
+        miss_mask = ~hit_mask
+        distribution = self.initial_distribution() if initial is None else initial
+
+        pmf = [0.0]
+        remaining = float(distribution.sum())
+        while len(pmf) <= max_pulls and remaining > tolerance:
+            weights = distribution[self.rows] * self.probs
+            pmf.append(float(weights[hit_mask].sum()))
+            distribution = np.bincount(self.cols, weights=weights * miss_mask, minlength=self.size)
+            remaining = float(distribution.sum())
+
+        return PullDistribution(pmf, tail=remaining if remaining > tolerance else 0.0)
+
+    def to_scipy(self):
+        """
+        导出为 scipy.sparse.csr_matrix 转移矩阵 (合并输出符号)
+        """
+        from scipy.sparse import csr_matrix
+        matrix = csr_matrix((self.probs, (self.rows, self.cols)), shape=(self.size, self.size))
+        matrix.sum_duplicates()
+        return matrix
@@ -0,0 +1,208 @@
+r"""
+Wishes v3.0
+-----------
+
+Module
+_
+    WishParallel
+
+Description
+_
+    Wishes 多进程模拟模块
+    将大量模拟玩家分块分发到多个进程, 每块使用由 (种子, 块编号) 确定的独立随机数流
+    分块方式与进程数无关, 因此相同种子的模拟结果与进程数无关, 可复现
+    *Windows 下调用方需位于 if __name__ == "__main__" 保护内
+"""
+
+
+import os
+import random
+from Base import *
+from WishRule import WishLogic
+from WishRandom import create_random, derive_seed
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+
+class ParallelResult:
+    """
+    模拟结果汇总
+    counts: (星级, 类型, 实际抽出标签) -> 抽出次数
+    card_counts: (星级, 类型, 卡片内容) -> 抽出次数
+    """
+    def __init__(self) -> None:
+        self.players = 0
+        self.draws = 0
+        self.counts: Dict[Tuple[int, str, str], int] = {}
+        self.card_counts: Dict[Tuple[int, str, str], int] = {}
+
+    def __str__(self) -> str:
+        return f"ParallelResult(players={self.players}, draws={self.draws})"
+
+    def merge(self, other: "ParallelResult"):
+        """
+        合并另一结果 (不排序, 全部合并后调用一次 sort)
+        """
+        self.players += other.players
+        self.draws += other.draws
+        for key, count in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + count
+        for key, count in other.card_counts.items():
+            self.card_counts[key] = self.card_counts.get(key, 0) + count
+
+    def sort(self):
+        """
+        计数按键排序, 保证结果与合并顺序无关
+        """
+        self.counts = dict(sorted(self.counts.items()))
+        self.card_counts = dict(sorted(self.card_counts.items()))
+
+    def count(self, star: Optional[int] = None, type_: Optional[str] = None, tag: Optional[str] = None) -> int:
+        """
+        统计匹配 (星级, 类型, 标签) 的抽出次数, 未指定的项不限制
+        """
+        return sum(
+            count for (s, t, g), count in self.counts.items()
+            if (star is None or s == star) and (type_ is None or t == type_) and (tag is None or g == tag)
+        )
+
+    def rate(self, star: Optional[int] = None, type_: Optional[str] = None, tag: Optional[str] = None) -> float:
+        return self.count(star, type_, tag) / self.draws if self.draws else 0.0
+
+
+# 工作进程内的逻辑和卡组副本
+_worker_logic: Optional[WishLogic] = None
+_worker_card_group: Optional[CardGroup] = None
+_worker_state: Dict = {}
+
+
+def _init_worker(logic: WishLogic, card_group: CardGroup, state: Dict):
+    global _worker_logic, _worker_card_group, _worker_state
+    _worker_logic = logic
+    _worker_card_group = card_group
+    _worker_state = state
+
+
+def _run_chunk(seed: int, index: int, players: int, draws: int, backend: str) -> ParallelResult:
+    """
+    模拟一块玩家, 每个玩家从初始状态开始抽 draws 次
+    卡组使用全局随机数生成器, 在块开始时以块种子重新播种
+    逻辑使用 backend 指定的随机数源: global 时同样使用全局生成器, 否则使用以 seed 播种并跳转 index 次的随机数流
+    """
+    logic: WishLogic = _worker_logic # type: ignore
+    card_group: CardGroup = _worker_card_group # type: ignore
+    random.seed(derive_seed(seed, index))
+    if backend != "global":
+        rng = create_random(backend, seed)
+        if index:
+            rng.jump(index)
+        logic.set_random(rng)
+
+    result = ParallelResult()
+    counts = result.counts
+    card_counts = result.card_counts
+    for _ in range(players):
+        logic.reset()
+        logic.load_state(_worker_state)
+        for _ in range(draws):
+            logic_result = logic.wish()
+            tag = logic_result.card_tag()
+            packed_card = card_group.random_card(logic_result.type_, logic_result.star, tag)
+            logic.callback(packed_card)
+
+            key = (logic_result.star, logic_result.type_, tag)
+            counts[key] = counts.get(key, 0) + 1
+            card = packed_card.card
+            card_key = (card.star, card.type, card.content)
+            card_counts[card_key] = card_counts.get(card_key, 0) + 1
+
+    result.players = players
+    result.draws = players * draws
+    return result
+
+
+class ParallelSimulator:
+    """
+    多进程模拟器
+    模拟玩家按 chunk_players 分块, 块 i 使用种子 derive_seed(seed, i), 与进程数无关
+    每个工作进程持有一份逻辑和卡组副本, 只返回汇总计数
+    state: 玩家的初始逻辑状态, 默认为 logic 的当前状态
+    workers: 进程数, 默认为 CPU 核心数; 为 1 时在当前进程内执行
+    backend: 逻辑使用的随机数源, 见 WishRandom.create_random
+    """
+    def __init__(
+            self,
+            logic: WishLogic,
+            card_group: CardGroup,
+            state: Optional[Dict] = None,
+            workers: Optional[int] = None,
+            chunk_players: int = 64,
+            backend: str = "global"
+            ) -> None:
+        self.logic = logic
+        self.card_group = card_group
+        if state is None:
+            state = {}
+            logic.reg_state(state)
+        self.state = state
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_players = chunk_players
+        self.backend = backend
+
+    def chunks(self, players: int) -> List[int]:
+        """
+        各块的玩家数
+        """
+        full, rest = divmod(players, self.chunk_players)
+        return [self.chunk_players] * full + ([rest] if rest else [])
+
+    def run(self, players: int, draws: int, seed: int = 0) -> ParallelResult:
+        """
+        模拟 players 个玩家, 每个玩家抽 draws 次
+        """
+        result = self._run(players, draws, seed)
+        result.sort()
+        return result
+
+    def _run(self, players: int, draws: int, seed: int) -> ParallelResult:
+        """
+        模拟并合并各块结果, 不排序
+        """
+        chunks = self.chunks(players)
+        result = ParallelResult()
+
+        if self.workers == 1:
+            random_state = random.getstate()
+            _init_worker(self.logic.copy(), self.card_group, self.state)
+            try:
+                for index, chunk_players in enumerate(chunks):
+                    result.merge(_run_chunk(seed, index, chunk_players, draws, self.backend))
+            finally:
+                random.setstate(random_state)
+            return result
+
+        with ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(self.logic, self.card_group, self.state)
+                ) as executor:
+            futures = [
+                executor.submit(_run_chunk, seed, index, chunk_players, draws, self.backend)
+                for index, chunk_players in enumerate(chunks)
+            ]
+            for future in futures:
+                result.merge(future.result())
+
+        return result
+
+    def run_draws(self, total_draws: int, chunk_draws: int = 100_000, seed: int = 0) -> ParallelResult:
+        """
+        将 total_draws 次抽卡拆分为多个长度为 chunk_draws 的独立抽卡序列进行模拟
+        *每个序列从初始状态开始, 适用于出率验证
+        """
+        players, rest = divmod(total_draws, chunk_draws)
+        result = self._run(players, chunk_draws, seed) if players else ParallelResult()
+        if rest:
+            result.merge(self._run(1, rest, derive_seed(seed, players)))
+        result.sort()
+        return result
@@ -0,0 +1,273 @@
+r"""
+Wishes v3.0
+-----------
+
+Module
+_
+    WishRandom
+
+Description
+_
+    Wishes 随机数源模块
+    规则通过 RuleContext.random 进行所有随机抽取, 本模块提供可替换的随机数源:
+    - GlobalRandom: random 模块全局生成器 (默认, 与直接调用 random 模块的结果一致)
+    - MTRandom: 独立的标准库梅森旋转生成器
+    - NumpyRandom: NumPy Generator (PCG64 / Philox)
+    - ThresholdRandom: 预生成整数的阈值采样器, 所有抽取仅使用 [0, MAX_PROBABILITY) 内的整数
+    *NumpyRandom 依赖 numpy
+"""
+
+
+import random
+import hashlib
+from Const import *
+from abc import ABC, abstractmethod
+from bisect import bisect
+from itertools import accumulate
+from typing import Dict, Iterator, List, Optional, Type
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class WishRandom(ABC):
+    """
+    随机数源基类
+    整数按块预生成并缓存, hit 与概率权重和为 MAX_PROBABILITY 的 choices 直接使用缓存的整数
+    """
+    block_size: int = 4096     # 每次预生成的整数个数
+
+    def __init__(self) -> None:
+        self.buffer: Iterator[int] = iter(())     # 预生成的整数
+
+    @abstractmethod
+    def seed(self, seed: Optional[int] = None):
+        """
+        设置种子, 并清空预生成的整数
+        """
+        pass
+
+    @abstractmethod
+    def jump(self, steps: int = 1):
+        """
+        跳转到第 steps 个后续的不重叠随机数流, 并清空预生成的整数
+        用于为并行模拟的各个分块提供相互独立的随机数流
+        """
+        pass
+
+    @abstractmethod
+    def fill(self, count: int) -> List[int]:
+        """
+        批量生成 count 个 [0, MAX_PROBABILITY) 内的均匀整数
+        """
+        pass
+
+    @abstractmethod
+    def random(self) -> float:
+        """
+        生成 [0, 1) 内的均匀浮点数
+        """
+        pass
+
+    def clear(self):
+        self.buffer = iter(())
+
+    def next_int(self) -> int:
+        """
+        取出一个预生成的 [0, MAX_PROBABILITY) 内的整数
+        """
+        try:
+            return next(self.buffer)
+        except StopIteration:
+            self.buffer = iter(self.fill(self.block_size))
+            return next(self.buffer)
+
+    def uniform(self, total: int) -> float:
+        """
+        生成 [0, total) 内的均匀数, total 为 MAX_PROBABILITY 时直接使用预生成的整数
+        """
+        if total == MAX_PROBABILITY:
+            return self.next_int()
+        return self.random() * total
+
+    def hit(self, weight: int) -> bool:
+        """
+        以 weight / MAX_PROBABILITY 的概率返回 True
+        """
+        try:
+            return next(self.buffer) < weight
+        except StopIteration:
+            return self.next_int() < weight
+
+    def choices(self, population, weights=None, *, cum_weights=None, k=1) -> list:
+        """
+        与 random.choices 相同的接口
+        """
+        if cum_weights is None:
+            cum_weights = list(accumulate(weights)) # type: ignore
+        total = cum_weights[-1]
+        hi = len(cum_weights) - 1
+        if k == 1:
+            return [population[bisect(cum_weights, self.uniform(total), 0, hi)]]
+        return [population[bisect(cum_weights, self.uniform(total), 0, hi)] for _ in range(k)]
+
+
+def derive_seed(seed: Optional[int], stream: int) -> int:
+    """
+    由种子和流编号派生新种子
+    MTRandom.jump 和 WishParallel 的分块种子均使用本函数
+    """
+    digest = hashlib.sha256(f"{seed}:{stream}".encode()).digest()
+    return int.from_bytes(digest[:8], "little")
+
+
+class MTRandom(WishRandom):
+    """
+    标准库梅森旋转生成器
+    choices 与 hit 的取值规则与 random.choices 完全一致, 相同种子下结果与 random 模块相同
+    *梅森旋转不支持高效跳转, jump 通过由 (种子, 流编号) 派生新种子切换到新的随机数流
+    """
+    def __init__(self, seed: Optional[int] = None, generator=None) -> None:
+        super().__init__()
+        self.generator = generator if generator is not None else random.Random()
+        self.seed_value = seed
+        self.stream = 0
+        if seed is not None or generator is None:
+            self.seed(seed)
+
+    def seed(self, seed: Optional[int] = None):
+        self.generator.seed(seed)
+        self.seed_value = seed
+        self.stream = 0
+        self.clear()
+
+    def jump(self, steps: int = 1):
+        self.stream += steps
+        self.generator.seed(derive_seed(self.seed_value, self.stream))
+        self.clear()
+
+    def fill(self, count: int) -> List[int]:
+        generator_random = self.generator.random
+        return [int(generator_random() * MAX_PROBABILITY) for _ in range(count)]
+
+    def random(self) -> float:
+        return self.generator.random()
+
+    def hit(self, weight: int) -> bool:
+        # 等价于 random.choices((True, False), (weight, MAX_PROBABILITY - weight))[0]
+        return self.generator.random() * MAX_PROBABILITY < weight
+
+    def choices(self, population, weights=None, *, cum_weights=None, k=1) -> list:
+        return self.generator.choices(population, weights, cum_weights=cum_weights, k=k)
+
+
+class GlobalRandom(MTRandom):
+    """
+    random 模块的全局生成器 (默认随机数源)
+    逻辑复制或跨进程传递时, 始终绑定到当前进程的全局生成器
+    """
+    def __init__(self) -> None:
+        super().__init__(generator=random)
+
+    def __deepcopy__(self, memo) -> "GlobalRandom":
+        return self
+
+    def __reduce__(self):
+        return (GlobalRandom, ())
+
+
+class NumpyRandom(WishRandom):
+    """
+    NumPy Generator 随机数源
+    bit_generator 可选 "PCG64" 或 "Philox", 两者均支持真正的跳转 (jumped)
+    """
+    def __init__(self, seed: Optional[int] = None, bit_generator: str = "PCG64") -> None:
+        super().__init__()
+        if np is None:
+            raise ImportError("NumpyRandom: 需要安装 numpy")
+        if bit_generator not in ("PCG64", "Philox"):
+            raise ValueError(f"NumpyRandom: 不支持的 bit_generator '{bit_generator}'")
+        self.bit_generator_name = bit_generator
+        self.seed(seed)
+
+    def seed(self, seed: Optional[int] = None):
+        self.bit_generator = getattr(np.random, self.bit_generator_name)(seed) # type: ignore
+        self.generator = np.random.Generator(self.bit_generator) # type: ignore
+        self.clear()
+
+    def jump(self, steps: int = 1):
+        self.bit_generator = self.bit_generator.jumped(steps)
+        self.generator = np.random.Generator(self.bit_generator) # type: ignore
+        self.clear()
+
+    def fill(self, count: int) -> List[int]:
+        return self.generator.integers(0, MAX_PROBABILITY, size=count).tolist()
+
+    def random(self) -> float:
+        return float(self.generator.random())
+
+
+class ThresholdRandom(WishRandom):
+    """
+    整数阈值采样器
+    所有抽取 (包括权重和不为 MAX_PROBABILITY 的 choices) 只使用预生成的 [0, MAX_PROBABILITY) 整数,
+    每次抽取只消耗一个整数, 权重和不为 MAX_PROBABILITY 时精度为 1 / MAX_PROBABILITY
+    source: 整数来源, 默认为以 seed 播种的 NumpyRandom (批量生成更快), 未安装 numpy 时为 MTRandom
+            种子设置和跳转均作用于 source
+    """
+    block_size: int = 65536
+
+    def __init__(self, seed: Optional[int] = None, source: Optional[WishRandom] = None) -> None:
+        super().__init__()
+        if source is None:
+            try:
+                source = NumpyRandom(seed)
+            except ImportError:
+                source = MTRandom(seed)
+        elif seed is not None:
+            source.seed(seed)
+        self.source = source
+
+    def seed(self, seed: Optional[int] = None):
+        self.source.seed(seed)
+        self.clear()
+
+    def jump(self, steps: int = 1):
+        self.source.jump(steps)
+        self.clear()
+
+    def fill(self, count: int) -> List[int]:
+        return self.source.fill(count)
+
+    def random(self) -> float:
+        return self.next_int() / MAX_PROBABILITY
+
+    def uniform(self, total: int) -> float:
+        if total == MAX_PROBABILITY:
+            return self.next_int()
+        return self.next_int() * total / MAX_PROBABILITY
+
+
+RANDOM_BACKENDS: Dict[str, Type[WishRandom]] = {
+    "global": GlobalRandom,
+    "mt": MTRandom,
+    "numpy": NumpyRandom,
+    "threshold": ThresholdRandom,
+}
+
+
+def create_random(backend: str = "global", seed: Optional[int] = None, **kwargs) -> WishRandom:
+    """
+    按名称创建随机数源
+    backend: global / mt / numpy / threshold
+    """
+    if backend not in RANDOM_BACKENDS:
+        raise ValueError(f"create_random: 未知的随机数源 '{backend}'")
+    if backend == "global":
+        rng = GlobalRandom()
+        if seed is not None:
+            rng.seed(seed)
+        return rng
+    return RANDOM_BACKENDS[backend](seed, **kwargs) # type: ignore
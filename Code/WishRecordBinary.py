@@ -0,0 +1,214 @@
+r"""
+Wishes v3.0
+-----------
+
+Module
+_
+    WishRecordBinary
+
+Description
+_
+    Wishes 二进制抽卡记录模块
+    details.bin 中每条记录为 24 字节的定长行 (小端): 累计抽数 (int64), 时间戳秒 (int64), 标签编号 (uint32), 卡片编号 (uint32)
+    标签编号和卡片编号的含义保存在 details_table.jsonl 中, 每行一个条目, 只追加
+    读取时将 details.bin 内存映射为 NumPy 结构化数组, 无需解析
+    *BinaryDetailsReader 依赖 numpy
+"""
+
+
+import os
+import json
+import struct
+from typing import Dict, Iterable, List, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+DETAILS_BINARY_FILE = "details.bin"
+DETAILS_TABLE_FILE = "details_table.jsonl"
+
+DETAILS_ROW = struct.Struct("<qqII")    # 累计抽数, 时间戳, 标签编号, 卡片编号
+DETAILS_DTYPE = [("order", "<i8"), ("time", "<i8"), ("tag", "<u4"), ("card", "<u4")]
+
+# 单条记录: (累计抽数, 时间戳, 标签, 游戏, 类型, 星级, 卡片内容)
+DetailsRow = Tuple[int, int, str, str, str, int, str]
+CardKey = Tuple[str, str, int, str]     # (游戏, 类型, 星级, 卡片内容)
+
+
+class DetailsTable:
+    """
+    标签编号和卡片编号字典
+    文件中每行为 ["tag", 编号, 标签] 或 ["card", 编号, 游戏, 类型, 星级, 卡片内容]
+    repair: 是否截去文件末尾写入中断留下的不完整行 (写入方使用)
+    """
+    def __init__(self, path: str, repair: bool = False) -> None:
+        self.path = path
+        self.repair = repair
+        self.tags: List[str] = []
+        self.tag_ids: Dict[str, int] = {}
+        self.cards: List[CardKey] = []
+        self.card_ids: Dict[CardKey, int] = {}
+        self.load()
+
+    def load(self):
+        self.tags.clear()
+        self.tag_ids.clear()
+        self.cards.clear()
+        self.card_ids.clear()
+        if not os.path.exists(self.path):
+            return
+        valid_size = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break   # 写入中断留下的不完整行
+                entry = json.loads(line)
+                if entry[0] == "tag":
+                    self.tags.append(entry[2])
+                    self.tag_ids[entry[2]] = entry[1]
+                else:
+                    key = (entry[2], entry[3], entry[4], entry[5])
+                    self.cards.append(key)
+                    self.card_ids[key] = entry[1]
+                valid_size += len(line)
+        if self.repair and valid_size < os.path.getsize(self.path):
+            os.truncate(self.path, valid_size)
+
+    def tag_id(self, tag: str, new_entries: List[list]) -> int:
+        """
+        标签编号, 新标签的条目加入 new_entries
+        """
+        tag_id = self.tag_ids.get(tag)
+        if tag_id is None:
+            tag_id = self.tag_ids[tag] = len(self.tags)
+            self.tags.append(tag)
+            new_entries.append(["tag", tag_id, tag])
+        return tag_id
+
+    def card_id(self, key: CardKey, new_entries: List[list]) -> int:
+        """
+        卡片编号, 新卡片的条目加入 new_entries
+        """
+        card_id = self.card_ids.get(key)
+        if card_id is None:
+            card_id = self.card_ids[key] = len(self.cards)
+            self.cards.append(key)
+            new_entries.append(["card", card_id, *key])
+        return card_id
+
+    def clear(self):
+        """
+        清空字典和文件
+        """
+        with open(self.path, "w", encoding="utf-8"):
+            pass
+        self.load()
+
+
+class BinaryDetailsWriter:
+    """
+    details.bin 追加写入
+    先写入新的字典条目, 再写入引用它们的记录行; 打开时截去写入中断留下的不完整行
+    """
+    def __init__(self, record_dir: str) -> None:
+        self.path = os.path.join(record_dir, DETAILS_BINARY_FILE)
+        self.table = DetailsTable(os.path.join(record_dir, DETAILS_TABLE_FILE), repair=True)
+        if not os.path.exists(self.path):
+            with open(self.path, "wb"):
+                pass
+        size = os.path.getsize(self.path)
+        if size % DETAILS_ROW.size:
+            os.truncate(self.path, size - size % DETAILS_ROW.size)
+
+    def append(self, rows: Iterable[DetailsRow]) -> int:
+        """
+        追加记录, 返回写入的起始偏移
+        """
+        new_entries: List[list] = []
+        table = self.table
+        data = bytearray()
+        for order, timestamp, tag, game, type_, star, content in rows:
+            data += DETAILS_ROW.pack(
+                order,
+                timestamp,
+                table.tag_id(tag, new_entries),
+                table.card_id((game, type_, star, content), new_entries)
+            )
+        if not data:
+            return os.path.getsize(self.path)
+
+        table_size = os.path.getsize(table.path) if os.path.exists(table.path) else 0
+        start = os.path.getsize(self.path)
+        try:
+            if new_entries:
+                with open(table.path, "a", encoding="utf-8", newline="") as f:
+                    f.write("".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in new_entries))
+            with open(self.path, "ab") as f:
+                f.write(data)
+        except BaseException:
+            # 截回追加前的大小, 并按文件重新加载字典, 调用方可原样重试
+            if os.path.exists(table.path):
+                os.truncate(table.path, table_size)
+            os.truncate(self.path, start)
+            table.load()
+            raise
+        return start
+
+    def clear(self):
+        with open(self.path, "wb"):
+            pass
+        self.table.clear()
+
+
+class BinaryDetailsReader:
+    """
+    details.bin 读取
+    records 为内存映射的 NumPy 结构化数组 (字段: order, time, tag, card), 只读, 不复制文件内容
+    tags / cards 为标签编号、卡片编号对应的标签和 (游戏, 类型, 星级, 卡片内容)
+    """
+    def __init__(self, record_dir: str) -> None:
+        if np is None:
+            raise ImportError("BinaryDetailsReader: 需要安装 numpy")
+        path = os.path.join(record_dir, DETAILS_BINARY_FILE)
+        table = DetailsTable(os.path.join(record_dir, DETAILS_TABLE_FILE))
+        self.tags = table.tags
+        self.cards = table.cards
+
+        dtype = np.dtype(DETAILS_DTYPE)
+        count = os.path.getsize(path) // dtype.itemsize if os.path.exists(path) else 0
+        if count:
+            self.records = np.memmap(path, dtype=dtype, mode="r", shape=(count,))
+        else:
+            self.records = np.zeros(0, dtype=dtype)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def row(self, index: int) -> DetailsRow:
+        """
+        解码单条记录
+        """
+        record = self.records[index]
+        game, type_, star, content = self.cards[int(record["card"])]
+        return (int(record["order"]), int(record["time"]), self.tags[int(record["tag"])], game, type_, star, content)
+
+    def rows(self, start: int = 0, stop: int = -1) -> List[DetailsRow]:
+        """
+        解码 [start, stop) 范围内的记录, stop 为 -1 时到末尾
+        """
+        if stop < 0:
+            stop = len(self.records)
+        return [self.row(index) for index in range(start, stop)]
+
+    def card_ids(self, **conditions) -> List[int]:
+        """
+        满足条件的卡片编号, 条件为 game / type_ / star / content
+        """
+        fields = {"game": 0, "type_": 1, "star": 2, "content": 3}
+        return [
+            card_id for card_id, key in enumerate(self.cards)
+            if all(key[fields[name]] == value for name, value in conditions.items())
+        ]
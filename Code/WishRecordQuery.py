@@ -0,0 +1,495 @@
+r"""
+Wishes v3.0
+-----------
+
+Module
+_
+    WishRecordQuery
+
+Description
+_
+    Wishes 抽卡记录查询模块
+    为 details / interval 记录文件建立稀疏偏移索引: 每 INDEX_BLOCK_SIZE 条记录为一块,
+    索引中保存块的字节范围、起始行号以及块内记录的摘要 (抽数和时间的最小 / 最大值, 星级、类型、标签集合, 卡片内容的布隆过滤器),
+    查询时跳过摘要不满足条件的块, 只读取可能命中的块
+    索引文件 (<记录文件名>.index.jsonl) 只追加已满的块, 末尾未满的块只保存在内存中, 索引随记录文件的追加增量更新
+"""
+
+
+import os
+import json
+import zlib
+import datetime as dt
+import threading
+from bisect import bisect_right
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import List, Optional, Set, Tuple
+from Const import *
+from WishRecordBinary import *
+
+
+# 单条 interval 记录: (间隔抽数, 标签, 游戏, 类型, 星级, 卡片内容)
+IntervalRow = Tuple[int, str, str, str, int, str]
+RecordRow = tuple
+
+
+def format_details_row(row: DetailsRow) -> str:
+    """
+    details 记录的 csv 单行字符串
+    """
+    order, timestamp, tag, game, type_, star, content = row
+    return ",".join((str(order), str(dt.datetime.fromtimestamp(timestamp)), tag, game, type_, str(star), content))
+
+
+def parse_details_row(line: str) -> DetailsRow:
+    """
+    解析 details.csv 的单行字符串
+    """
+    order, time_string, tag, game, type_, star, content = line.rstrip("\n").split(",", 6)
+    return (int(order), parse_time(time_string), tag, game, type_, int(star), content)
+
+
+_last_time: Tuple[str, int] = ("", 0)
+
+
+def parse_time(time_string: str) -> int:
+    """
+    解析 "YYYY-MM-DD HH:MM:SS" 格式的本地时间
+    同一次抽卡的记录时间相同, 缓存上一次的结果
+    """
+    global _last_time
+    last_string, timestamp = _last_time
+    if time_string != last_string:
+        timestamp = int(dt.datetime.fromisoformat(time_string).timestamp())
+        _last_time = (time_string, timestamp)
+    return timestamp
+
+
+def format_interval_row(row: IntervalRow) -> str:
+    """
+    interval 记录的 csv 单行字符串
+    """
+    counter, tag, game, type_, star, content = row
+    return ",".join((str(counter), tag, game, type_, str(star), content))
+
+
+def parse_interval_row(line: str) -> IntervalRow:
+    """
+    解析 interval.csv 的单行字符串
+    """
+    counter, tag, game, type_, star, content = line.rstrip("\n").split(",", 5)
+    return (int(counter), tag, game, type_, int(star), content)
+
+
+class RecordSource(ABC):
+    """
+    记录文件读取基类
+    """
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def size(self) -> int:
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    @abstractmethod
+    def read(self, start: int, end: int) -> List[Tuple[int, RecordRow]]:
+        """
+        读取字节范围 [start, end) 内的完整记录, 返回 (记录结束偏移, 记录) 列表
+        """
+        pass
+
+
+class CsvRecordSource(RecordSource):
+    """
+    csv 记录文件, 每行一条记录
+    """
+    def __init__(self, path: str, parse) -> None:
+        super().__init__(path)
+        self.parse = parse
+
+    def read(self, start: int, end: int) -> List[Tuple[int, RecordRow]]:
+        res = []
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            data = f.read(end - start)
+        offset = start
+        for line in data.splitlines(keepends=True):
+            if not line.endswith(b"\n"):
+                break   # 写入中断或正在写入的不完整行
+            offset += len(line)
+            if line.strip():
+                res.append((offset, self.parse(line.decode("utf-8"))))
+        return res
+
+
+class BinaryRecordSource(RecordSource):
+    """
+    details.bin 定长记录文件, 标签和卡片编号通过 details_table.jsonl 解码
+    """
+    def __init__(self, record_dir: str) -> None:
+        super().__init__(os.path.join(record_dir, DETAILS_BINARY_FILE))
+        self.table = DetailsTable(os.path.join(record_dir, DETAILS_TABLE_FILE))
+
+    def size(self) -> int:
+        size = super().size()
+        return size - size % DETAILS_ROW.size
+
+    def read(self, start: int, end: int) -> List[Tuple[int, RecordRow]]:
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            data = f.read(end - start)
+        data = data[:len(data) - len(data) % DETAILS_ROW.size]
+
+        table = self.table
+        res = []
+        offset = start
+        for order, timestamp, tag_id, card_id in DETAILS_ROW.iter_unpack(data):
+            if tag_id >= len(table.tags) or card_id >= len(table.cards):
+                table.load()    # 字典在记录之前写入, 重新加载即可取得新条目
+            game, type_, star, content = table.cards[card_id]
+            offset += DETAILS_ROW.size
+            res.append((offset, (order, timestamp, table.tags[tag_id], game, type_, star, content)))
+        return res
+
+
+# 记录中各字段的位置: (抽数, 时间, 标签, 类型, 星级, 卡片内容), 无该字段时为 None
+DETAILS_FIELDS = (0, 1, 2, 4, 5, 6)
+INTERVAL_FIELDS = (0, None, 1, 3, 4, 5)
+
+
+def index_path(record_path: str) -> str:
+    """
+    记录文件对应的索引文件路径
+    """
+    return record_path + ".index.jsonl"
+
+
+def content_bloom(content: str) -> int:
+    """
+    卡片内容在 64 位布隆过滤器中对应的位
+    """
+    h = zlib.crc32(content.encode("utf-8"))
+    return (1 << (h & 63)) | (1 << ((h >> 6) & 63))
+
+
+@dataclass
+class IndexBlock:
+    """
+    索引块
+    """
+    start: int                  # 起始字节偏移
+    end: int                    # 结束字节偏移
+    first: int                  # 第一条记录的行号
+    count: int = 0              # 记录数
+    key_min: int = 0            # 抽数 (details 为累计抽数, interval 为间隔抽数) 的最小 / 最大值
+    key_max: int = 0
+    time_min: int = 0           # 时间戳的最小 / 最大值
+    time_max: int = 0
+    stars: Set[int] = field(default_factory=set)
+    types: Set[str] = field(default_factory=set)
+    tags: Set[str] = field(default_factory=set)
+    contents: int = 0           # 卡片内容布隆过滤器
+
+    def add(self, rows: List[Tuple[int, RecordRow]], fields: tuple):
+        """
+        将一批 (记录结束偏移, 记录) 计入摘要
+        """
+        if not rows:
+            return
+        key_i, time_i, tag_i, type_i, star_i, content_i = fields
+        records = [row for _, row in rows]
+        keys = [row[key_i] for row in records]
+        times = [row[time_i] for row in records] if time_i is not None else [0]
+        if self.count:
+            keys += (self.key_min, self.key_max)
+            times += (self.time_min, self.time_max)
+        self.key_min, self.key_max = min(keys), max(keys)
+        self.time_min, self.time_max = min(times), max(times)
+        self.count += len(records)
+        self.end = rows[-1][0]
+        self.stars.update(row[star_i] for row in records)
+        self.types.update(row[type_i] for row in records)
+        self.tags.update(row[tag_i] for row in records)
+        for content in {row[content_i] for row in records}:
+            self.contents |= content_bloom(content)
+
+    def to_json(self) -> list:
+        return [
+            self.start, self.end, self.first, self.count,
+            self.key_min, self.key_max, self.time_min, self.time_max,
+            sorted(self.stars), sorted(self.types), sorted(self.tags), self.contents
+        ]
+
+    @staticmethod
+    def from_json(data: list) -> "IndexBlock":
+        start, end, first, count, key_min, key_max, time_min, time_max, stars, types, tags, contents = data
+        return IndexBlock(
+            start, end, first, count, key_min, key_max, time_min, time_max,
+            set(stars), set(types), set(tags), contents
+        )
+
+
+@dataclass
+class RecordQuery:
+    """
+    记录查询条件, 为 None 的条件不参与过滤
+    orders: 抽数范围 [start, stop), details 为累计抽数, interval 为间隔抽数
+    times: 时间戳范围 [start, stop), 仅 details
+    """
+    orders: Optional[Tuple[int, int]] = None
+    times: Optional[Tuple[int, int]] = None
+    star: Optional[int] = None
+    type_: Optional[str] = None
+    tag: Optional[str] = None
+    content: Optional[str] = None
+
+    def is_empty(self) -> bool:
+        return all(value is None for value in (self.orders, self.times, self.star, self.type_, self.tag, self.content))
+
+    def block_may_match(self, block: IndexBlock) -> bool:
+        """
+        块内是否可能有满足条件的记录
+        """
+        if self.orders is not None and (block.key_max < self.orders[0] or block.key_min >= self.orders[1]):
+            return False
+        if self.times is not None and (block.time_max < self.times[0] or block.time_min >= self.times[1]):
+            return False
+        if self.star is not None and self.star not in block.stars:
+            return False
+        if self.type_ is not None and self.type_ not in block.types:
+            return False
+        if self.tag is not None and self.tag not in block.tags:
+            return False
+        if self.content is not None:
+            bits = content_bloom(self.content)
+            if block.contents & bits != bits:
+                return False
+        return True
+
+    def match(self, row: RecordRow, fields: tuple) -> bool:
+        key_i, time_i, tag_i, type_i, star_i, content_i = fields
+        if self.orders is not None and not self.orders[0] <= row[key_i] < self.orders[1]:
+            return False
+        if self.times is not None and (time_i is None or not self.times[0] <= row[time_i] < self.times[1]):
+            return False
+        return (
+            (self.star is None or row[star_i] == self.star)
+            and (self.type_ is None or row[type_i] == self.type_)
+            and (self.tag is None or row[tag_i] == self.tag)
+            and (self.content is None or row[content_i] == self.content)
+        )
+
+
+class RecordPage:
+    """
+    记录分页查询结果
+    rows: (行号, 记录) 列表
+    cursor: 下一页的游标, 没有下一页时为 None
+    """
+    def __init__(self, rows: List[Tuple[int, RecordRow]], cursor: Optional[str] = None) -> None:
+        self.rows = rows
+        self.cursor = cursor
+
+    @staticmethod
+    def encode_cursor(reverse: bool, position: int) -> str:
+        """
+        游标为下一页开始查找的行号 (倒序时为不含的上界), 与查询条件无关
+        """
+        return json.dumps([reverse, position])
+
+    @staticmethod
+    def decode_cursor(cursor: str, reverse: bool) -> int:
+        try:
+            rev, position = json.loads(cursor)
+        except (ValueError, TypeError):
+            raise ValueError(f"RecordPage: 无效的游标 '{cursor}'")
+        if rev != reverse:
+            raise ValueError(f"RecordPage: 游标与排列顺序不一致 '{cursor}'")
+        return position
+
+
+class RecordIndex:
+    """
+    单个记录文件的稀疏偏移索引
+    fields: 记录中各字段的位置 (DETAILS_FIELDS / INTERVAL_FIELDS)
+    update 读取上次更新后追加的记录, 记录文件变短 (被清空或截断) 时重建索引
+    *update 与查询可在不同线程中调用, 二者互斥
+    """
+    def __init__(self, source: RecordSource, fields: tuple, block_size: int = INDEX_BLOCK_SIZE) -> None:
+        self.source = source
+        self.fields = fields
+        self.block_size = block_size
+        self.path = index_path(source.path)
+        self.lock = threading.Lock()
+
+        self.blocks: List[IndexBlock] = []      # 已满的块
+        self.firsts: List[int] = []             # 各块的起始行号
+        self.tail = IndexBlock(0, 0, 0)         # 末尾未满的块
+        self.load()
+
+    def header(self) -> dict:
+        return {"version": INDEX_VERSION, "block_size": self.block_size, "fields": list(self.fields)}
+
+    def load(self):
+        """
+        加载索引文件, 索引与记录文件不一致时重建
+        """
+        self.blocks = []
+        valid = False
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "rb") as f:
+                    lines = f.readlines()
+                if lines and all(line.endswith(b"\n") for line in lines) and json.loads(lines[0]) == self.header():
+                    self.blocks = [IndexBlock.from_json(json.loads(line)) for line in lines[1:]]
+                    valid = True
+            except (ValueError, TypeError):
+                self.blocks = []
+        if self.blocks and self.blocks[-1].end > self.source.size():
+            self.blocks = []
+            valid = False
+        if not valid:
+            self._write_index(self.blocks)
+        self.firsts = [block.first for block in self.blocks]
+        self._reset_tail()
+
+    def _write_index(self, blocks: List[IndexBlock]):
+        with open(self.path, "w", encoding="utf-8", newline="") as f:
+            f.write(json.dumps(self.header()) + "\n")
+            f.write("".join(json.dumps(block.to_json(), ensure_ascii=False) + "\n" for block in blocks))
+
+    def _reset_tail(self):
+        if self.blocks:
+            last = self.blocks[-1]
+            self.tail = IndexBlock(last.end, last.end, last.first + last.count)
+        else:
+            self.tail = IndexBlock(0, 0, 0)
+
+    def __len__(self) -> int:
+        """
+        已索引的记录数
+        """
+        return self.tail.first + self.tail.count
+
+    def reset(self):
+        """
+        清空索引 (记录文件被清空时调用)
+        """
+        with self.lock:
+            self.blocks = []
+            self.firsts = []
+            self._write_index(self.blocks)
+            self._reset_tail()
+
+    def update(self):
+        """
+        索引上次更新后追加的记录
+        """
+        with self.lock:
+            size = self.source.size()
+            if size < self.tail.end:
+                self.blocks = []
+                self.firsts = []
+                self._write_index(self.blocks)
+                self._reset_tail()
+            while self.tail.end < size:
+                rows = self.source.read(self.tail.end, min(size, self.tail.end + INDEX_READ_SIZE))
+                if not rows:
+                    break   # 末尾为不完整的记录
+                self._add_rows(rows)
+
+    def append(self, start: int, rows: List[Tuple[int, RecordRow]]):
+        """
+        写入方追加记录后, 直接以内存中的 (记录结束偏移, 记录) 更新索引, 不重新读取文件
+        start: 本次追加的起始偏移, 与已索引的末尾不一致时 (索引落后) 不处理, 留待 update 补齐
+        """
+        with self.lock:
+            if rows and start == self.tail.end:
+                self._add_rows(rows)
+
+    def _add_rows(self, rows: List[Tuple[int, RecordRow]]):
+        """
+        将紧接已索引末尾的记录计入索引, 已满的块追加到索引文件 (调用方持有锁)
+        """
+        done: List[IndexBlock] = []
+        tail = self.tail
+        start = 0
+        while start < len(rows):
+            stop = start + self.block_size - tail.count
+            tail.add(rows[start:stop], self.fields)
+            start = stop
+            if tail.count >= self.block_size:
+                done.append(tail)
+                tail = IndexBlock(tail.end, tail.end, tail.first + tail.count)
+        self.tail = tail
+
+        if done:
+            with open(self.path, "a", encoding="utf-8", newline="") as f:
+                f.write("".join(json.dumps(block.to_json(), ensure_ascii=False) + "\n" for block in done))
+            self.blocks.extend(done)
+            self.firsts.extend(block.first for block in done)
+
+    def rows(self, start: int = 0, stop: int = -1) -> List[Tuple[int, RecordRow]]:
+        """
+        行号在 [start, stop) 范围内的记录, stop 为 -1 时到末尾
+        """
+        return self.query(RecordQuery(), position=start, num=-1, stop=stop)[0]
+
+    def query(
+            self,
+            query: RecordQuery,
+            position: int = 0,
+            num: int = 20,
+            reverse: bool = False,
+            stop: int = -1
+        ) -> Tuple[List[Tuple[int, RecordRow]], Optional[int]]:
+        """
+        从行号 position 开始 (倒序时为不含的上界, -1 表示末尾) 查找最多 num 条满足条件的记录 (num 为 -1 时不限)
+        stop: 正序查找的行号上界, -1 表示末尾
+        返回 ((行号, 记录) 列表, 下一页开始查找的行号), 没有更多记录时行号为 None
+        """
+        with self.lock:
+            return self._query(query, position, num, reverse, stop)
+
+    def _query(
+            self,
+            query: RecordQuery,
+            position: int,
+            num: int,
+            reverse: bool,
+            stop: int
+        ) -> Tuple[List[Tuple[int, RecordRow]], Optional[int]]:
+        blocks = self.blocks + ([self.tail] if self.tail.count else [])
+        firsts = self.firsts + ([self.tail.first] if self.tail.count else [])
+        total = blocks[-1].first + blocks[-1].count if blocks else 0
+        if stop < 0 or stop > total:
+            stop = total
+        if reverse and (position < 0 or position > total):
+            position = total
+
+        res: List[Tuple[int, RecordRow]] = []
+        if not blocks:
+            return res, None
+        check = not query.is_empty()
+        i = max(bisect_right(firsts, position if not reverse else position - 1) - 1, 0)
+        order = range(i, len(blocks)) if not reverse else range(i, -1, -1)
+        for block_i in order:
+            block = blocks[block_i]
+            if not reverse and block.first >= stop:
+                break
+            if check and not query.block_may_match(block):
+                continue
+            rows = enumerate((row for _, row in self.source.read(block.start, block.end)), block.first)
+            if reverse:
+                rows = reversed(list(rows)) # type: ignore
+            for number, row in rows:
+                if (number < position or number >= stop) if not reverse else number >= position:
+                    continue
+                if check and not query.match(row, self.fields):
+                    continue
+                if 0 <= num == len(res):
+                    # 下一页从当前这条满足条件的记录开始 (num 为 0 时 res 为空)
+                    return res, (number if not reverse else number + 1)
+                res.append((number, row))
+        return res, None
@@ -15,10 +15,20 @@ _
 import os
 import csv
 import json
+import time
+import queue
+import atexit
+import threading
 import datetime as dt
 from Const import *
 from Base import *
+from WishRecordQuery import *
 from dataclasses import dataclass
+from typing import Type
+
+
+# 追加写入的记录: (起始偏移, [(记录结束偏移, 记录), ...])
+AppendedRows = Tuple[int, List[Tuple[int, tuple]]]
 
 
 @dataclass
@@ -27,23 +37,18 @@ class CardCache:
     单张卡片缓存
     """
     order: int                  # 累计抽数
-    time: str                   # 时间
+    time: int                   # 时间戳 (秒)
     packed_card: PackedCard     # 卡片信息
 
+    def fields(self) -> DetailsRow:
+        card = self.packed_card.card
+        return (self.order, self.time, self.packed_card.real_tag, card.game, card.type, card.star, card.content)
+
     def __str__(self) -> str:
         """
         返回 csv 格式的单行字符串
         """
-        card = self.packed_card.card
-        return ",".join((
-            str(self.order),
-            self.time,
-            self.packed_card.real_tag,
-            card.game,
-            card.type,
-            str(card.star),
-            card.content
-        ))
+        return format_details_row(self.fields())
 
 
 @dataclass
@@ -54,40 +59,314 @@ class IntervalCache:
     counter: int                # 间隔抽数
     packed_card: PackedCard     # 卡片信息
 
+    def fields(self) -> IntervalRow:
+        card = self.packed_card.card
+        return (self.counter, self.packed_card.real_tag, card.game, card.type, card.star, card.content)
+
     def __str__(self) -> str:
         """
         返回 csv 格式的单行字符串
         """
-        card = self.packed_card.card
-        return ",".join((
-            str(self.counter),
-            self.packed_card.real_tag,
-            card.game,
-            card.type,
-            str(card.star),
-            card.content
-        ))
+        return format_interval_row(self.fields())
+
+
+class CounterMatrix:
+    """
+    抽卡计数矩阵
+    标签、类型、星级分别编号, counts[标签编号][类型编号][星级编号] 为抽卡次数,
+    并维护按 (标签, 类型) / (标签, 星级) / (类型, 星级) / 标签 / 类型 / 星级 汇总的计数, 在 add 中增量更新,
+    count 的任意条件组合均直接查表
+    cells 按首次出现的顺序记录出现过的 (标签, 类型, 星级) 编号, 用于还原 profile.json 中的嵌套计数器
+    """
+    def __init__(self) -> None:
+        self.tags: List[str] = []
+        self.tag_ids: Dict[str, int] = {}
+        self.types: List[str] = []
+        self.type_ids: Dict[str, int] = {}
+        self.stars: List[int] = []
+        self.star_ids: Dict[int, int] = {}
+        self.sorted_stars: List[int] = []       # 从高到低排列的星级
+
+        self.counts: List[List[List[int]]] = []
+        self.tag_type: List[List[int]] = []
+        self.tag_star: List[List[int]] = []
+        self.type_star: List[List[int]] = []
+        self.by_tag: List[int] = []
+        self.by_type: List[int] = []
+        self.by_star: List[int] = []
+        self.total = 0
+
+        self.cells: Dict[Tuple[int, int, int], None] = {}
+        self.nested: Optional[Dict[str, Dict[str, Dict[str, int]]]] = None  # 嵌套计数器缓存
+
+    def tag_id(self, tag: str) -> int:
+        tag_id = self.tag_ids.get(tag)
+        if tag_id is None:
+            tag_id = self.tag_ids[tag] = len(self.tags)
+            self.tags.append(tag)
+            self.counts.append([[0] * len(self.stars) for _ in self.types])
+            self.tag_type.append([0] * len(self.types))
+            self.tag_star.append([0] * len(self.stars))
+            self.by_tag.append(0)
+        return tag_id
+
+    def type_id(self, type_: str) -> int:
+        type_id = self.type_ids.get(type_)
+        if type_id is None:
+            type_id = self.type_ids[type_] = len(self.types)
+            self.types.append(type_)
+            for tag_counts in self.counts:
+                tag_counts.append([0] * len(self.stars))
+            for row in self.tag_type:
+                row.append(0)
+            self.type_star.append([0] * len(self.stars))
+            self.by_type.append(0)
+        return type_id
+
+    def star_id(self, star: int) -> int:
+        star_id = self.star_ids.get(star)
+        if star_id is None:
+            star_id = self.star_ids[star] = len(self.stars)
+            self.stars.append(star)
+            self.sorted_stars = sorted(self.stars, reverse=True)
+            for tag_counts in self.counts:
+                for row in tag_counts:
+                    row.append(0)
+            for row in self.tag_star:
+                row.append(0)
+            for row in self.type_star:
+                row.append(0)
+            self.by_star.append(0)
+        return star_id
+
+    def add(self, tag: str, type_: str, star: int, num: int = 1):
+        """
+        计入 num 次抽卡
+        """
+        t, y, s = self.tag_id(tag), self.type_id(type_), self.star_id(star)
+        if (t, y, s) not in self.cells:
+            self.cells[(t, y, s)] = None
+        self.counts[t][y][s] += num
+        self.tag_type[t][y] += num
+        self.tag_star[t][s] += num
+        self.type_star[y][s] += num
+        self.by_tag[t] += num
+        self.by_type[y] += num
+        self.by_star[s] += num
+        self.total += num
+        self.nested = None
+
+    def count(self, tag: Optional[str] = None, type_: Optional[str] = None, star: Optional[int] = None) -> int:
+        t = self.tag_ids.get(tag, -1) if tag is not None else None # type: ignore
+        y = self.type_ids.get(type_, -1) if type_ is not None else None # type: ignore
+        s = self.star_ids.get(star, -1) if star is not None else None # type: ignore
+        if t == -1 or y == -1 or s == -1:
+            return 0
+        if t is None:
+            if y is None:
+                return self.total if s is None else self.by_star[s]
+            return self.by_type[y] if s is None else self.type_star[y][s]
+        if y is None:
+            return self.by_tag[t] if s is None else self.tag_star[t][s]
+        return self.tag_type[t][y] if s is None else self.counts[t][y][s]
+
+    def to_dict(self) -> Dict[str, Dict[str, Dict[str, int]]]:
+        """
+        profile.json 格式的嵌套计数器: 标签 -> 类型 -> 星级 (字符串) -> 抽卡次数
+        *返回的字典在下次 add 前共享, 不要修改
+        """
+        if self.nested is None:
+            nested: Dict[str, Dict[str, Dict[str, int]]] = {}
+            for t, y, s in self.cells:
+                star_dict = nested.setdefault(self.tags[t], {}).setdefault(self.types[y], {})
+                star_dict[str(self.stars[s])] = self.counts[t][y][s]
+            self.nested = nested
+        return self.nested
+
+    @staticmethod
+    def from_dict(counters: Dict[str, Dict[str, Dict[str, int]]]) -> "CounterMatrix":
+        matrix = CounterMatrix()
+        for tag, type_dict in counters.items():
+            for type_, star_dict in type_dict.items():
+                for star_string, num in star_dict.items():
+                    matrix.add(tag, type_, int(star_string), num)
+        return matrix
+
+
+class RecorderWriter:
+    """
+    抽卡记录后台写入线程
+    add_record 只更新内存中的计数器并将记录放入有界队列, 由写入线程成批写入文件:
+        缓存记录数达到 recorder.cache_size 且队列已取空, 或最早的缓存记录已等待 flush_interval 秒时写入
+        (recorder.auto_to_file 为 False 时只在 flush / close 时写入)
+    写入线程维护一份 profile数据 副本, 与已取出的记录保持一致, 不读取 recorder 中被抽卡线程修改的数据
+    flush / close 为屏障: 返回时之前放入的记录已全部写入; 写入线程中的异常在 flush / close 时重新抛出
+    *add_record 须在同一线程中调用; 程序退出时自动 close
+    """
+    def __init__(
+            self,
+            recorder: "WishRecorder",
+            queue_size: int = RECORDER_QUEUE_SIZE,
+            flush_interval: float = RECORDER_FLUSH_INTERVAL
+            ) -> None:
+        self.recorder = recorder
+        self.flush_interval = flush_interval
+        self.queue: "queue.Queue[object]" = queue.Queue(maxsize=queue_size)
+        self.error: Optional[BaseException] = None
+
+        # 写入线程持有的数据
+        self.profile_data: Dict = {}
+        self.cache_list: List[CardCache] = []
+        self.max_star_cache_list: List[IntervalCache] = []
+        self.reset()
+
+        self.thread = threading.Thread(target=self.run, name=f"RecorderWriter({recorder.dir})", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def reset(self):
+        """
+        以 recorder 的当前数据重置 profile数据 副本 (仅在写入线程空闲时调用)
+        """
+        profile_data = self.recorder.profile_data()
+        profile_data["counters"] = {
+            tag: {type_: dict(star_dict) for type_, star_dict in type_dict.items()}
+            for tag, type_dict in profile_data["counters"].items()
+        }
+        self.profile_data = profile_data
+        self.cache_list = []
+        self.max_star_cache_list = []
+
+    def put(self, card_cache: CardCache, interval_cache: Optional[IntervalCache]):
+        self.queue.put((card_cache, interval_cache))
+
+    def apply(self, card_cache: CardCache, interval_cache: Optional[IntervalCache]):
+        """
+        将一条记录计入 profile数据 副本和缓存
+        """
+        profile_data = self.profile_data
+        packed_card = card_cache.packed_card
+        star_dict = profile_data["counters"].setdefault(packed_card.real_tag, {}).setdefault(packed_card.card.type, {})
+        star_string = str(packed_card.card.star)
+        star_dict[star_string] = star_dict.get(star_string, 0) + 1
+        profile_data["total"] = card_cache.order
+        profile_data["max_star_interval"] += 1
+
+        self.cache_list.append(card_cache)
+        if interval_cache is not None:
+            profile_data["max_star_interval"] = 0
+            self.max_star_cache_list.append(interval_cache)
+
+    def write(self):
+        """
+        写入缓存, 成功后才清空; 失败时记录保留在缓存中, 下次写入时重试
+        """
+        if not self.cache_list and not self.max_star_cache_list:
+            return
+        try:
+            self.recorder._write_batch(self.profile_data, self.cache_list, self.max_star_cache_list)
+        except Exception as e:
+            self.error = e
+            print(f"\033[31mRecorderWriter: 抽卡记录写入失败 (将在下次写入时重试): {e}\033[0m")
+            return
+        self.cache_list = []
+        self.max_star_cache_list = []
+
+    def run(self):
+        deadline: Optional[float] = None    # 缓存中最早的记录的写入期限
+        while True:
+            try:
+                if deadline is None:
+                    item = self.queue.get()
+                else:
+                    item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                self.write()
+                deadline = None
+                continue
+
+            if item is None:
+                self.write()
+                return
+            if isinstance(item, threading.Event):
+                self.write()
+                deadline = None
+                item.set()
+                continue
+
+            self.apply(*item) # type: ignore
+            if not self.recorder.auto_to_file:
+                continue
+            # 队列中还有记录时继续合并, 写入速度跟不上抽卡时自动增大批量
+            size = len(self.cache_list)
+            if size >= self.recorder.cache_size and (self.queue.empty() or size >= self.queue.maxsize):
+                self.write()
+                deadline = None
+            elif deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+
+    def raise_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def flush(self):
+        """
+        等待之前放入的记录全部写入
+        """
+        if self.thread.is_alive():
+            event = threading.Event()
+            self.queue.put(event)
+            event.wait()
+        self.raise_error()
+
+    def close(self):
+        """
+        写入所有记录并结束写入线程
+        """
+        atexit.unregister(self.close)
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        self.raise_error()
 
 
 class WishRecorder:
     """
     抽卡记录管理类
     管理单个卡池的抽卡记录
+    async_write: 是否由后台线程写入文件 (见 RecorderWriter), 抽卡不再等待磁盘写入
+    details_format: details 记录格式, csv 写入 details.csv, binary 写入 details.bin (见 WishRecordBinary)
     *为方便解析，内部使用字符串表示星级
     """
-    def __init__(self, record_dir: str, max_star: int, auto_to_file: bool = True):
+    storage: str = RECORDER_STORAGE_PROFILE     # 存储方式
+
+    def __init__(
+            self,
+            record_dir: str,
+            max_star: int,
+            auto_to_file: bool = True,
+            async_write: bool = False,
+            details_format: str = DETAILS_FORMAT_CSV
+            ):
         # 记录文件目录
         self.dir = record_dir
 
+        # details 记录格式
+        if details_format not in DETAILS_FILES:
+            raise ValueError(f"WishRecorder: 未知的 details 记录格式 '{details_format}'")
+        self.details_format = details_format
+        self.details_file = DETAILS_FILES[details_format]
+        self.details_writer: Optional[BinaryDetailsWriter] = None
+
         # 自动记录至文件
         self.auto_to_file = auto_to_file
 
         # 总抽数
         self.total_counter = 0
 
-        # 详细计数器记录
-        # 层级: 标签 -> 类型 -> 星级 (字符串) -> 抽卡次数
-        self.counters: Dict[str, Dict[str, Dict[str, int]]] = {}
+        # 详细计数器记录, 见 CounterMatrix
+        self.matrix = CounterMatrix()
         
         self.cache_list: List[CardCache] = []               # 缓存列表
         self.cache_size = CACHE_SIZE                        # 缓存大小
@@ -98,6 +377,24 @@ class WishRecorder:
 
         if self._init_file():
             self.load_profile(self.dir)
+        if details_format == DETAILS_FORMAT_BINARY:
+            self.details_writer = BinaryDetailsWriter(self.dir)
+
+        # 记录索引, 随记录文件的追加增量更新 (见 WishRecordQuery)
+        if details_format == DETAILS_FORMAT_BINARY:
+            details_source: RecordSource = BinaryRecordSource(self.dir)
+        else:
+            details_source = CsvRecordSource(os.path.join(self.dir, self.details_file), parse_details_row)
+        self.details_index = RecordIndex(details_source, DETAILS_FIELDS)
+        self.interval_index = RecordIndex(
+            CsvRecordSource(os.path.join(self.dir, "interval.csv"), parse_interval_row), INTERVAL_FIELDS
+        )
+
+        # 后台写入线程, 为 None 时在 add_record 中同步写入
+        self.async_write = async_write
+        self.writer: Optional[RecorderWriter] = None
+        if async_write:
+            self.writer = RecorderWriter(self)
 
     def _init_file(self) -> bool:
         """
@@ -105,7 +402,7 @@ class WishRecorder:
         返回 profile 文件是否已存在
         """
         profile_path = os.path.join(self.dir, "profile.json")
-        details_path = os.path.join(self.dir, "details.csv")
+        details_path = os.path.join(self.dir, self.details_file)
         interval_path = os.path.join(self.dir, "interval.csv")
         flag = True
         if not os.path.exists(self.dir):
@@ -124,43 +421,169 @@ class WishRecorder:
             flag = False
         
         if not os.path.exists(details_path):
-            with open(details_path, "w", encoding="utf-8") as f:
-                pass
+            if self.details_format == DETAILS_FORMAT_BINARY:
+                self._convert_details_csv()
+            else:
+                with open(details_path, "w", encoding="utf-8") as f:
+                    pass
+            self._remove_index(details_path)
         
         if not os.path.exists(interval_path):
             with open(interval_path, "w", encoding="utf-8") as f:
                 pass
+            self._remove_index(interval_path)
             
         return flag
     
-    def _write_file(self):
+    @staticmethod
+    def _remove_index(record_path: str):
         """
-        将 profile数据 和 缓存 写入文件
+        删除新建记录文件的残留索引
         """
-        profile_data = {
+        if os.path.exists(index_path(record_path)):
+            os.remove(index_path(record_path))
+
+    def _convert_details_csv(self):
+        """
+        创建 details.bin, 并导入已有的 details.csv 记录 (details.csv 保留不变)
+        """
+        csv_path = os.path.join(self.dir, DETAILS_FILES[DETAILS_FORMAT_CSV])
+        writer = BinaryDetailsWriter(self.dir)
+        writer.clear()
+        if os.path.exists(csv_path):
+            with open(csv_path, "r", encoding="utf-8", newline="") as f:
+                writer.append(parse_details_row(line) for line in f if line.strip())
+
+    @property
+    def counters(self) -> Dict[str, Dict[str, Dict[str, int]]]:
+        """
+        嵌套计数器, 层级: 标签 -> 类型 -> 星级 (字符串) -> 抽卡次数
+        由 matrix 生成, 只读
+        """
+        return self.matrix.to_dict()
+
+    @counters.setter
+    def counters(self, counters: Dict[str, Dict[str, Dict[str, int]]]):
+        self.matrix = CounterMatrix.from_dict(counters)
+
+    def profile_data(self) -> Dict:
+        """
+        profile.json 的内容
+        """
+        return {
             "cache_size": self.cache_size,
             "total": self.total_counter,
             "max_star_interval": self.max_star_interval_counter,
             "counters": self.counters,
         }
+
+    def _write_file(self):
+        """
+        将 profile数据 和 缓存 写入文件, 成功后才清空缓存 (失败时下次写入重试)
+        """
+        self._write_batch(self.profile_data(), self.cache_list, self.max_star_cache_list)
+        self.cache_list = []
+        self.max_star_cache_list = []
+
+    def _write_batch(self, profile_data: Dict, cache_list: List[CardCache], max_star_cache_list: List[IntervalCache]):
+        """
+        写入 profile数据 并追加一批记录
+        追加失败时将记录文件截回追加前的大小后抛出异常, 调用方可原样重试这一批记录
+        """
         profile_path = os.path.join(self.dir, "profile.json")
         with open(profile_path, "w", encoding="utf-8", newline="") as f:
             json.dump(profile_data, f, indent=4, ensure_ascii=False)
 
-        if self.cache_list:
-            details_path = os.path.join(self.dir, "details.csv")
-            with open(details_path, "a+", encoding="utf-8", newline="") as f:
-                for row in self.cache_list:
-                    f.write(str(row) + "\n")
-            self.cache_list.clear()
-        
-        if self.max_star_cache_list:
-            interval_path = os.path.join(self.dir, "interval.csv")
-            with open(interval_path, "a+", encoding="utf-8", newline="") as f:
-                for row in self.max_star_cache_list:
-                    f.write(str(row) + "\n")
-            self.max_star_cache_list.clear()
+        sizes = [
+            (path, os.path.getsize(path) if os.path.exists(path) else 0)
+            for path in (os.path.join(self.dir, self.details_file), os.path.join(self.dir, "interval.csv"))
+        ]
+        try:
+            details = self._write_details([row.fields() for row in cache_list])
+            interval = self._write_interval([row.fields() for row in max_star_cache_list])
+        except BaseException:
+            for path, size in sizes:
+                if os.path.exists(path):
+                    os.truncate(path, size)
+            raise
+        self._index_rows(details, interval)
+
+    def _index_rows(self, details: "AppendedRows", interval: "AppendedRows"):
+        """
+        以刚写入的记录更新索引 (见 RecordIndex.append)
+        """
+        self.details_index.append(*details)
+        self.interval_index.append(*interval)
+
+    @staticmethod
+    def _append_lines(path: str, lines: List[str], rows: list) -> "AppendedRows":
+        data = [(line + "\n").encode("utf-8") for line in lines]
+        with open(path, "ab") as f:
+            start = f.tell()
+            f.write(b"".join(data))
+        ends = []
+        end = start
+        for line in data:
+            end += len(line)
+            ends.append(end)
+        return start, list(zip(ends, rows))
+
+    def _write_details(self, rows: List[DetailsRow]) -> "AppendedRows":
+        """
+        按 details 记录格式追加 details 记录
+        返回写入的起始偏移和 (记录结束偏移, 记录) 列表, 用于更新索引
+        """
+        if not rows:
+            return 0, []
+        if self.details_writer is not None:
+            start = self.details_writer.append(rows)
+            return start, [(start + DETAILS_ROW.size * (i + 1), row) for i, row in enumerate(rows)]
+        details_path = os.path.join(self.dir, self.details_file)
+        return self._append_lines(details_path, [format_details_row(row) for row in rows], rows)
+
+    def _write_interval(self, rows: List[IntervalRow]) -> "AppendedRows":
+        """
+        追加 interval 记录, 返回值同 _write_details
+        """
+        if not rows:
+            return 0, []
+        interval_path = os.path.join(self.dir, "interval.csv")
+        return self._append_lines(interval_path, [format_interval_row(row) for row in rows], rows)
+
+    def flush(self):
+        """
+        将所有抽卡记录写入文件, 返回时写入已完成
+        """
+        if self.writer is not None:
+            self.writer.flush()
+        else:
+            self._write_file()
+
+    def close(self):
+        """
+        写入所有抽卡记录并停止后台写入线程, 之后的记录改为同步写入
+        """
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        else:
+            self._write_file()
     
+    def compact(self):
+        """
+        将全部记录写为 profile.json / details / interval.csv 的完整形式
+        """
+        self.flush()
+
+    def read_details(self) -> BinaryDetailsReader:
+        """
+        写入所有记录后内存映射读取 details.bin (仅 binary 格式)
+        """
+        if self.details_format != DETAILS_FORMAT_BINARY:
+            raise ValueError(f"WishRecorder: details 记录格式为 '{self.details_format}', 不支持二进制读取")
+        self.compact()
+        return BinaryDetailsReader(self.dir)
+
     def _reset_file(self):
         """
         重置文件数据
@@ -175,13 +598,19 @@ class WishRecorder:
         with open(profile_path, "w", encoding="utf-8", newline="") as f:
             json.dump(profile_data, f, indent=4, ensure_ascii=False)
 
-        details_path = os.path.join(self.dir, "details.csv")
-        with open(details_path, "w", encoding="utf-8", newline="") as f:
-            pass
+        if self.details_writer is not None:
+            self.details_writer.clear()
+        else:
+            details_path = os.path.join(self.dir, self.details_file)
+            with open(details_path, "w", encoding="utf-8", newline="") as f:
+                pass
 
         interval_path = os.path.join(self.dir, "interval.csv")
         with open(interval_path, "w", encoding="utf-8", newline="") as f:
             pass
+
+        self.details_index.reset()
+        self.interval_index.reset()
     
     def load_profile(self, record_dir: str):
         """
@@ -202,32 +631,31 @@ class WishRecorder:
         """
         self.total_counter += 1
         self.max_star_interval_counter += 1
-        
-        if packed_card.real_tag not in self.counters:
-            self.counters[packed_card.real_tag] = {}
-        
-        card = packed_card.card
-        if card.type not in self.counters[packed_card.real_tag]:
-            self.counters[packed_card.real_tag][card.type] = {}
 
-        star_string = str(card.star)
-        if star_string not in self.counters[packed_card.real_tag][card.type]:
-            self.counters[packed_card.real_tag][card.type][star_string] = 0
-
-        self.counters[packed_card.real_tag][card.type][star_string] += 1
+        card = packed_card.card
+        self.matrix.add(packed_card.real_tag, card.type, card.star)
 
-        self.cache_list.append(CardCache(
+        card_cache = CardCache(
             self.total_counter,
-            f"{dt.datetime.now().replace(microsecond=0)}",
+            int(time.time()),
             packed_card,
-        ))
+        )
 
+        interval_cache = None
         if card.star == self.max_star:
-            self.max_star_cache_list.append(IntervalCache(
+            interval_cache = IntervalCache(
                 self.max_star_interval_counter,
                 packed_card
-            ))
+            )
             self.max_star_interval_counter = 0
+
+        if self.writer is not None:
+            self.writer.put(card_cache, interval_cache)
+            return
+
+        self.cache_list.append(card_cache)
+        if interval_cache is not None:
+            self.max_star_cache_list.append(interval_cache)
         
         if self.auto_to_file and len(self.cache_list) >= self.cache_size:
             self._write_file()
@@ -236,79 +664,328 @@ class WishRecorder:
         """
         清除记录
         """
+        if self.writer is not None:
+            self.writer.flush()
         self.total_counter = 0
         self.max_star_interval_counter = 0
-        self.counters = {}
+        self.matrix = CounterMatrix()
 
         self.cache_list = []
         self.max_star_cache_list = []
         
         self._reset_file()
+        if self.writer is not None:
+            self.writer.reset()
     
     def all_stars(self) -> List[int]:
-        res = []
-
-        for tag in self.counters.keys():
-            for t in self.counters[tag].keys():
-                for star in self.counters[tag][t].keys():
-                    if int(star) not in res:
-                        res.append(int(star))
-        res.sort(reverse=True)
-        return res
+        return list(self.matrix.sorted_stars)
 
     def all_types(self) -> List[str]:
-        res = []
-
-        for tag in self.counters.keys():
-            for t in self.counters[tag].keys():
-                if t not in res:
-                    res.append(t)
-        
-        return res
+        return list(self.matrix.types)
     
     def all_tags(self) -> List[str]:
-        return list(self.counters.keys())
+        return list(self.matrix.tags)
 
     def count_star(self, star: int) -> int:
-        counter = 0
-        s_star = str(star)
-        for tag in self.counters.keys():
-            for type_ in self.counters[tag].keys():
-                if s_star not in self.counters[tag][type_]:
-                    continue
-                counter += self.counters[tag][type_][s_star]
-        
-        return counter
+        return self.matrix.count(star=star)
+
+    def _query(self, index: RecordIndex, query: RecordQuery, cursor: Optional[str], num: int, reverse: bool) -> RecordPage:
+        index.update()
+        position = RecordPage.decode_cursor(cursor, reverse) if cursor else -1 if reverse else 0
+        rows, next_position = index.query(query, position, num, reverse)
+        return RecordPage(rows, RecordPage.encode_cursor(reverse, next_position) if next_position is not None else None)
+
+    def query_details(
+            self,
+            orders: Optional[Tuple[int, int]] = None,
+            times: Optional[Tuple[int, int]] = None,
+            star: Optional[int] = None,
+            type_: Optional[str] = None,
+            tag: Optional[str] = None,
+            content: Optional[str] = None,
+            cursor: Optional[str] = None,
+            num: int = 20,
+            reverse: bool = False
+        ) -> RecordPage:
+        """
+        按游标分页查询 details 记录, 记录为 DetailsRow
+        orders: 累计抽数范围 [start, stop); times: 时间戳范围 [start, stop)
+        cursor: 上一页返回的游标, 为 None 时返回第一页; reverse: 是否从最新的记录开始
+        *只包含已写入文件的记录 (日志存储时为已压缩的记录), 需要时先调用 compact
+        """
+        query = RecordQuery(orders, times, star, type_, tag, content)
+        return self._query(self.details_index, query, cursor, num, reverse)
+
+    def query_interval(
+            self,
+            intervals: Optional[Tuple[int, int]] = None,
+            star: Optional[int] = None,
+            type_: Optional[str] = None,
+            tag: Optional[str] = None,
+            content: Optional[str] = None,
+            cursor: Optional[str] = None,
+            num: int = 20,
+            reverse: bool = False
+        ) -> RecordPage:
+        """
+        按游标分页查询 interval 记录, 记录为 IntervalRow
+        intervals: 间隔抽数范围 [start, stop), 其余参数同 query_details
+        """
+        query = RecordQuery(intervals, None, star, type_, tag, content)
+        return self._query(self.interval_index, query, cursor, num, reverse)
 
-    # TODO: 查询 details 记录和 interval 记录
+    def details_rows(self, start: int = 0, stop: int = -1) -> List[Tuple[int, DetailsRow]]:
+        """
+        行号在 [start, stop) 范围内的 details 记录, 用于按页码跳转
+        """
+        self.details_index.update()
+        return self.details_index.rows(start, stop)
 
     def count(self, tag: Optional[str] = None, type_: Optional[str] = None, star: Optional[int] = None) -> int:
-        counter = 0
-        if tag is None:
-            tags = self.counters.keys()
-        elif tag not in self.counters:
-            return 0
-        else:
-            tags = [tag]
-        for t in tags:
-            if type_ is None:
-                types = self.counters[t].keys()
-            elif type_ not in self.counters[t]:
+        return self.matrix.count(tag, type_, star)
+
+
+class JournalWishRecorder(WishRecorder):
+    """
+    日志存储的抽卡记录管理类
+    每次写入只向 journal.jsonl 追加一行, 包含本次新增的计数器增量、details 记录和 interval 记录,
+    写入开销只与新增记录数有关, 与计数器规模无关
+    日志达到 JOURNAL_COMPACT_SIZE 时压缩: 将日志中的记录追加到 details / interval.csv,
+    并将计数器写为 profile.json 快照 (格式与 WishRecorder 相同, 另含日志序号和 details / interval 文件的已提交大小), 然后清空日志
+    加载时读取快照并重放序号更大的日志条目; 写入中断留下的不完整日志行和记录文件中未提交的内容会被丢弃
+    已提交大小只取自快照, 快照缺少已提交大小且日志中有未压缩的条目时拒绝压缩, 不以文件当前大小代替
+    *details / interval.csv 只在压缩时更新; 切换回 WishRecorder 或 details 记录格式前需调用 compact
+    """
+    storage: str = RECORDER_STORAGE_JOURNAL
+
+    def __init__(
+            self,
+            record_dir: str,
+            max_star: int,
+            auto_to_file: bool = True,
+            async_write: bool = False,
+            details_format: str = DETAILS_FORMAT_CSV
+            ):
+        self.seq = 0                # 最后写入的日志序号
+        self.snapshot_seq = 0       # 快照包含的日志序号
+        self.journal_size = 0       # 日志文件大小 (字节)
+        self.details_size: Optional[int] = 0    # details 文件的已提交大小 (字节), 未知时为 None
+        self.interval_size: Optional[int] = 0   # interval.csv 的已提交大小 (字节), 未知时为 None
+        super().__init__(record_dir, max_star, auto_to_file, async_write, details_format)
+
+    @property
+    def details_size_key(self) -> str:
+        """
+        快照中 details 文件已提交大小的键, 两种格式分别记录, 切换格式后不会误用另一文件的大小
+        """
+        return "details_size" if self.details_format == DETAILS_FORMAT_CSV else "details_bin_size"
+
+    def _path(self, filename: str) -> str:
+        return os.path.join(self.dir, filename)
+
+    def _init_file(self) -> bool:
+        flag = super()._init_file()
+        journal_path = self._path("journal.jsonl")
+        if not os.path.exists(journal_path):
+            with open(journal_path, "w", encoding="utf-8") as f:
+                pass
+        if not flag:
+            # 新建的 profile.json 不含日志序号和已提交大小, 立即写入初始快照, 此时尚无日志条目
+            self.details_size = os.path.getsize(self._path(self.details_file))
+            self.interval_size = os.path.getsize(self._path("interval.csv"))
+            self._write_snapshot(self.profile_data())
+        return flag
+
+    def read_journal(self) -> List[Dict]:
+        """
+        读取日志中的所有完整条目
+        末尾不完整的行 (写入中断) 会从日志文件中截去
+        """
+        journal_path = self._path("journal.jsonl")
+        entries = []
+        valid_size = 0
+        with open(journal_path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    break
+                valid_size += len(line)
+        if valid_size < os.path.getsize(journal_path):
+            os.truncate(journal_path, valid_size)
+        self.journal_size = valid_size
+        return entries
+
+    def load_profile(self, record_dir: str):
+        """
+        读取 profile.json 快照, 并重放日志中快照之后的条目
+        """
+        profile_path = os.path.join(record_dir, "profile.json")
+        with open(profile_path, "r", encoding="utf-8") as f:
+            profile_data = json.load(f)
+
+        self.cache_size = profile_data["cache_size"]
+        self.total_counter = profile_data["total"]
+        self.max_star_interval_counter = profile_data["max_star_interval"]
+        self.counters = profile_data["counters"]
+        self.snapshot_seq = self.seq = profile_data.get("journal_seq", 0)
+        self.details_size = profile_data.get(self.details_size_key)
+        self.interval_size = profile_data.get("interval_size")
+
+        for entry in self.read_journal():
+            if entry["seq"] <= self.snapshot_seq:
                 continue
-            else:
-                types = [type_]
+            self.seq = entry["seq"]
+            self.total_counter = entry["total"]
+            self.max_star_interval_counter = entry["max_star_interval"]
+            for tag, type_dict in entry["counters"].items():
+                for type_, star_dict in type_dict.items():
+                    for star_string, delta in star_dict.items():
+                        self.matrix.add(tag, type_, int(star_string), delta)
+
+        if self.details_size is None or self.interval_size is None:
+            if self.seq > self.snapshot_seq:
+                return  # 无法确定已提交的内容, _compact 时报错
+            # 日志中没有未压缩的条目 (如由 profile 存储或另一 details 格式切换而来), 记录文件的内容均已提交
+            self.details_size = os.path.getsize(self._path(self.details_file))
+            self.interval_size = os.path.getsize(self._path("interval.csv"))
+            self._write_snapshot(self.profile_data())
+
+    def _write_batch(self, profile_data: Dict, cache_list: List[CardCache], max_star_cache_list: List[IntervalCache]):
+        """
+        将一批记录以一个日志条目追加到日志, 日志过大时压缩
+        """
+        if not cache_list and not max_star_cache_list:
+            return
+
+        deltas: Dict[str, Dict[str, Dict[str, int]]] = {}
+        for row in cache_list:
+            packed_card = row.packed_card
+            star_dict = deltas.setdefault(packed_card.real_tag, {}).setdefault(packed_card.card.type, {})
+            star_string = str(packed_card.card.star)
+            star_dict[star_string] = star_dict.get(star_string, 0) + 1
+
+        seq = self.seq + 1
+        entry = {
+            "seq": seq,
+            "total": profile_data["total"],
+            "max_star_interval": profile_data["max_star_interval"],
+            "counters": deltas,
+            "details": [row.fields() for row in cache_list],
+            "interval": [str(row) for row in max_star_cache_list],
+        }
+        line = (json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        journal_path = self._path("journal.jsonl")
+        try:
+            with open(journal_path, "ab") as f:
+                f.write(line)
+        except BaseException:
+            # 截去不完整的条目, 调用方可原样重试这一批记录
+            os.truncate(journal_path, self.journal_size)
+            raise
+        self.seq = seq
+        self.journal_size += len(line)
+
+        if self.journal_size >= JOURNAL_COMPACT_SIZE:
+            # 本批记录已写入日志, 压缩失败不影响记录, 下次写入时重新压缩
+            try:
+                self._compact(profile_data)
+            except Exception as e:
+                print(f"\033[31mJournalWishRecorder: 日志压缩失败 (将在下次写入时重试): {e}\033[0m")
+
+    def _write_snapshot(self, profile_data: Dict):
+        """
+        写入 profile.json 快照 (先写入临时文件再替换)
+        """
+        snapshot = dict(profile_data, journal_seq=self.seq, interval_size=self.interval_size)
+        snapshot[self.details_size_key] = self.details_size
+        profile_path = self._path("profile.json")
+        temp_path = profile_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8", newline="") as f:
+            json.dump(snapshot, f, indent=4, ensure_ascii=False)
+        os.replace(temp_path, profile_path)
+
+    def compact(self):
+        """
+        写入缓存后压缩日志
+        """
+        self.flush()
+        self._compact(self.profile_data())
 
-            for tp in types:
-                if star is None:
-                    stars = self.counters[t][tp].keys()
-                elif str(star) not in self.counters[t][tp]:
-                    continue
-                else:
-                    stars = [str(star)]
+    def _compact(self, profile_data: Dict):
+        """
+        将日志中的记录追加到 details / interval.csv, 写入 profile_data 快照并清空日志
+        追加前先截去上次压缩后未提交的内容, 保证中断后重新压缩不会产生重复记录
+        """
+        if self.details_size is None or self.interval_size is None:
+            raise ValueError(f"JournalWishRecorder: '{self.dir}' 的快照缺少记录文件的已提交大小, 无法安全压缩日志")
+        entries = [entry for entry in self.read_journal() if entry["seq"] > self.snapshot_seq]
+
+        details_path = self._path(self.details_file)
+        os.truncate(details_path, self.details_size)
+        # 旧版本日志中的 details 记录为 csv 字符串
+        details = self._write_details([
+            parse_details_row(row) if isinstance(row, str) else tuple(row) # type: ignore
+            for entry in entries for row in entry["details"]
+        ])
+        interval_path = self._path("interval.csv")
+        os.truncate(interval_path, self.interval_size)
+        interval = self._write_interval([parse_interval_row(row) for entry in entries for row in entry["interval"]])
+
+        # 已提交的大小在快照写入后才更新, 压缩中途失败时重新压缩仍从已提交的大小开始
+        committed = (self.snapshot_seq, self.details_size, self.interval_size)
+        self.details_size = os.path.getsize(details_path)
+        self.interval_size = os.path.getsize(interval_path)
+        self.snapshot_seq = self.seq
+        try:
+            self._write_snapshot(profile_data)
+        except BaseException:
+            # 快照未提交, 恢复已提交的大小, 重新压缩时截去本次追加的内容
+            self.snapshot_seq, self.details_size, self.interval_size = committed
+            raise
+        with open(self._path("journal.jsonl"), "w", encoding="utf-8") as f:
+            pass
+        self.journal_size = 0
+        # 快照提交后再索引本次追加的记录
+        self._index_rows(details, interval)
 
-                for s in stars:
-                    if s not in self.counters[t][tp]:
-                        continue
-                    counter += self.counters[t][tp][s]
-        
-        return counter
+    def _reset_file(self):
+        super()._reset_file()
+        with open(self._path("journal.jsonl"), "w", encoding="utf-8") as f:
+            pass
+        self.seq = self.snapshot_seq = 0
+        self.journal_size = self.details_size = self.interval_size = 0
+        self._write_snapshot(self.profile_data())
+
+
+RECORDER_STORAGES: Dict[str, Type[WishRecorder]] = {
+    RECORDER_STORAGE_PROFILE: WishRecorder,
+    RECORDER_STORAGE_JOURNAL: JournalWishRecorder,
+}
+
+
+def create_recorder(
+        record_dir: str,
+        max_star: int,
+        auto_to_file: bool = True,
+        storage: str = RECORDER_STORAGE_PROFILE,
+        async_write: bool = False,
+        details_format: str = DETAILS_FORMAT_CSV
+        ) -> WishRecorder:
+    """
+    按存储方式创建抽卡记录管理对象
+    storage: profile / journal
+    async_write: 是否使用后台线程写入
+    details_format: csv / binary
+    """
+    if storage not in RECORDER_STORAGES:
+        raise ValueError(f"create_recorder: 未知的存储方式 '{storage}'")
+    return RECORDER_STORAGES[storage](
+        record_dir,
+        max_star,
+        auto_to_file=auto_to_file,
+        async_write=async_write,
+        details_format=details_format
+    )
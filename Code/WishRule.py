@@ -17,9 +17,11 @@ _
 from Base import *
 from Const import *
 from abc import abstractmethod, ABC
-from typing import List, Dict, Type, Tuple, Optional
+from typing import List, Dict, Type, Tuple, Optional, Callable
+from dataclasses import dataclass
+from itertools import accumulate
 from copy import deepcopy
-import random
+from WishRandom import WishRandom, GlobalRandom
 
 
 def wish_weight_to_percent(weight: int) -> str:
@@ -34,6 +36,29 @@ def wish_weight_to_percent(weight: int) -> str:
     return f"{s[:-2]}.{s[-2:]}%"
 
 
+def star_cum_weights(star_probability: Dict[int, int]) -> Tuple[int, ...]:
+    """
+    按 star_probability 中的星级顺序对概率权重进行归一化处理, 确保概率权重和不超过 MAX_PROBABILITY
+    顺序越靠前的星级优先级越高, 返回归一化后的累积权重
+    """
+    cum_weights = []
+    total = 0
+    for probability in star_probability.values():
+        total += max(min(MAX_PROBABILITY - total, probability), 0)
+        cum_weights.append(total)
+    return tuple(cum_weights)
+
+
+def check_cum_weights(cum_weights: Tuple[int, ...], name: str) -> Tuple[int, ...]:
+    """
+    检查累积权重的总和大于 0 (否则无法按权重抽取), 返回 cum_weights
+    空权重 (没有可选项) 不检查
+    """
+    if cum_weights and cum_weights[-1] <= 0:
+        raise ValueError(f"{name}: 概率权重总和必须大于 0, 而非 {cum_weights[-1]}")
+    return cum_weights
+
+
 class RuleContext:
     """
     规则执行上下文
@@ -43,9 +68,28 @@ class RuleContext:
         self.result: Optional[LogicResult] = None
         # 规则通讯桥梁, 可通过规则 tag 名称访问规则对象
         self.rule_bridge: Dict[str, BaseRule] = {}
+        # 随机数源, 规则中的所有随机抽取均通过其进行
+        self.random: WishRandom = GlobalRandom()
 
-        # 当前抽实际结果
+        # 当前抽实际结果, 汇总抽卡 (见 WishLogic.callback_card) 时为 None
         self.packed_card_result: Optional[PackedCard] = None
+        # 当前抽实际抽出卡片的星级和标签位, 回调时总是设置
+        self.card_star: int = 0
+        self.card_tags: int = 0
+        # 不为 None 时, 每抽的逻辑结果原地复用该对象而不新建 (见 new_result)
+        self.result_buffer: Optional[LogicResult] = None
+
+    def new_result(self, star: int) -> LogicResult:
+        """
+        本抽的新逻辑结果, 设置了 result_buffer 时原地重置并返回该对象
+        """
+        result = self.result_buffer
+        if result is None:
+            return LogicResult(star=star, type_="")
+        result.star = star
+        result.type_ = ""
+        result.tags = STANDARD_TAGS
+        return result
 
 
 class BaseRule(ABC):
@@ -54,6 +98,10 @@ class BaseRule(ABC):
     """
     # 规则标识符
     tag: str = "BaseRule"
+    # 规则是否在 抽卡时 / 回调时 实际执行操作
+    # 编译执行计划时, 将跳过不执行操作的阶段
+    use_apply: bool = True
+    use_callback: bool = True
 
     def __init__(self, **kwargs):
         """
@@ -77,6 +125,13 @@ class BaseRule(ABC):
         """
         pass
 
+    def bind(self, ctx: RuleContext):
+        """
+        所有规则注册完成后，直接绑定本规则依赖的其他规则对象或其状态
+        避免每次抽卡时通过 rule_bridge 查找
+        """
+        pass
+
     @abstractmethod
     def apply(self, ctx: RuleContext):
         """
@@ -114,6 +169,20 @@ class BaseRule(ABC):
         """
         pass
 
+    def markov_state(self) -> Tuple:
+        """
+        返回规则的马尔可夫状态 (可哈希)
+        仅包含跨抽保留且影响后续抽卡结果的状态, 每抽重置的标记不包含在内
+        超过饱和值 (继续增大不再影响结果) 的计数器取饱和值, 保证状态空间有限
+        """
+        return ()
+
+    def load_markov_state(self, state: Tuple):
+        """
+        加载 markov_state 返回的马尔可夫状态
+        """
+        pass
+
 
 class StarCounterRule(BaseRule):
     """
@@ -122,6 +191,7 @@ class StarCounterRule(BaseRule):
     所有操作在回调函数中完成
     """
     tag: str = "StarCounterRule"
+    use_apply: bool = False
 
     def __init__(self, star_list: List[int] ,**kwargs):
         """
@@ -134,6 +204,9 @@ class StarCounterRule(BaseRule):
             star: 0 
             for star in star_list
         }
+        # 其他规则读取计数器时的饱和值, 由读取计数器的规则在 bind 时登记
+        # 未登记的星级计数器不影响抽卡结果
+        self.read_limits: Dict[int, int] = {}
     
     def info(self, width: int) -> str:
         return "\n".join((
@@ -193,6 +266,22 @@ class StarCounterRule(BaseRule):
                 "star_counter": star_counter_state
             }
 
+    def add_read_limit(self, star: int, limit: int):
+        """
+        登记星级计数器的读取饱和值: 计数器取值 >= limit 时对读取方等价
+        """
+        self.read_limits[star] = max(self.read_limits.get(star, 0), limit)
+
+    def markov_state(self) -> Tuple:
+        return tuple(
+            min(counter, self.read_limits.get(star, 0))
+            for star, counter in self.star_counter.items()
+        )
+
+    def load_markov_state(self, state: Tuple):
+        for star, counter in zip(tuple(self.star_counter.keys()), state):
+            self.star_counter[star] = counter
+
 
 class TypeStarCounterRule(BaseRule):
     """
@@ -201,6 +290,7 @@ class TypeStarCounterRule(BaseRule):
     所有操作在回调函数中完成
     """
     tag: str = "TypeStarCounterRule"
+    use_apply: bool = False
 
     def __init__(self, type_star_dict: Dict[str, List[str]], **kwargs):
         self.type_star_counter: Dict[int, Dict[str, int]] = {
@@ -210,6 +300,8 @@ class TypeStarCounterRule(BaseRule):
             } 
             for star in type_star_dict.keys()
         }
+        # 其他规则读取计数器时的饱和值, 由读取计数器的规则在 bind 时登记
+        self.read_limits: Dict[int, Dict[str, int]] = {}
     
     def info(self, width: int) -> str:
         return "\n".join((
@@ -286,6 +378,26 @@ class TypeStarCounterRule(BaseRule):
                 "type_star_counter": type_star_counter_state
             }
 
+    def add_read_limit(self, star: int, type_: str, limit: int):
+        """
+        登记类型计数器的读取饱和值: 计数器取值 >= limit 时对读取方等价
+        """
+        limits = self.read_limits.setdefault(star, {})
+        limits[type_] = max(limits.get(type_, 0), limit)
+
+    def markov_state(self) -> Tuple:
+        return tuple(
+            min(counter, self.read_limits.get(star, {}).get(type_, 0))
+            for star, type_counter in self.type_star_counter.items()
+            for type_, counter in type_counter.items()
+        )
+
+    def load_markov_state(self, state: Tuple):
+        values = iter(state)
+        for type_counter in self.type_star_counter.values():
+            for type_ in type_counter.keys():
+                type_counter[type_] = next(values)
+
 
 class StarProbabilityRule(BaseRule):
     """
@@ -300,7 +412,13 @@ class StarProbabilityRule(BaseRule):
             int(star): probability
             for star, probability in star_probability.items()
         }
-        self.star_probability: Dict[int, int] = self.base_probability.copy()
+        self.stars: Tuple[int, ...] = tuple(self.base_probability.keys())
+        # 基础累积权重
+        self.base_cum_weights: Tuple[int, ...] = check_cum_weights(
+            tuple(accumulate(self.base_probability.values())), self.tag
+        )
+        # 当前抽累积权重, 可由概率增长规则替换
+        self.cum_weights: Tuple[int, ...] = self.base_cum_weights
     
     def info(self, width: int) -> str:
         return "\n".join((
@@ -317,26 +435,24 @@ class StarProbabilityRule(BaseRule):
 
     def apply(self, ctx: RuleContext):
         """
-        根据 star_probability 的概率权重决定星级
+        根据 cum_weights 的累积概率权重决定星级
         """
         # 若星级已被决定，则不操作
         if ctx.result is None or not ctx.result.star:
-            stars = list(self.star_probability.keys())
-            weights = list(self.star_probability.values())
-            target_star = random.choices(stars, weights=weights)[0]
-            ctx.result = LogicResult(star=target_star, type_="")
+            target_star = ctx.random.choices(self.stars, cum_weights=self.cum_weights)[0]
+            ctx.result = ctx.new_result(target_star)
     
     def callback(self, ctx: RuleContext):
         """
         抽卡结束后重置概率
         """
-        self.star_probability = self.base_probability.copy()
+        self.cum_weights = self.base_cum_weights
     
     def reset(self, ctx: RuleContext):
         """
         重置星级概率
         """
-        self.star_probability = self.base_probability.copy()
+        self.cum_weights = self.base_cum_weights
     
     def load_state(self, state: Dict):
         """
@@ -357,6 +473,7 @@ class TypeStarProbabilityRule(BaseRule):
     根据当前星级，和星级对应的类型概率权重决定当前抽类型
     """
     tag: str = "TypeStarProbabilityRule"
+    use_callback: bool = False
 
     def __init__(self, type_probability: Dict[str, Dict[str, int]], **kwargs):
         self.type_probability: Dict[int, Dict[str, int]] = {
@@ -366,6 +483,15 @@ class TypeStarProbabilityRule(BaseRule):
             }
             for star in type_probability.keys()
         }
+        # 星级 -> (类型, 累积权重), 仅包含有可选类型的星级
+        self.type_choices: Dict[int, Tuple[Tuple[str, ...], Tuple[int, ...]]] = {
+            star: (
+                tuple(type_weights.keys()),
+                check_cum_weights(tuple(accumulate(type_weights.values())), f"{self.tag} ({star} 星)")
+            )
+            for star, type_weights in self.type_probability.items()
+            if type_weights
+        }
 
     def info(self, width: int) -> str:
         return "\n".join((
@@ -390,12 +516,10 @@ class TypeStarProbabilityRule(BaseRule):
         if ctx.result is None or not ctx.result.star or ctx.result.type_:
             return
         
-        type_weights = self.type_probability.get(ctx.result.star, {})
-        types = tuple(type_weights.keys())
-        weights = tuple(type_weights.values())
-        if types and weights:
-            target_type = random.choices(types, weights=weights)[0]
-            ctx.result.type_ = target_type
+        type_choices = self.type_choices.get(ctx.result.star)
+        if type_choices:
+            types, cum_weights = type_choices
+            ctx.result.type_ = ctx.random.choices(types, cum_weights=cum_weights)[0]
     
     def callback(self, ctx: RuleContext):
         pass
@@ -428,6 +552,9 @@ class StarPityRule(BaseRule):
             for star in self.star_pity.keys()
         }
         self.reset_lower_pity = reset_lower_pity    # 高星级是否重置低星级保底
+        self.use_callback = reset_lower_pity        # 仅在重置低星级保底时需要回调
+
+        self.star_counter: Dict[int, int] = {}      # 绑定的 StarCounterRule 星级计数器
     
     def info(self, width: int) -> str:
         return "\n".join((
@@ -441,6 +568,12 @@ class StarPityRule(BaseRule):
 
     def set_bridge(self, ctx: RuleContext):
         ctx.rule_bridge[self.tag] = self
+
+    def bind(self, ctx: RuleContext):
+        counter_rule: StarCounterRule = ctx.rule_bridge[StarCounterRule.tag] # type: ignore
+        self.star_counter = counter_rule.star_counter
+        for star, threshold in self.star_pity.items():
+            counter_rule.add_read_limit(star, max(threshold - 1, 0))
     
     def apply(self, ctx: RuleContext):
         """
@@ -451,11 +584,11 @@ class StarPityRule(BaseRule):
         for star in self.is_pity.keys():
             self.is_pity[star] = False
 
-        star_counter = ctx.rule_bridge[StarCounterRule.tag].star_counter # type: ignore
+        star_counter = self.star_counter
         for star, threshold in self.star_pity.items():
             counter = star_counter.get(star, 0) + 1
             if counter >= threshold:
-                ctx.result = LogicResult(star=star, type_="")
+                ctx.result = ctx.new_result(star)
                 star_counter[star] = 0
                 self.is_pity[star] = True
                 return
@@ -469,7 +602,7 @@ class StarPityRule(BaseRule):
         
         cur_star = ctx.result.star
 
-        star_counter: Dict[int, int] = ctx.rule_bridge[StarCounterRule.tag].star_counter # type: ignore
+        star_counter = self.star_counter
         for star in star_counter.keys():
             if star < cur_star:
                 star_counter[star] = 0
@@ -511,6 +644,7 @@ class TypeStarPityRule(BaseRule):
     *不同类型的保底触发优先级遵循 type_pity 中该星级下设定的类型顺序
     """
     tag: str = "TypeStarPityRule"
+    use_callback: bool = False
 
     def __init__(self, type_pity: Dict[str, Dict[str, int]], **kwargs) -> None:
         self.type_pity: Dict[int, Dict[str, int]] = {
@@ -527,6 +661,7 @@ class TypeStarPityRule(BaseRule):
             }
             for star in self.type_pity.keys()
         }
+        self.type_star_counter: Dict[int, Dict[str, int]] = {}  # 绑定的 TypeStarCounterRule 类型计数器
 
     def info(self, width: int) -> str:
         return "\n".join((
@@ -543,6 +678,13 @@ class TypeStarPityRule(BaseRule):
     def set_bridge(self, ctx: RuleContext):
         ctx.rule_bridge[self.tag] = self
 
+    def bind(self, ctx: RuleContext):
+        counter_rule: TypeStarCounterRule = ctx.rule_bridge[TypeStarCounterRule.tag] # type: ignore
+        self.type_star_counter = counter_rule.type_star_counter
+        for star, type_pity in self.type_pity.items():
+            for type_, threshold in type_pity.items():
+                counter_rule.add_read_limit(star, type_, threshold)
+
     def apply(self, ctx: RuleContext):
         """
         根据星级，获取对应的类型保底
@@ -557,7 +699,7 @@ class TypeStarPityRule(BaseRule):
         if ctx.result is None or not ctx.result.star:
             return
 
-        type_counter = ctx.rule_bridge[TypeStarCounterRule.tag].type_star_counter # type: ignore
+        type_counter = self.type_star_counter
         # 星级不包含在保底列表内，不操作
         if ctx.result.star not in self.type_pity:
             return
@@ -622,6 +764,7 @@ class UpRule(BaseRule):
     同时附带对 UP 卡片的计数器和保底机制
     """
     tag: str = "UpRule"
+    use_callback: bool = False
 
     def __init__(self, up_probability: Dict[str, int], up_pity: Dict[str, int] ,**kwargs) -> None:
         self.up_probability: Dict[int, int] = {
@@ -673,15 +816,15 @@ class UpRule(BaseRule):
         
         counter = self.up_counter[ctx.result.star]
         if ctx.result.star in self.up_pity and counter >= self.up_pity[ctx.result.star]:    # 触发 UP 保底
-            ctx.result.tags.append(TAG_UP)
+            ctx.result.tags |= FLAG_UP
             self.up_counter[ctx.result.star] = 0
             self.is_up_pity[ctx.result.star] = True
         else:
             up_weight = self.up_probability[ctx.result.star]
-            if random.choices((True, False), (up_weight, MAX_PROBABILITY - up_weight))[0]:  # 正常抽取 UP
-                ctx.result.tags.append(TAG_UP)
+            if ctx.random.hit(up_weight):  # 正常抽取 UP
+                ctx.result.tags |= FLAG_UP
 
-            if TAG_UP in ctx.result.tags:
+            if ctx.result.tags & FLAG_UP:
                 self.up_counter[ctx.result.star] = 0
             else:
                 self.up_counter[ctx.result.star] += 1
@@ -737,6 +880,16 @@ class UpRule(BaseRule):
             if is_up_pity_state:
                 state[self.tag]["is_up_pity"] = is_up_pity_state
 
+    def markov_state(self) -> Tuple:
+        return tuple(
+            min(counter, self.up_pity.get(star, 0))
+            for star, counter in self.up_counter.items()
+        )
+
+    def load_markov_state(self, state: Tuple):
+        for star, counter in zip(tuple(self.up_counter.keys()), state):
+            self.up_counter[star] = counter
+
 
 class UpTypeRule(BaseRule):
     """
@@ -745,6 +898,7 @@ class UpTypeRule(BaseRule):
     同时附带基于星级的对 UP 类型的计数器和保底机制
     """
     tag: str = "UpTypeRule"
+    use_callback: bool = False
 
     def __init__(self, up_type_probability: Dict[str, Dict[str, int]], up_type_pity: Dict[str, Dict[str, int]], **kwargs):
         self.up_type_probability: Dict[int, Dict[str, int]] = {
@@ -775,6 +929,14 @@ class UpTypeRule(BaseRule):
             }
             for star in self.up_type_pity.keys()
         }
+        # 星级 -> (UP 类型, 累积权重)
+        self.up_type_choices: Dict[int, Tuple[Tuple[str, ...], Tuple[int, ...]]] = {
+            star: (
+                tuple(type_weights.keys()),
+                check_cum_weights(tuple(accumulate(type_weights.values())), f"{self.tag} ({star} 星)")
+            )
+            for star, type_weights in self.up_type_probability.items()
+        }
 
     def info(self, width: int) -> str:
         return "\n".join((
@@ -809,7 +971,7 @@ class UpTypeRule(BaseRule):
             for type_ in self.is_up_type_pity[star].keys():
                 self.is_up_type_pity[star][type_] = False
 
-        if ctx.result is None or ctx.result.star not in self.up_type_probability or TAG_UP not in ctx.result.tags:
+        if ctx.result is None or ctx.result.star not in self.up_type_probability or not ctx.result.tags & FLAG_UP:
             return
         
         if ctx.result.star in self.up_type_pity:
@@ -824,9 +986,8 @@ class UpTypeRule(BaseRule):
                     self.is_up_type_pity[ctx.result.star][type_] = True
                     return
         
-        types = tuple(self.up_type_probability[ctx.result.star].keys())
-        weights = tuple(self.up_type_probability[ctx.result.star].values())
-        ctx.result.type_ = random.choices(types, weights=weights)[0]
+        types, cum_weights = self.up_type_choices[ctx.result.star]
+        ctx.result.type_ = ctx.random.choices(types, cum_weights=cum_weights)[0]
 
     def callback(self, ctx: RuleContext):
         pass
@@ -892,6 +1053,103 @@ class UpTypeRule(BaseRule):
             if is_up_type_pity_state:
                 state[self.tag]["is_up_type_pity"] = is_up_type_pity_state
 
+    def markov_state(self) -> Tuple:
+        return tuple(
+            min(counter, self.up_type_pity.get(star, {}).get(type_, 0))
+            for star, type_counter in self.up_type_counter.items()
+            for type_, counter in type_counter.items()
+        )
+
+    def load_markov_state(self, state: Tuple):
+        values = iter(state)
+        for type_counter in self.up_type_counter.values():
+            for type_ in type_counter.keys():
+                type_counter[type_] = next(values)
+
+
+class StarWeightTable:
+    """
+    星级累积权重表
+    概率增长规则下, 各星级的概率权重仅由各增长星级的计数器决定
+    因此预先计算 计数器取值 -> 归一化累积权重 的映射表, 每次抽卡只需一次查表
+    计数器超过增长饱和点后, 权重不再变化, 统一映射到表中最后一项
+    建表 (或未建表时逐抽计算) 时权重总和为 0 抛出 ValueError
+    *表的条目数超过 STAR_WEIGHT_TABLE_LIMIT 时不建表, 改为逐抽计算
+    """
+    def __init__(
+            self,
+            base_probability: Dict[int, int],
+            increase: Callable[[int, int], int],
+            tails: Dict[int, Tuple[int, int]]
+            ) -> None:
+        """
+        base_probability: StarProbabilityRule 的基础概率权重
+        increase: (星级, 当前抽数) -> 该星级的概率增长值
+        tails: 星级 -> (最后一段增长的起点抽数, 最后一段的每抽增长值)
+        """
+        self.base_probability = base_probability
+        self.increase = increase
+
+        # 表的各维度: (星级, 维度长度, 步长)
+        self.axes: List[Tuple[int, int, int]] = []
+        size = 1
+        for star, (start, slope) in tails.items():
+            if star not in base_probability:    # 不参与归一化的星级, 其增长无效
+                continue
+            length = self.axis_length(star, start, slope)
+            self.axes.append((star, length, size))
+            size *= length
+
+        self.table: Optional[List[Tuple[int, ...]]] = None
+        if size <= STAR_WEIGHT_TABLE_LIMIT:
+            self.table = [self.compute(self.counters_at(index)) for index in range(size)]
+
+    def axis_length(self, star: int, start: int, slope: int) -> int:
+        """
+        计算星级计数器的有效取值个数
+        即计数器达到增长饱和 (概率权重 >= MAX_PROBABILITY 或 <= 0) 前的取值个数
+        """
+        counter = max(start - 1, 0)     # 计数器值 + 1 为当前抽数
+        if slope == 0:
+            return counter + 1
+        base = self.base_probability[star]
+        while True:
+            probability = base + self.increase(star, counter + 1)
+            if (slope > 0 and probability >= MAX_PROBABILITY) or (slope < 0 and probability <= 0):
+                return counter + 1
+            counter += 1
+
+    def counters_at(self, index: int) -> Dict[int, int]:
+        """
+        将表索引还原为各星级计数器值
+        """
+        return {
+            star: index // stride % length
+            for star, length, stride in self.axes
+        }
+
+    def compute(self, star_counter: Dict[int, int]) -> Tuple[int, ...]:
+        """
+        计算指定计数器状态下的累积权重
+        """
+        star_probability = self.base_probability.copy()
+        for star, _, _ in self.axes:
+            star_probability[star] += self.increase(star, star_counter.get(star, 0) + 1)
+        return check_cum_weights(star_cum_weights(star_probability), f"StarWeightTable (计数器 {star_counter})")
+
+    def lookup(self, star_counter: Dict[int, int]) -> Tuple[int, ...]:
+        """
+        查询当前计数器状态下的累积权重
+        """
+        if self.table is None:
+            return self.compute(star_counter)
+
+        index = 0
+        for star, length, stride in self.axes:
+            counter = star_counter.get(star, 0)
+            index += (counter if counter < length else length - 1) * stride
+        return self.table[index]
+
 
 class StarProbabilityIncreaseRule(BaseRule):
     """
@@ -900,6 +1158,7 @@ class StarProbabilityIncreaseRule(BaseRule):
     *仅当本规则先于 StarProbabilityRule 执行时生效
     """
     tag: str = "StarProbabilityIncreaseRule"
+    use_callback: bool = False
 
     def __init__(self, star_increase: Dict[str, Tuple[int, int]],**kwargs) -> None:
         self.star_increase: Dict[int, Tuple[int, int]] = {
@@ -907,6 +1166,10 @@ class StarProbabilityIncreaseRule(BaseRule):
             for star, (start, increment) in star_increase.items()
         }
 
+        self.star_counter: Dict[int, int] = {}                          # 绑定的 StarCounterRule 星级计数器
+        self.probability_rule: Optional[StarProbabilityRule] = None     # 绑定的 StarProbabilityRule 规则对象
+        self.weight_table: Optional[StarWeightTable] = None             # 星级累积权重表
+
     def info(self, width: int) -> str:
         return "\n".join((
             self.tag,
@@ -919,6 +1182,26 @@ class StarProbabilityIncreaseRule(BaseRule):
     
     def set_bridge(self, ctx: RuleContext):
         ctx.rule_bridge[self.tag] = self
+
+    def bind(self, ctx: RuleContext):
+        self.star_counter = ctx.rule_bridge[StarCounterRule.tag].star_counter # type: ignore
+        self.probability_rule = ctx.rule_bridge[StarProbabilityRule.tag] # type: ignore
+        self.weight_table = StarWeightTable(
+            self.probability_rule.base_probability, # type: ignore
+            self.increase,
+            self.star_increase
+        )
+        for star, length, _ in self.weight_table.axes:
+            ctx.rule_bridge[StarCounterRule.tag].add_read_limit(star, length - 1) # type: ignore
+
+    def increase(self, star: int, counter: int) -> int:
+        """
+        当前抽数为 counter 时, 星级 star 的概率增长值
+        """
+        start, increment = self.star_increase[star]
+        if counter < start:
+            return 0
+        return (counter - start + 1) * increment
     
     def apply(self, ctx: RuleContext):
         """
@@ -930,19 +1213,9 @@ class StarProbabilityIncreaseRule(BaseRule):
         星级的概率累加起点及累加值由 star_increase 指定
         由于 StarProbabilityRule 在每次抽卡结束后都将重置概率
         因此本规则只有在先于 StarProbabilityRule 执行时才生效
+        *各计数器状态下的累积权重已在 bind 时预先计算, 此处仅查表
         """
-        for star, (start, increment) in self.star_increase.items():
-            counter = ctx.rule_bridge[StarCounterRule.tag].star_counter.get(star, 0) + 1 # type: ignore
-            if counter >= start:
-                k = counter - start + 1
-                ctx.rule_bridge[StarProbabilityRule.tag].star_probability[star] += k * increment # type: ignore
-        
-        # 对概率进行归一化处理，确保概率权重和为 MAX_PROBABILITY
-        total = 0
-        for star, probability in ctx.rule_bridge[StarProbabilityRule.tag].star_probability.items(): # type: ignore
-            p = max(min(MAX_PROBABILITY - total, probability), 0)
-            total += p
-            ctx.rule_bridge[StarProbabilityRule.tag].star_probability[star] = p # type: ignore
+        self.probability_rule.cum_weights = self.weight_table.lookup(self.star_counter) # type: ignore
     
     def callback(self, ctx: RuleContext):
         pass
@@ -964,6 +1237,7 @@ class StarProbabilityIntervalIncreaseRule(BaseRule):
     *仅当本规则先于 StarProbabilityRule 执行时生效
     """
     tag: str = "StarProbabilityIntervalIncreaseRule"
+    use_callback: bool = False
 
     def __init__(self, star_increase: Dict[str, List[Tuple[int, int]]], **kwargs) -> None:
         # 星级 -> (起始抽数, 增长值) 列表
@@ -975,6 +1249,10 @@ class StarProbabilityIntervalIncreaseRule(BaseRule):
             for star, intervals in star_increase.items()
         }
 
+        self.star_counter: Dict[int, int] = {}                          # 绑定的 StarCounterRule 星级计数器
+        self.probability_rule: Optional[StarProbabilityRule] = None     # 绑定的 StarProbabilityRule 规则对象
+        self.weight_table: Optional[StarWeightTable] = None             # 星级累积权重表
+
     def info(self, width: int) -> str:
         return "\n".join((
             self.tag,
@@ -991,28 +1269,40 @@ class StarProbabilityIntervalIncreaseRule(BaseRule):
     def set_bridge(self, ctx: RuleContext):
         ctx.rule_bridge[self.tag] = self
 
+    def bind(self, ctx: RuleContext):
+        self.star_counter = ctx.rule_bridge[StarCounterRule.tag].star_counter # type: ignore
+        self.probability_rule = ctx.rule_bridge[StarProbabilityRule.tag] # type: ignore
+        self.weight_table = StarWeightTable(
+            self.probability_rule.base_probability, # type: ignore
+            self.increase,
+            {
+                # 抽数超过所有区间起点后, 所有区间同时增长
+                star: (max((start for start, _ in intervals), default=0), sum(increment for _, increment in intervals))
+                for star, intervals in self.star_increase.items()
+            }
+        )
+        for star, length, _ in self.weight_table.axes:
+            ctx.rule_bridge[StarCounterRule.tag].add_read_limit(star, length - 1) # type: ignore
+
+    def increase(self, star: int, counter: int) -> int:
+        """
+        当前抽数为 counter 时, 星级 star 的概率增长值
+        """
+        value = 0
+        for start, increment in self.star_increase[star]:
+            if counter < start:
+                break
+            value += (counter - start + 1) * increment
+        return value
+
     def apply(self, ctx: RuleContext):
         """
         修改 StarProbabilityRule 的概率权重，实现概率增长
         每个区间的起始概率都是上个区间的结束概率
         第一个区间的起始概率为 StarProbabilityRule 的基础概率
+        *各计数器状态下的累积权重已在 bind 时预先计算, 此处仅查表
         """
-        # 修改概率权重
-        for star, intervals in self.star_increase.items():
-            counter = ctx.rule_bridge[StarCounterRule.tag].star_counter.get(star, 0) + 1 # type: ignore
-            for start, increment in intervals:
-                if counter >= start:
-                    k = counter - start + 1
-                    ctx.rule_bridge[StarProbabilityRule.tag].star_probability[star] += k * increment # type: ignore
-                else:
-                    break
-        
-        # 对概率进行归一化处理，确保概率权重和为 MAX_PROBABILITY
-        total = 0
-        for star, probability in ctx.rule_bridge[StarProbabilityRule.tag].star_probability.items(): # type: ignore
-            p = max(min(MAX_PROBABILITY - total, probability), 0)
-            total += p
-            ctx.rule_bridge[StarProbabilityRule.tag].star_probability[star] = p # type: ignore
+        self.probability_rule.cum_weights = self.weight_table.lookup(self.star_counter) # type: ignore
 
     def callback(self, ctx: RuleContext):
         pass
@@ -1035,6 +1325,7 @@ class FesRule(BaseRule):
     来源: 蔚蓝档案-Fes机制
     """
     tag: str = "FesRule"
+    use_callback: bool = False
 
     def __init__(self, fes_probability: Dict[str, int], **kwargs):
         self.fes_probability: Dict[int, int] = {
@@ -1049,12 +1340,12 @@ class FesRule(BaseRule):
         ctx.rule_bridge[self.tag] = self
     
     def apply(self, ctx: RuleContext):
-        if ctx.result is None or TAG_UP not in ctx.result.tags or ctx.result.star not in self.fes_probability:
+        if ctx.result is None or not ctx.result.tags & FLAG_UP or ctx.result.star not in self.fes_probability:
             return
         
         fes_weight = self.fes_probability[ctx.result.star]
-        if random.choices((True, False), (fes_weight, MAX_PROBABILITY - fes_weight))[0]:
-            ctx.result.tags.append(TAG_FES)
+        if ctx.random.hit(fes_weight):
+            ctx.result.tags |= FLAG_FES
 
     def callback(self, ctx: RuleContext):
         pass
@@ -1107,7 +1398,7 @@ class AppointRule(BaseRule):
         for star in self.appoint_pity.keys():
             self.is_appoint_pity[star] = False
 
-        if ctx.result is None or TAG_UP not in ctx.result.tags:
+        if ctx.result is None or not ctx.result.tags & FLAG_UP:
             return
 
         star = ctx.result.star
@@ -1115,7 +1406,7 @@ class AppointRule(BaseRule):
             return
         
         if self.appoint_counter[star] >= self.appoint_pity[star]:
-            ctx.result.tags.append(TAG_APPOINT)
+            ctx.result.tags |= FLAG_APPOINT
             self.appoint_counter[star] = 0
             self.is_appoint_pity[star] = True
             return
@@ -1126,10 +1417,10 @@ class AppointRule(BaseRule):
         """
         检查本抽的卡片是否属于 Appoint 组，如果是，则重置 Appoint 计数器
         """
-        if ctx.packed_card_result is None or TAG_APPOINT not in ctx.packed_card_result.tags:
+        if not ctx.card_tags & FLAG_APPOINT:
             return
 
-        star = ctx.packed_card_result.card.star
+        star = ctx.card_star
         if star not in self.appoint_pity:
             return
 
@@ -1185,6 +1476,16 @@ class AppointRule(BaseRule):
             if is_appoint_pity_state:
                 state[self.tag]["is_appoint_pity"] = is_appoint_pity_state
 
+    def markov_state(self) -> Tuple:
+        return tuple(
+            min(counter, self.appoint_pity[star])
+            for star, counter in self.appoint_counter.items()
+        )
+
+    def load_markov_state(self, state: Tuple):
+        for star, counter in zip(tuple(self.appoint_counter.keys()), state):
+            self.appoint_counter[star] = counter
+
 
 class CaptureRule(BaseRule):
     """
@@ -1195,6 +1496,7 @@ class CaptureRule(BaseRule):
     来源: 原神-武器卡池-捕获明光机制
     """
     tag: str = "CaptureRule"
+    use_callback: bool = False
 
     def __init__(self, capture_probability: Dict[str, int], **kwargs):
         self.capture_probability: Dict[int, int] = {
@@ -1215,15 +1517,15 @@ class CaptureRule(BaseRule):
         if ctx.result is None:
             return
         
-        if TAG_UP in ctx.result.tags:
+        if ctx.result.tags & FLAG_UP:
             return
 
         star = ctx.result.star
         if star not in self.capture_probability:
             return
 
-        if random.choices((True, False), (self.capture_probability[star], MAX_PROBABILITY - self.capture_probability[star]))[0]:
-            ctx.result.tags.append(TAG_UP)
+        if ctx.random.hit(self.capture_probability[star]):
+            ctx.result.tags |= FLAG_UP
 
     def callback(self, ctx: RuleContext):
         pass
@@ -1262,6 +1564,7 @@ class CapturePityRule(BaseRule):
             star: False 
             for star in self.capture_pity.keys()
         }
+        self.up_rule: Optional[UpRule] = None   # 绑定的 UpRule 规则对象
     
     def info(self, width: int) -> str:
         return super().info(width)
@@ -1269,6 +1572,9 @@ class CapturePityRule(BaseRule):
     def set_bridge(self, ctx: RuleContext):
         ctx.rule_bridge[self.tag] = self
 
+    def bind(self, ctx: RuleContext):
+        self.up_rule = ctx.rule_bridge.get(UpRule.tag) # type: ignore
+
     def apply(self, ctx: RuleContext):
         """
         捕获保底判定
@@ -1285,7 +1591,7 @@ class CapturePityRule(BaseRule):
             return
         
         if self.capture_pity_counter[star] >= self.capture_pity[star]:
-            ctx.result.tags.append(TAG_UP)
+            ctx.result.tags |= FLAG_UP
             self.is_capture_pity[star] = True
             self.capture_pity_counter[star] = 0
             return
@@ -1330,18 +1636,18 @@ class CapturePityRule(BaseRule):
         if star not in self.capture_pity:
             return
 
-        if UpRule.tag not in ctx.rule_bridge:
+        up_rule = self.up_rule
+        if up_rule is None:
             return
         
-        up_rule = ctx.rule_bridge[UpRule.tag]
-        if star not in up_rule.up_pity: # type: ignore
+        if star not in up_rule.up_pity:
             return
 
-        if up_rule.is_up_pity[star] and TAG_UP in ctx.result.tags: # type: ignore
+        if up_rule.is_up_pity[star] and ctx.result.tags & FLAG_UP:
             self.capture_pity_counter[star] += 1
             return
         
-        if TAG_UP in ctx.result.tags:
+        if ctx.result.tags & FLAG_UP:
             self.capture_pity_counter[star] = 0
 
     def reset(self, ctx: RuleContext):
@@ -1396,12 +1702,34 @@ class CapturePityRule(BaseRule):
             if is_capture_pity_state:
                 state[self.tag]["is_capture_pity"] = is_capture_pity_state
 
+    def markov_state(self) -> Tuple:
+        return tuple(
+            min(counter, self.capture_pity[star])
+            for star, counter in self.capture_pity_counter.items()
+        )
+
+    def load_markov_state(self, state: Tuple):
+        for star, counter in zip(tuple(self.capture_pity_counter.keys()), state):
+            self.capture_pity_counter[star] = counter
+
+
+@dataclass
+class WishPlan:
+    """
+    规则执行计划
+    由 WishLogic.compile 生成, 仅包含在对应阶段实际执行操作的规则方法
+    """
+    apply_steps: Tuple[Callable[[RuleContext], None], ...] = ()
+    callback_steps: Tuple[Callable[[RuleContext], None], ...] = ()
+
 
 class WishLogic:
     """
     核心逻辑驱动引擎
+    默认通过编译后的执行计划 (WishPlan) 执行规则
+    compiled 为 False 时, 逐个调用全部规则 (参考模式, 用于对照验证)
     """
-    def __init__(self, config: Dict) -> None:
+    def __init__(self, config: Dict, compiled: bool = True) -> None:
         """
         config 结构:
         config: {
@@ -1426,6 +1754,11 @@ class WishLogic:
         self.ctx = RuleContext()
         for rule in self.rules:
             rule.set_bridge(self.ctx)
+        for rule in self.rules:
+            rule.bind(self.ctx)
+
+        self.compiled = compiled
+        self.plan = self.compile()
     
     def info(self, width: int = 50) -> str:
         return "\n".join((
@@ -1433,17 +1766,32 @@ class WishLogic:
             *[rule.info(width) for rule in self.rules]
         ))
 
+    def compile(self) -> WishPlan:
+        """
+        生成执行计划, 跳过各阶段中不执行操作的规则
+        规则的执行顺序保持不变
+        """
+        return WishPlan(
+            apply_steps=tuple(rule.apply for rule in self.rules if rule.use_apply),
+            callback_steps=tuple(rule.callback for rule in self.rules if rule.use_callback),
+        )
+
     def wish(self) -> LogicResult:
         """
         抽卡
         """
-        self.ctx.result = None
-        self.ctx.packed_card_result = None
+        ctx = self.ctx
+        ctx.result = None
+        ctx.packed_card_result = None
 
-        for rule in self.rules:
-            rule.apply(self.ctx)        # 逐级执行规则，确定抽卡结果
+        if self.compiled:
+            for apply in self.plan.apply_steps:
+                apply(ctx)
+        else:
+            for rule in self.rules:
+                rule.apply(ctx)         # 逐级执行规则，确定抽卡结果
 
-        result = self.ctx.result if self.ctx.result else LogicResult(star=0, type_="")
+        result = ctx.result if ctx.result else ctx.new_result(0)
 
         return result
 
@@ -1451,10 +1799,29 @@ class WishLogic:
         """
         抽卡结束，回调逻辑
         """
-        self.ctx.packed_card_result = packed_card
+        ctx = self.ctx
+        ctx.packed_card_result = packed_card
+        ctx.card_star = packed_card.card.star
+        ctx.card_tags = packed_card.tags
+        self._callback(ctx)
 
-        for rule in self.rules:
-            rule.callback(self.ctx)
+    def callback_card(self, star: int, tags: int):
+        """
+        抽卡结束，以抽出卡片的星级和标签位回调逻辑, 不需要 PackedCard (汇总抽卡使用)
+        """
+        ctx = self.ctx
+        ctx.packed_card_result = None
+        ctx.card_star = star
+        ctx.card_tags = tags
+        self._callback(ctx)
+
+    def _callback(self, ctx: RuleContext):
+        if self.compiled:
+            for callback in self.plan.callback_steps:
+                callback(ctx)
+        else:
+            for rule in self.rules:
+                rule.callback(ctx)
 
     def reset(self):
         """
@@ -1479,6 +1846,25 @@ class WishLogic:
         for rule in self.rules:
             rule.reg_state(state)
 
+    def markov_state(self) -> Tuple:
+        """
+        返回逻辑的马尔可夫状态, 由各规则的马尔可夫状态按规则顺序组成
+        """
+        return tuple(rule.markov_state() for rule in self.rules)
+
+    def load_markov_state(self, state: Tuple):
+        """
+        加载 markov_state 返回的马尔可夫状态
+        """
+        for rule, rule_state in zip(self.rules, state):
+            rule.load_markov_state(rule_state)
+
+    def set_random(self, rng: WishRandom):
+        """
+        设置规则使用的随机数源
+        """
+        self.ctx.random = rng
+
     def copy(self) -> "WishLogic":
         """
         创建深拷贝副本
@@ -0,0 +1,797 @@
+r"""
+Wishes v3.0
+-----------
+
+Module
+_
+    WishSimulator
+
+Description
+_
+    Wishes 批量模拟模块
+    以 NumPy 数组保存规则状态, 同时推进大量相互独立的模拟玩家
+    规则参数由 WishLogic 解析得到, 与单抽逻辑保持一致
+    *依赖 numpy
+"""
+
+
+import json
+import numpy as np
+from Const import *
+from Base import CardGroup
+from WishRule import (
+    BaseRule, WishLogic,
+    StarCounterRule, TypeStarCounterRule, StarProbabilityRule, TypeStarProbabilityRule,
+    StarPityRule, TypeStarPityRule, UpRule, UpTypeRule,
+    StarProbabilityIncreaseRule, StarProbabilityIntervalIncreaseRule,
+    FesRule, AppointRule, CaptureRule, CapturePityRule,
+)
+from typing import Dict, List, Optional, Tuple, Type
+
+
+# 实际抽出标签编号, 与 CardPool 中的标签优先级一致
+TAG_NAMES: Tuple[str, ...] = (TAG_STANDARD, TAG_UP, TAG_FES, TAG_APPOINT)
+TAG_IDS: Dict[str, int] = {tag: i for i, tag in enumerate(TAG_NAMES)}
+
+
+def weighted_index(rng: np.random.Generator, cum_weights: np.ndarray) -> np.ndarray:
+    """
+    按累积权重抽取下标, 与 random.choices(cum_weights=...) 的取值规则一致
+    cum_weights 为一维 (所有玩家共用) 或二维 (每个玩家一行)
+    返回长度为 cum_weights 行数 (一维时为 1) 的下标数组
+    *每行的权重总和须大于 0, 由建表处检查 (见 WishRule.check_cum_weights)
+    """
+    if cum_weights.ndim == 1:
+        cum_weights = cum_weights[None, :]
+    x = rng.random(cum_weights.shape[0]) * cum_weights[:, -1]
+    index = (cum_weights <= x[:, None]).sum(axis=1)
+    return np.minimum(index, cum_weights.shape[1] - 1)
+
+
+class VectorContext:
+    """
+    批量规则执行上下文
+    每个数组的第 i 项对应第 i 个模拟玩家
+    """
+    def __init__(self, players: int, rng: np.random.Generator) -> None:
+        self.players = players
+        self.rng = rng
+
+        # 当前抽逻辑结果, 星级 0 表示未决定, 类型 -1 表示未决定
+        self.star = np.zeros(players, dtype=np.int16)
+        self.type_ = np.full(players, -1, dtype=np.int16)
+        self.flags = np.zeros(players, dtype=np.uint8)
+
+        # 当前抽实际结果: 实际抽出标签编号, 抽出卡片是否属于 Appoint 组
+        self.real_tag = np.zeros(players, dtype=np.uint8)
+        self.packed_appoint = np.zeros(players, dtype=bool)
+
+        # 规则通讯桥梁
+        self.rule_bridge: Dict[str, "VectorRule"] = {}
+
+        # 类型名称 <-> 类型编号
+        self.type_names: List[str] = []
+        self.type_ids: Dict[str, int] = {}
+
+    def type_id(self, type_: str) -> int:
+        """
+        获取类型编号, 不存在时注册
+        """
+        if type_ not in self.type_ids:
+            self.type_ids[type_] = len(self.type_names)
+            self.type_names.append(type_)
+        return self.type_ids[type_]
+
+    def select(self, index: np.ndarray):
+        """
+        只保留 index 指定的玩家
+        """
+        self.players = index.size
+        self.star = self.star[index]
+        self.type_ = self.type_[index]
+        self.flags = self.flags[index]
+        self.real_tag = self.real_tag[index]
+        self.packed_appoint = self.packed_appoint[index]
+
+    def new_result(self, mask: np.ndarray, star: int):
+        """
+        对 mask 选中的玩家生成新的逻辑结果 (对应 ctx.result = LogicResult(star, ""))
+        """
+        self.star[mask] = star
+        self.type_[mask] = -1
+        self.flags[mask] = 0
+
+    def bernoulli(self, mask: np.ndarray, weight: int) -> np.ndarray:
+        """
+        对 mask 选中的玩家进行概率权重为 weight 的判定, 返回判定成功的玩家掩码
+        """
+        hit = np.zeros(self.players, dtype=bool)
+        index = np.flatnonzero(mask)
+        if index.size:
+            hit[index] = self.rng.integers(0, MAX_PROBABILITY, index.size) < weight
+        return hit
+
+    def choose_type(self, mask: np.ndarray, type_weights: Dict[str, int]):
+        """
+        对 mask 选中的玩家按类型权重决定类型
+        """
+        index = np.flatnonzero(mask)
+        if not index.size or not type_weights:
+            return
+        if len(type_weights) == 1:
+            self.type_[index] = self.type_id(next(iter(type_weights)))
+            return
+        type_ids = np.array([self.type_id(type_) for type_ in type_weights.keys()], dtype=np.int16)
+        cum_weights = np.cumsum(np.array(list(type_weights.values()), dtype=np.float64))
+        self.type_[index] = type_ids[weighted_index(self.rng, np.broadcast_to(cum_weights, (index.size, cum_weights.size)))]
+
+
+class VectorRule:
+    """
+    批量规则基类
+    与 WishRule 中的规则一一对应, 由已解析的规则对象构造
+    """
+    tag: str = "BaseRule"
+    # 规则持有的玩家状态 (星级/类型 -> 数组 的字典) 的属性名称
+    state_names: Tuple[str, ...] = ()
+
+    def __init__(self, rule: BaseRule, ctx: VectorContext) -> None:
+        self.rule = rule
+
+    def select(self, index: np.ndarray):
+        """
+        只保留 index 指定的玩家
+        *原地修改状态字典, 保证其他规则绑定的状态字典始终有效
+        """
+        def select_state(state: Dict):
+            for key, value in state.items():
+                if isinstance(value, dict):
+                    select_state(value)
+                else:
+                    state[key] = value[index]
+
+        for name in self.state_names:
+            select_state(getattr(self, name))
+
+    def set_bridge(self, ctx: VectorContext):
+        ctx.rule_bridge[self.tag] = self
+
+    def bind(self, ctx: VectorContext):
+        pass
+
+    def apply(self, ctx: VectorContext):
+        pass
+
+    def callback(self, ctx: VectorContext):
+        pass
+
+    @staticmethod
+    def flag_map(rule_dict: Dict[int, bool], players: int) -> Dict[int, np.ndarray]:
+        return {star: np.full(players, value, dtype=bool) for star, value in rule_dict.items()}
+
+    @staticmethod
+    def counter_map(rule_dict: Dict[int, int], players: int) -> Dict[int, np.ndarray]:
+        return {star: np.full(players, value, dtype=np.int32) for star, value in rule_dict.items()}
+
+
+class VectorStarCounterRule(VectorRule):
+    tag: str = StarCounterRule.tag
+    state_names: Tuple[str, ...] = ("star_counter",)
+
+    def __init__(self, rule: StarCounterRule, ctx: VectorContext) -> None:
+        super().__init__(rule, ctx)
+        self.star_counter = self.counter_map(rule.star_counter, ctx.players)
+
+    def callback(self, ctx: VectorContext):
+        for star, counter in self.star_counter.items():
+            counter += 1
+            counter[ctx.star == star] = 0
+
+
+class VectorTypeStarCounterRule(VectorRule):
+    tag: str = TypeStarCounterRule.tag
+    state_names: Tuple[str, ...] = ("type_star_counter",)
+
+    def __init__(self, rule: TypeStarCounterRule, ctx: VectorContext) -> None:
+        super().__init__(rule, ctx)
+        self.type_star_counter = {
+            star: self.counter_map(type_counter, ctx.players) # type: ignore
+            for star, type_counter in rule.type_star_counter.items()
+        }
+
+    def callback(self, ctx: VectorContext):
+        for star, type_counter in self.type_star_counter.items():
+            mask = ctx.star == star
+            for type_, counter in type_counter.items():
+                same = ctx.type_ == ctx.type_id(type_)
+                counter[mask & ~same] += 1
+                counter[mask & same] = 0
+
+
+class VectorStarProbabilityRule(VectorRule):
+    tag: str = StarProbabilityRule.tag
+
+    def __init__(self, rule: StarProbabilityRule, ctx: VectorContext) -> None:
+        super().__init__(rule, ctx)
+        self.stars = np.array(rule.stars, dtype=np.int16)
+        self.base_cum_weights = np.array(rule.base_cum_weights, dtype=np.float64)
+        # 当前抽的累积权重表及各玩家所用的行号, 由概率增长规则设置
+        # weight_table 为 None 时使用基础累积权重, weight_index 为 None 时第 i 行对应第 i 个玩家
+        self.weight_table: Optional[np.ndarray] = None
+        self.weight_index: Optional[np.ndarray] = None
+
+    def apply(self, ctx: VectorContext):
+        index = np.flatnonzero(ctx.star == 0)
+        if not index.size or not self.stars.size:
+            return
+        if self.weight_table is None:
+            cum_weights = np.broadcast_to(self.base_cum_weights, (index.size, self.stars.size))
+        elif self.weight_index is None:
+            cum_weights = self.weight_table[index]
+        else:
+            cum_weights = self.weight_table[self.weight_index[index]]
+        ctx.star[index] = self.stars[weighted_index(ctx.rng, cum_weights)]
+        ctx.type_[index] = -1
+        ctx.flags[index] = 0
+
+    def callback(self, ctx: VectorContext):
+        self.weight_table = None
+        self.weight_index = None
+
+
+class VectorStarProbabilityIncreaseRule(VectorRule):
+    """
+    对应 StarProbabilityIncreaseRule 与 StarProbabilityIntervalIncreaseRule
+    直接使用规则对象的星级累积权重表, 每抽只计算各玩家的表索引
+    权重表过大而未建表时, 按各星级的增长曲线逐抽计算
+    """
+    tag: str = StarProbabilityIncreaseRule.tag
+
+    def __init__(self, rule: StarProbabilityIncreaseRule, ctx: VectorContext) -> None:
+        super().__init__(rule, ctx)
+        self.tag = rule.tag
+        probability_rule: StarProbabilityRule = rule.probability_rule # type: ignore
+        self.stars = probability_rule.stars
+        self.base_probability = probability_rule.base_probability
+        self.axes = rule.weight_table.axes # type: ignore
+
+        self.table: Optional[np.ndarray] = None
+        if rule.weight_table.table is not None: # type: ignore
+            self.table = np.array(rule.weight_table.table, dtype=np.float64) # type: ignore
+
+        # 星级 -> 计数器取值对应的概率权重 (未归一化), 超出长度的计数器取最后一项
+        self.curves: Dict[int, np.ndarray] = {}
+        if self.table is None:
+            self.curves = {
+                star: np.array([
+                    self.base_probability[star] + rule.increase(star, counter + 1) # type: ignore
+                    for counter in range(length)
+                ], dtype=np.int64)
+                for star, length, _ in self.axes
+            }
+        self.star_counter: Dict[int, np.ndarray] = {}
+        self.probability_rule: Optional[VectorStarProbabilityRule] = None
+
+    def bind(self, ctx: VectorContext):
+        self.star_counter = ctx.rule_bridge[StarCounterRule.tag].star_counter # type: ignore
+        self.probability_rule = ctx.rule_bridge[StarProbabilityRule.tag] # type: ignore
+
+    def apply(self, ctx: VectorContext):
+        probability_rule: VectorStarProbabilityRule = self.probability_rule # type: ignore
+        if self.table is not None:
+            index = np.zeros(ctx.players, dtype=np.int64)
+            for star, length, stride in self.axes:
+                counter = self.star_counter.get(star)
+                if counter is not None:
+                    index += np.minimum(counter, length - 1) * stride
+            probability_rule.weight_table = self.table
+            probability_rule.weight_index = index
+            return
+
+        cum_weights = np.empty((ctx.players, len(self.stars)), dtype=np.float64)
+        total = np.zeros(ctx.players, dtype=np.int64)
+        for i, star in enumerate(self.stars):
+            if star in self.curves:
+                curve = self.curves[star]
+                counter = self.star_counter.get(star)
+                probability = curve[np.minimum(counter, curve.size - 1)] if counter is not None else curve[0]
+            else:
+                probability = self.base_probability[star]
+            total += np.clip(probability, 0, MAX_PROBABILITY - total)
+            cum_weights[:, i] = total
+        if self.stars and not total.all():
+            # 与 StarWeightTable 未建表时的逐抽检查一致
+            raise ValueError(f"{self.tag}: 概率权重总和必须大于 0, 而非 0")
+        probability_rule.weight_table = cum_weights
+        probability_rule.weight_index = None
+
+
+class VectorStarPityRule(VectorRule):
+    tag: str = StarPityRule.tag
+    state_names: Tuple[str, ...] = ("is_pity",)
+
+    def __init__(self, rule: StarPityRule, ctx: VectorContext) -> None:
+        super().__init__(rule, ctx)
+        self.star_pity = rule.star_pity
+        self.reset_lower_pity = rule.reset_lower_pity
+        self.is_pity = self.flag_map(rule.is_pity, ctx.players)
+        self.star_counter: Dict[int, np.ndarray] = {}
+
+    def bind(self, ctx: VectorContext):
+        self.star_counter = ctx.rule_bridge[StarCounterRule.tag].star_counter # type: ignore
+
+    def apply(self, ctx: VectorContext):
+        pending = np.ones(ctx.players, dtype=bool)
+        for star, threshold in self.star_pity.items():
+            self.is_pity[star][:] = False
+            counter = self.star_counter.get(star)
+            if counter is None:
+                hit = pending if threshold <= 1 else np.zeros(ctx.players, dtype=bool)
+            else:
+                hit = pending & (counter + 1 >= threshold)
+                counter[hit] = 0
+            ctx.new_result(hit, star)
+            self.is_pity[star][hit] = True
+            pending = pending & ~hit
+
+    def callback(self, ctx: VectorContext):
+        if not self.reset_lower_pity:
+            return
+        for star, counter in self.star_counter.items():
+            counter[ctx.star > star] = 0
+
+
+class VectorTypeStarProbabilityRule(VectorRule):
+    tag: str = TypeStarProbabilityRule.tag
+
+    def __init__(self, rule: TypeStarProbabilityRule, ctx: VectorContext) -> None:
+        super().__init__(rule, ctx)
+        self.type_probability = rule.type_probability
+
+    def apply(self, ctx: VectorContext):
+        undecided = ctx.type_ == -1
+        for star, type_weights in self.type_probability.items():
+            ctx.choose_type(undecided & (ctx.star == star), type_weights)
+
+
+class VectorTypeStarPityRule(VectorRule):
+    tag: str = TypeStarPityRule.tag
+    state_names: Tuple[str, ...] = ("is_pity",)
+
+    def __init__(self, rule: TypeStarPityRule, ctx: VectorContext) -> None:
+        super().__init__(rule, ctx)
+        self.type_pity = rule.type_pity
+        self.is_pity = {
+            star: self.flag_map(type_flags, ctx.players) # type: ignore
+            for star, type_flags in rule.is_pity.items()
+        }
+        self.type_star_counter: Dict[int, Dict[str, np.ndarray]] = {}
+
+    def bind(self, ctx: VectorContext):
+        self.type_star_counter = ctx.rule_bridge[TypeStarCounterRule.tag].type_star_counter # type: ignore
+
+    def apply(self, ctx: VectorContext):
+        for type_flags in self.is_pity.values():
+            for flag in type_flags.values():
+                flag[:] = False
+
+        for star, type_pity in self.type_pity.items():
+            mask = ctx.star == star
+            if not mask.any():
+                continue
+            type_counter = self.type_star_counter.get(star, {})
+
+            # 类型已决定, 重置该类型计数器
+            decided = mask & (ctx.type_ != -1)
+            for type_, counter in type_counter.items():
+                counter[decided & (ctx.type_ == ctx.type_id(type_))] = 0
+
+            # 通过保底决定类型
+            pending = mask & ~decided
+            for type_, threshold in type_pity.items():
+                counter = type_counter.get(type_)
+                if counter is None:
+                    hit = pending if threshold <= 0 else np.zeros(ctx.players, dtype=bool)
+                else:
+                    hit = pending & (counter >= threshold)
+                    counter[hit] = 0
+                ctx.type_[hit] = ctx.type_id(type_)
+                self.is_pity[star][type_][hit] = True
+                pending = pending & ~hit
+
+
+class VectorUpRule(VectorRule):
+    tag: str = UpRule.tag
+    state_names: Tuple[str, ...] = ("up_counter", "is_up_pity")
+
+    def __init__(self, rule: UpRule, ctx: VectorContext) -> None:
+        super().__init__(rule, ctx)
+        self.up_probability = rule.up_probability
+        self.up_pity = rule.up_pity
+        self.up_counter = self.counter_map(rule.up_counter, ctx.players)
+        self.is_up_pity = self.flag_map(rule.is_up_pity, ctx.players)
+
+    def apply(self, ctx: VectorContext):
+        for flag in self.is_up_pity.values():
+            flag[:] = False
+
+        for star, up_weight in self.up_probability.items():
+            mask = ctx.star == star
+            if not mask.any():
+                continue
+            counter = self.up_counter[star]
+
+            pity = np.zeros(ctx.players, dtype=bool)
+            if star in self.up_pity:
+                pity = mask & (counter >= self.up_pity[star])
+                ctx.flags[pity] |= FLAG_UP
+                counter[pity] = 0
+                self.is_up_pity[star][pity] = True
+
+            normal = mask & ~pity
+            ctx.flags[ctx.bernoulli(normal, up_weight)] |= FLAG_UP
+            is_up = (ctx.flags & FLAG_UP) != 0
+            counter[normal & is_up] = 0
+            counter[normal & ~is_up] += 1
+
+
+class VectorUpTypeRule(VectorRule):
+    tag: str = UpTypeRule.tag
+    state_names: Tuple[str, ...] = ("up_type_counter", "is_up_type_pity")
+
+    def __init__(self, rule: UpTypeRule, ctx: VectorContext) -> None:
+        super().__init__(rule, ctx)
+        self.up_type_probability = rule.up_type_probability
+        self.up_type_pity = rule.up_type_pity
+        self.up_type_counter = {
+            star: self.counter_map(type_counter, ctx.players)
+            for star, type_counter in rule.up_type_counter.items()
+        }
+        self.is_up_type_pity = {
+            star: self.flag_map(type_flags, ctx.players)
+            for star, type_flags in rule.is_up_type_pity.items()
+        }
+
+    def apply(self, ctx: VectorContext):
+        for type_flags in self.is_up_type_pity.values():
+            for flag in type_flags.values():
+                flag[:] = False
+
+        is_up = (ctx.flags & FLAG_UP) != 0
+        for star, type_weights in self.up_type_probability.items():
+            pending = is_up & (ctx.star == star)
+            if not pending.any():
+                continue
+
+            if star in self.up_type_pity:
+                type_counter = self.up_type_counter[star]
+                for counter in type_counter.values():
+                    counter[pending] += 1
+                for type_, counter in type_counter.items():
+                    hit = pending & (counter > self.up_type_pity[star][type_])
+                    ctx.type_[hit] = ctx.type_id(type_)
+                    counter[hit] = 0
+                    self.is_up_type_pity[star][type_][hit] = True
+                    pending = pending & ~hit
+
+            ctx.choose_type(pending, type_weights)
+
+
+class VectorFesRule(VectorRule):
+    tag: str = FesRule.tag
+
+    def __init__(self, rule: FesRule, ctx: VectorContext) -> None:
+        super().__init__(rule, ctx)
+        self.fes_probability = rule.fes_probability
+
+    def apply(self, ctx: VectorContext):
+        is_up = (ctx.flags & FLAG_UP) != 0
+        for star, fes_weight in self.fes_probability.items():
+            ctx.flags[ctx.bernoulli(is_up & (ctx.star == star), fes_weight)] |= FLAG_FES
+
+
+class VectorAppointRule(VectorRule):
+    tag: str = AppointRule.tag
+    state_names: Tuple[str, ...] = ("appoint_counter", "is_appoint_pity")
+
+    def __init__(self, rule: AppointRule, ctx: VectorContext) -> None:
+        super().__init__(rule, ctx)
+        self.appoint_pity = rule.appoint_pity
+        self.appoint_counter = self.counter_map(rule.appoint_counter, ctx.players)
+        self.is_appoint_pity = self.flag_map(rule.is_appoint_pity, ctx.players)
+
+    def apply(self, ctx: VectorContext):
+        is_up = (ctx.flags & FLAG_UP) != 0
+        for star, pity in self.appoint_pity.items():
+            self.is_appoint_pity[star][:] = False
+            mask = is_up & (ctx.star == star)
+            counter = self.appoint_counter[star]
+            hit = mask & (counter >= pity)
+            ctx.flags[hit] |= FLAG_APPOINT
+            counter[hit] = 0
+            self.is_appoint_pity[star][hit] = True
+            counter[mask & ~hit] += 1
+
+    def callback(self, ctx: VectorContext):
+        for star, counter in self.appoint_counter.items():
+            counter[ctx.packed_appoint & (ctx.star == star)] = 0
+
+
+class VectorCaptureRule(VectorRule):
+    tag: str = CaptureRule.tag
+
+    def __init__(self, rule: CaptureRule, ctx: VectorContext) -> None:
+        super().__init__(rule, ctx)
+        self.capture_probability = rule.capture_probability
+
+    def apply(self, ctx: VectorContext):
+        not_up = (ctx.flags & FLAG_UP) == 0
+        for star, weight in self.capture_probability.items():
+            ctx.flags[ctx.bernoulli(not_up & (ctx.star == star), weight)] |= FLAG_UP
+
+
+class VectorCapturePityRule(VectorRule):
+    tag: str = CapturePityRule.tag
+    state_names: Tuple[str, ...] = ("capture_pity_counter", "is_capture_pity")
+
+    def __init__(self, rule: CapturePityRule, ctx: VectorContext) -> None:
+        super().__init__(rule, ctx)
+        self.capture_pity = rule.capture_pity
+        self.capture_pity_counter = self.counter_map(rule.capture_pity_counter, ctx.players)
+        self.is_capture_pity = self.flag_map(rule.is_capture_pity, ctx.players)
+        self.up_rule: Optional[VectorUpRule] = None
+
+    def bind(self, ctx: VectorContext):
+        self.up_rule = ctx.rule_bridge.get(UpRule.tag) # type: ignore
+
+    def apply(self, ctx: VectorContext):
+        for star, pity in self.capture_pity.items():
+            self.is_capture_pity[star][:] = False
+            counter = self.capture_pity_counter[star]
+            hit = (ctx.star == star) & (counter >= pity)
+            ctx.flags[hit] |= FLAG_UP
+            self.is_capture_pity[star][hit] = True
+            counter[hit] = 0
+
+    def callback(self, ctx: VectorContext):
+        if self.up_rule is None:
+            return
+        is_up = (ctx.flags & FLAG_UP) != 0
+        for star, counter in self.capture_pity_counter.items():
+            if star not in self.up_rule.up_pity:
+                continue
+            mask = (ctx.star == star) & is_up
+            by_pity = mask & self.up_rule.is_up_pity[star]
+            counter[by_pity] += 1
+            counter[mask & ~by_pity] = 0
+
+
+# 规则标识符 -> 批量规则类
+VECTOR_RULES: Dict[str, Type[VectorRule]] = {
+    StarCounterRule.tag: VectorStarCounterRule,
+    TypeStarCounterRule.tag: VectorTypeStarCounterRule,
+    StarProbabilityRule.tag: VectorStarProbabilityRule,
+    TypeStarProbabilityRule.tag: VectorTypeStarProbabilityRule,
+    StarPityRule.tag: VectorStarPityRule,
+    TypeStarPityRule.tag: VectorTypeStarPityRule,
+    UpRule.tag: VectorUpRule,
+    UpTypeRule.tag: VectorUpTypeRule,
+    StarProbabilityIncreaseRule.tag: VectorStarProbabilityIncreaseRule,
+    StarProbabilityIntervalIncreaseRule.tag: VectorStarProbabilityIncreaseRule,
+    FesRule.tag: VectorFesRule,
+    AppointRule.tag: VectorAppointRule,
+    CaptureRule.tag: VectorCaptureRule,
+    CapturePityRule.tag: VectorCapturePityRule,
+}
+
+
+class SimulationResult:
+    """
+    批量模拟结果
+    聚合数据始终可用, 逐抽序列仅在 record 为 True 时保存
+    """
+    def __init__(self, players: int, draws: int, type_names: List[str]) -> None:
+        self.players = players
+        self.draws = draws
+        self.type_names = type_names
+
+        # 逐抽序列, 形状为 (players, draws)
+        self.stars: Optional[np.ndarray] = None     # 星级
+        self.types: Optional[np.ndarray] = None     # 类型编号, 对应 type_names, -1 表示无类型
+        self.tags: Optional[np.ndarray] = None      # 实际抽出标签编号, 对应 TAG_NAMES
+
+        # 聚合数据: 各玩家 (星级, 实际抽出标签) 的抽出次数
+        self.star_tag_counts: Dict[Tuple[int, str], np.ndarray] = {}
+
+    def count(self, star: Optional[int] = None, tag: Optional[str] = None) -> np.ndarray:
+        """
+        返回各玩家符合条件的抽出次数
+        """
+        res = np.zeros(self.players, dtype=np.int64)
+        for (s, t), counts in self.star_tag_counts.items():
+            if (star is None or s == star) and (tag is None or t == tag):
+                res += counts
+        return res
+
+    def rate(self, star: Optional[int] = None, tag: Optional[str] = None) -> float:
+        """
+        返回全体玩家符合条件的抽出频率
+        """
+        if not self.players or not self.draws:
+            return 0.0
+        return float(self.count(star, tag).sum()) / (self.players * self.draws)
+
+
+class PopulationSimulator:
+    """
+    批量模拟器
+    同时推进 players 个相互独立的模拟玩家, 所有玩家从同一逻辑状态出发
+    card_group 用于判断 UP/Fes 抽出的卡片是否同时属于 Appoint 组 (影响 AppointRule 回调)
+    未提供时, 仅实际抽出标签为 Appoint 的卡片视为 Appoint 卡片
+    """
+    def __init__(
+            self,
+            config: Dict,
+            players: int,
+            seed: Optional[int] = None,
+            state: Optional[Dict] = None,
+            card_group: Optional[CardGroup] = None
+            ) -> None:
+        logic = WishLogic(config)
+        if state:
+            logic.load_state(state)
+        self.name = logic.name
+
+        self.ctx = VectorContext(players, np.random.default_rng(seed))
+
+        self.rules: List[VectorRule] = []
+        for rule in logic.rules:
+            if rule.tag not in VECTOR_RULES:
+                raise ValueError(f"PopulationSimulator: 不支持的规则 '{rule.tag}'")
+            self.rules.append(VECTOR_RULES[rule.tag](rule, self.ctx))
+        for vector_rule in self.rules:
+            vector_rule.set_bridge(self.ctx)
+        for vector_rule in self.rules:
+            vector_rule.bind(self.ctx)
+
+        self.apply_steps = [r.apply for r, rule in zip(self.rules, logic.rules) if rule.use_apply]
+        self.callback_steps = [r.callback for r, rule in zip(self.rules, logic.rules) if rule.use_callback]
+
+        # (实际抽出标签编号, 类型编号, 星级) -> 抽出卡片同时属于 Appoint 组的概率
+        self.appoint_share: Dict[Tuple[int, int, int], float] = {}
+        if card_group is not None:
+            self.appoint_share = self.count_appoint_share(card_group)
+
+        self.draws = 0
+
+    @staticmethod
+    def from_file(logic_config_file: str, players: int, seed: Optional[int] = None) -> "PopulationSimulator":
+        """
+        从抽卡逻辑配置文件创建模拟器 (与 WishLogicSystem.load_logic 使用相同的配置)
+        """
+        with open(logic_config_file, "r", encoding="utf-8") as f:
+            config = json.load(f)
+        return PopulationSimulator(config, players, seed)
+
+    def count_appoint_share(self, card_group: CardGroup) -> Dict[Tuple[int, int, int], float]:
+        res = {}
+        appoint_group = card_group.single_tag_card_groups.get(TAG_APPOINT)
+        if appoint_group is None:
+            return res
+        for tag in (TAG_UP, TAG_FES):
+            group = card_group.single_tag_card_groups.get(tag)
+            if group is None:
+                continue
+            for type_, star_dict in group.cards.items():
+                for star, card_dict in star_dict.items():
+                    cards = [card for card in card_dict.values() if not group.has_exclude_card(card)]
+                    if not cards:
+                        continue
+                    shared = sum(
+                        1 for card in cards
+                        if card.content in appoint_group.card_contents(card.type, card.star)
+                    )
+                    if shared:
+                        res[(TAG_IDS[tag], self.ctx.type_id(type_), star)] = shared / len(cards)
+        return res
+
+    def step(self):
+        """
+        所有玩家各抽一次, 结果保存在 ctx 中
+        """
+        ctx = self.ctx
+        ctx.star[:] = 0
+        ctx.type_[:] = -1
+        ctx.flags[:] = 0
+
+        for apply in self.apply_steps:
+            apply(ctx)
+
+        # 按 Appoint > Fes > UP > Standard 的优先级决定实际抽出标签
+        real_tag = ctx.real_tag
+        real_tag[:] = TAG_IDS[TAG_STANDARD]
+        real_tag[(ctx.flags & FLAG_UP) != 0] = TAG_IDS[TAG_UP]
+        real_tag[(ctx.flags & FLAG_FES) != 0] = TAG_IDS[TAG_FES]
+        real_tag[(ctx.flags & FLAG_APPOINT) != 0] = TAG_IDS[TAG_APPOINT]
+
+        ctx.packed_appoint = real_tag == TAG_IDS[TAG_APPOINT]
+        for (tag_id, type_id, star), share in self.appoint_share.items():
+            mask = (real_tag == tag_id) & (ctx.type_ == type_id) & (ctx.star == star)
+            ctx.packed_appoint |= mask & (ctx.rng.random(ctx.players) < share)
+
+        for callback in self.callback_steps:
+            callback(ctx)
+
+        self.draws += 1
+
+    def run(self, draws: int, record: bool = True) -> SimulationResult:
+        """
+        所有玩家各抽 draws 次
+        record 为 True 时保存逐抽序列, 否则只保存聚合数据
+        """
+        ctx = self.ctx
+        result = SimulationResult(ctx.players, draws, ctx.type_names)
+        if record:
+            result.stars = np.zeros((ctx.players, draws), dtype=np.int16)
+            result.types = np.zeros((ctx.players, draws), dtype=np.int16)
+            result.tags = np.zeros((ctx.players, draws), dtype=np.uint8)
+
+        for i in range(draws):
+            self.step()
+            if record:
+                result.stars[:, i] = ctx.star # type: ignore
+                result.types[:, i] = ctx.type_ # type: ignore
+                result.tags[:, i] = ctx.real_tag # type: ignore
+            codes = ctx.star.astype(np.int64) * len(TAG_NAMES) + ctx.real_tag
+            for code in np.flatnonzero(np.bincount(codes)):
+                key = (int(code) // len(TAG_NAMES), TAG_NAMES[code % len(TAG_NAMES)])
+                if key not in result.star_tag_counts:
+                    result.star_tag_counts[key] = np.zeros(ctx.players, dtype=np.int32)
+                result.star_tag_counts[key] += codes == code
+
+        return result
+
+    def select(self, index: np.ndarray):
+        """
+        只保留 index 指定的玩家
+        """
+        self.ctx.select(index)
+        for vector_rule in self.rules:
+            vector_rule.select(index)
+
+    def pulls_until(self, star: int, tag: Optional[str] = None, max_draws: int = 10_000) -> np.ndarray:
+        """
+        推进所有玩家, 直到每个玩家都抽出指定星级 (且带有指定标签) 的卡片
+        返回各玩家首次抽出时的抽数, 在 max_draws 内未抽出的玩家记为 0
+        *TAG_UP 包含 Fes 和 Appoint 卡片, TAG_STANDARD 仅指常驻卡片
+        *已抽出的玩家会被移出模拟器, 结束后模拟器中只剩未抽出的玩家
+        """
+        ctx = self.ctx
+        res = np.zeros(ctx.players, dtype=np.int32)
+        player_ids = np.arange(ctx.players)             # 模拟器中的玩家 -> 原始玩家编号
+        done = np.zeros(ctx.players, dtype=bool)        # 模拟器中已抽出的玩家
+
+        for i in range(1, max_draws + 1):
+            self.step()
+            hit = ~done & (ctx.star == star)
+            if tag == TAG_STANDARD:
+                hit &= ctx.real_tag == TAG_IDS[TAG_STANDARD]
+            elif tag == TAG_UP:
+                hit &= (ctx.flags & FLAG_UP) != 0
+            elif tag is not None:
+                hit &= ctx.real_tag == TAG_IDS[tag]
+            res[player_ids[hit]] = i
+            done |= hit
+
+            # 已抽出的玩家较多时, 将其移出模拟器
+            done_count = int(done.sum())
+            if done_count == ctx.players:
+                self.select(np.flatnonzero(~done))
+                break
+            if done_count * 4 >= ctx.players:
+                keep = np.flatnonzero(~done)
+                self.select(keep)
+                player_ids = player_ids[keep]
+                done = np.zeros(ctx.players, dtype=bool)
+
+        return res
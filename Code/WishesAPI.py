@@ -11,9 +11,9 @@ class SystemGroup:
                 cards_dir_config = json.load(f)
 
             # 初始化管理系统
-            self.card_system = CardSystem(CARDS_DIR, cards_dir_config)
-            self.standard_group_system = StandardGroupSystem(RESIDENT_GROUP_DIR, self.card_system)
-            self.card_group_system = CardGroupSystem(CARD_GROUP_DIR, self.card_system, self.standard_group_system)
+            self.card_system, self.standard_group_system, self.card_group_system = SystemCache(
+                SYSTEM_CACHE_FILE, CARDS_DIR, cards_dir_config, RESIDENT_GROUP_DIR, CARD_GROUP_DIR
+            ).load_systems()
             self.wish_logic_system = WishLogicSystem(LOGIC_CONFIG_DIR)
             self.card_pool_system = CardPoolSystem(CARD_POOL_DIR, self.card_group_system, self.wish_logic_system)
 
@@ -2,13 +2,14 @@ from ManageSystem import *
 from GameAdaptationModule import *
 from ImageManageModule import *
 from WishesQmlAPI import QCard, QCardPool, QWishResult, CardQueryParams
-from PySide2.QtCore import Property, Slot, Signal, QObject, QAbstractListModel
+from PySide2.QtCore import Property, Slot, Signal, QObject, QAbstractListModel, QTimer
 
 from typing import cast
-from typing import List
+from typing import Dict, List
 import json
 import sys
 import traceback
+import datetime as dt
 
 Property = cast(type, Property)
 Slot = cast(type, Slot)
@@ -26,17 +27,31 @@ class Backend(QObject):
         self._init_system()
         self.q_card_pool_list = [QCardPool(cp, self) for cp in self.card_pool_system.get_card_pools()]
 
+        # 定时应用数据目录中的文件变化
+        self.hot_reload_timer = QTimer(self)
+        self.hot_reload_timer.setInterval(HOT_RELOAD_INTERVAL)
+        self.hot_reload_timer.timeout.connect(self._hot_reload)
+        if not self.init_error_flag:
+            self.hot_reload_timer.start()
+
 
     def _init_system(self):
         try:
             with open(CARDS_DIR_CONFIG_FILE, "r", encoding="utf-8") as f:
                 cards_dir_config = json.load(f)
 
-            self.card_system = CardSystem(CARDS_DIR, cards_dir_config)
-            self.standard_group_system = StandardGroupSystem(RESIDENT_GROUP_DIR, self.card_system)
-            self.card_group_system = CardGroupSystem(CARD_GROUP_DIR, self.card_system, self.standard_group_system)
+            self.card_system, self.standard_group_system, self.card_group_system = SystemCache(
+                SYSTEM_CACHE_FILE, CARDS_DIR, cards_dir_config, RESIDENT_GROUP_DIR, CARD_GROUP_DIR
+            ).load_systems()
             self.wish_logic_system = WishLogicSystem(LOGIC_CONFIG_DIR)
             self.card_pool_system = CardPoolSystem(CARD_POOL_DIR, self.card_group_system, self.wish_logic_system)
+            self.hot_reloader = HotReloader(
+                self.card_system,
+                self.standard_group_system,
+                self.card_group_system,
+                self.wish_logic_system,
+                self.card_pool_system
+            )
 
             self.star_rarity_adapter = StarRarityAdapter(STAR_RARITY_MAP_FILE)
 
@@ -51,6 +66,30 @@ class Backend(QObject):
             self.init_error_flag = True
             self.init_error_content = ("Wishes 管理系统初始化错误", msg)
 
+    @Slot()
+    def close(self):
+        """
+        程序退出前调用: 停止热重载, 等待抽卡记录写入完成
+        """
+        self.hot_reload_timer.stop()
+        if self.init_error_flag:
+            return
+        self.hot_reloader.close()
+        self.card_pool_system.close()
+
+    def _hot_reload(self):
+        try:
+            changes = self.hot_reloader.reload()
+        except:
+            print("Backend Error:")
+            traceback.print_exc()
+            return
+
+        if "card_pools" in changes:
+            self.q_card_pool_list = [QCardPool(cp, self) for cp in self.card_pool_system.get_card_pools()]
+            self.cardPoolCountChanged.emit()
+            self.cardPoolListChanged.emit()
+
     @Property(str, notify=versionChanged)
     def version(self) -> str:
         return VERSION
@@ -167,15 +206,12 @@ class Backend(QObject):
     def card_system_get_cards(self, params: CardQueryParams) -> List[QCard]:
         try:
             cards = self.card_system.get_cards(
-                params._game, params._type, params._star, params._content
+                params._game, params._type, params._star, params._content, params._attribute, params._profession,
+                sort_key=params._sort_key, reverse=params._reverse, start=params._start, num=params._num
             )
-            if params._start >= len(cards):
-                return []
-            lst = cards[params._start:-1 if (params._start + params._num >= len(cards)) else (params._start + params._num)]
-            lst.sort(key=lambda x: x.star, reverse=params._reverse)
             res = [
                 QCard(PackedCard(card), self)
-                for card in lst
+                for card in cards
             ]
             return res
             
@@ -185,6 +221,41 @@ class Backend(QObject):
         
         return []
     
+    @Slot(CardQueryParams, result="QVariantMap")
+    def card_system_get_card_page(self, params: CardQueryParams) -> Dict:
+        """
+        按游标分页查询卡片, 返回 {"cards": 卡片列表, "cursor": 下一页游标 (没有下一页时为空字符串)}
+        """
+        try:
+            page = self.card_system.get_card_page(
+                params._game, params._type, params._star, params._content, params._attribute, params._profession,
+                sort_key=params._sort_key, reverse=params._reverse,
+                cursor=params._cursor or None, num=params._num if params._num >= 0 else 20
+            )
+            return {
+                "cards": [QCard(PackedCard(card), self) for card in page.cards],
+                "cursor": page.cursor or "",
+            }
+        except:
+            msg = traceback.format_exc()
+            self.errorHappened.emit("", msg) # type: ignore
+        
+        return {"cards": [], "cursor": ""}
+
+    @Slot(CardQueryParams, result=list)
+    def card_system_search_cards(self, params: CardQueryParams) -> List[QCard]:
+        try:
+            cards = self.card_system.search_cards(
+                params.content, params._game, params._type, params._star, params._attribute, params._profession,
+                start=params._start, num=params._num
+            )
+            return [QCard(PackedCard(card), self) for card in cards]
+        except:
+            msg = traceback.format_exc()
+            self.errorHappened.emit("", msg) # type: ignore
+        
+        return []
+    
     @Slot(result=list)
     def card_system_get_card_list(self) -> List[QCard]:
         try:
@@ -237,6 +308,44 @@ class Backend(QObject):
         
         return []
     
+    @Slot(QCardPool, "QVariantMap", result="QVariantMap")
+    def card_pool_get_records(self, q_card_pool: QCardPool, params: Dict) -> Dict:
+        """
+        按游标分页查询卡池的抽卡记录 (从最新的记录开始)
+        params: star / type / tag / content 过滤条件 (为空时不过滤), cursor 上一页游标, num 每页数量
+        返回 {"records": 记录列表, "cursor": 下一页游标 (没有下一页时为空字符串)}
+        """
+        try:
+            page = q_card_pool.card_pool.recorder.query_details(
+                star=params.get("star") or None,
+                type_=params.get("type") or None,
+                tag=params.get("tag") or None,
+                content=params.get("content") or None,
+                cursor=params.get("cursor") or None,
+                num=int(params.get("num", 20)),
+                reverse=True
+            )
+            return {
+                "records": [
+                    {
+                        "order": order,
+                        "time": str(dt.datetime.fromtimestamp(timestamp)),
+                        "tag": tag,
+                        "game": game,
+                        "type": type_,
+                        "star": star,
+                        "content": content,
+                    }
+                    for _, (order, timestamp, tag, game, type_, star, content) in page.rows
+                ],
+                "cursor": page.cursor or "",
+            }
+        except:
+            msg = traceback.format_exc()
+            self.errorHappened.emit("", msg) # type: ignore
+
+        return {"records": [], "cursor": ""}
+
     # @Slot(QCardPool, result=QWishResult)
     # def card_pool_wish_one(self, q_card_pool: QCardPool) -> QWishResult:
     #     try:
@@ -1,6 +1,6 @@
 from PySide2.QtCore import QObject, Property, Slot, Signal
 from dataclasses import dataclass
-from typing import cast, Optional
+from typing import cast, Optional, Union
 from Base import *
 from CardPool import CardPool
 
@@ -20,6 +20,8 @@ class CardQueryParams(QObject):
     _start: int = 0
     _num: int = -1
     _reverse: bool = False
+    _sort_key: str = "star"
+    _cursor: str = ""
 
     def __init__(self, parent: Optional[QObject]= None) -> None:
         super().__init__(parent)
@@ -105,6 +107,24 @@ class CardQueryParams(QObject):
         if self._reverse != value:
             self._reverse = value
 
+    @Property(str)
+    def sortKey(self) -> str:
+        return self._sort_key
+    
+    @sortKey.setter
+    def _w_sort_key(self, value: str):
+        if value != self._sort_key:
+            self._sort_key = value
+    
+    @Property(str)
+    def cursor(self) -> str:
+        return self._cursor
+    
+    @cursor.setter
+    def _w_cursor(self, value: str):
+        if value != self._cursor:
+            self._cursor = value
+
 
 class QCard(QObject):
     contentChanged = Signal()
@@ -171,7 +191,7 @@ class QWishResult(QObject):
     maxStarChanged = Signal()
     countChanged = Signal()
 
-    def __init__(self, wish_result: WishResult, parent: Optional[QObject] = None) -> None:
+    def __init__(self, wish_result: Union[WishResult, ColumnarWishResult], parent: Optional[QObject] = None) -> None:
         super().__init__(parent)
         self.wish_result = wish_result
     
@@ -187,7 +207,7 @@ class QWishResult(QObject):
     def get(self, index: int) -> QCard:
         if not 0 <= index < self.wish_result.count:
             return QCard(PackedCard(Card.none()), self)
-        return QCard(self.wish_result.cards[index], self)
+        return QCard(self.wish_result.get(index), self)
 
 
 class QCardPool(QObject):
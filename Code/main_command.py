@@ -6,6 +6,7 @@ import colorama
 import os
 import json
 import traceback
+import datetime as dt
 
 
 launch_info = f"""
@@ -43,6 +44,8 @@ class Program:
             "w": self.wish_one,
             "wt": self.wish_ten,
             "wc": self.wish_count,
+            "wca": self.wish_aggregate,
+            "wcar": self.wish_aggregate_record,
             "lgs": self.lgs,
             "cgs": self.cgs,
             "cps": self.cps,
@@ -59,6 +62,7 @@ class Program:
             "rs": self.reset,
             "clr": self.clear,
             "rd": self.rd,
+            "rdl": self.rdl,
             "rds": self.record_set,
             "exit": self.exit,
         }
@@ -68,6 +72,8 @@ class Program:
             "w": ((), "单抽"),
             "wt": ((), "十连"),
             "wc": (("int times",), "指定次数抽卡"),
+            "wca": (("int times",), "指定次数抽卡, 只显示统计结果, 不改变当前卡池 (逻辑状态和抽卡记录)"),
+            "wcar": (("int times",), "指定次数抽卡并写入抽卡记录, 只显示统计结果"),
             "lgs": ((), "列出所有可用抽卡逻辑"),
             "cgs": ((), "列出所有可用卡组"),
             "cps": ((), "列出所有可用卡池"),
@@ -84,6 +90,7 @@ class Program:
             "rs": ((), "重置当前卡池"),
             "clr": ((), "清除当前卡池的抽卡记录"),
             "rd": ((), "查看当前卡池的抽卡记录"),
+            "rdl": ((), "分页查看当前卡池的详细抽卡记录"),
             "rds": (("on / off",), "设置自动记录策略"),
             "exit": ((), "退出程序"),
         }
@@ -98,11 +105,18 @@ class Program:
             with open(CARDS_DIR_CONFIG_FILE, "r", encoding="utf-8") as f:
                 cards_dir_config = json.load(f)
             
-            self.card_system = CardSystem(CARDS_DIR, cards_dir_config)
-            self.standard_group_system = StandardGroupSystem(RESIDENT_GROUP_DIR, self.card_system)
-            self.card_group_system = CardGroupSystem(CARD_GROUP_DIR, self.card_system, self.standard_group_system)
+            self.card_system, self.standard_group_system, self.card_group_system = SystemCache(
+                SYSTEM_CACHE_FILE, CARDS_DIR, cards_dir_config, RESIDENT_GROUP_DIR, CARD_GROUP_DIR
+            ).load_systems()
             self.wish_logic_system = WishLogicSystem(LOGIC_CONFIG_DIR)
             self.card_pool_system = CardPoolSystem(CARD_POOL_DIR, self.card_group_system, self.wish_logic_system)
+            self.hot_reloader = HotReloader(
+                self.card_system,
+                self.standard_group_system,
+                self.card_group_system,
+                self.wish_logic_system,
+                self.card_pool_system
+            )
 
             self.star_rarity_adaptor = StarRarityAdapter(STAR_RARITY_MAP_FILE)
 
@@ -117,6 +131,12 @@ class Program:
     def mainloop(self):
         while True:
             msg = input(">>> ")
+            try:
+                self.hot_reload()
+            except:
+                print(colorama.Fore.RED + " 热重载失败 ".center(50, "-"), "\n详细信息:")
+                traceback.print_exc()
+                print(colorama.Fore.RESET)
             if not msg.strip():
                 continue
 
@@ -163,6 +183,30 @@ class Program:
         
         print("-" * (max_command_l + max_para_l + max_desc_l + 10))
 
+    def hot_reload(self):
+        # 应用数据目录中的文件变化
+        changes = self.hot_reloader.reload()
+        if not changes:
+            return
+
+        category_names = {
+            "cards": "卡片",
+            "standard_groups": "常驻卡组",
+            "card_groups": "卡组",
+            "logics": "抽卡逻辑",
+            "card_pools": "卡池",
+        }
+        for category, names in changes.items():
+            self.report_tip(f"已重新加载{category_names[category]}: {', '.join(sorted(names))}")
+
+        if self.current_card_pool:
+            name = self.current_card_pool.name
+            if self.card_pool_system.has_card_pool(name):
+                self.current_card_pool = self.card_pool_system.get_card_pool(name)
+            else:
+                self.current_card_pool = None
+                self.report_tip("当前卡池已被移除")
+
     def report_error(self, msg: str):
         print(colorama.Fore.RED + (f" Error: {msg} ").center(50, "-") + colorama.Fore.RESET)
     
@@ -173,6 +217,12 @@ class Program:
         print(colorama.Fore.YELLOW + (f" {msg} ").center(50, "-") + colorama.Fore.RESET)
 
     def exit(self):
+        hot_reloader = getattr(self, "hot_reloader", None)
+        if hot_reloader is not None:
+            hot_reloader.close()
+        card_pool_system = getattr(self, "card_pool_system", None)
+        if card_pool_system is not None:
+            card_pool_system.close()
         print(" Wishes 已退出 ".center(50, "-"))
         exit()
 
@@ -224,13 +274,49 @@ class Program:
                     self.report_tip("已取消抽卡")
                     return
 
-        result = self.current_card_pool.wish_count(count)
-        for packed_card in result.cards:
+        for packed_card in self.current_card_pool.wish_stream(count):
             self.counter += 1
             print(colorama.Fore.MAGENTA + f"{self.counter}. {packed_card}" + colorama.Style.RESET_ALL)
 
         self.is_saved = False
 
+    def wish_aggregate_record(self, para_list: List[str]):
+        self.wish_aggregate(para_list, record=True)
+
+    def wish_aggregate(self, para_list: List[str], record: bool = False):
+        """
+        record: 是否写入抽卡记录, 写入时逐抽生成记录, 内存占用和耗时随抽数增长 (见 CardPool.wish_aggregate)
+                不写入时在逻辑副本上抽卡, 不改变当前卡池
+        """
+        times: str = para_list[0]
+        if not times.isdigit():
+            self.report_type_error("int")
+            return
+
+        if not self.current_card_pool:
+            self.report_tip("当前未选择卡池")
+            return
+
+        count = int(times)
+        if count <= 0:
+            self.report_error("抽卡次数必须大于 0")
+            return
+
+        result = self.current_card_pool.wish_aggregate(count, record=record)
+        if record:
+            self.counter += count
+            self.is_saved = False
+
+        print(" 抽卡统计 ".center(50, "-"))
+        print(f"总抽数: {result.count}")
+        for star in sorted(result.gaps.keys(), reverse=True):
+            star_count = result.count_of(star=star)
+            print(f"{star} 星: {star_count} ({star_count / result.count:.4%}), 平均间隔 {result.mean_gap(star):.2f} 抽")
+            for (s, type_, tag), n in sorted(result.counts.items()):
+                if s == star:
+                    print(f"    {tag} {type_}: {n}")
+        print("-" * 50)
+
     def lgs(self):
         print("-" * 20 + "\n所有可用抽卡逻辑:\n")
         counter = 1
@@ -507,6 +593,68 @@ class Program:
             "-" * width
         )))
 
+    def select_option(self, title: str, prompt: str, options: list) -> Optional[object]:
+        """
+        从编号列表中选择一项, 选择 0 (不选择) 时返回 None
+        """
+        options = ["不选择"] + options
+        print("\n".join((
+            title,
+            " | ".join([f"{num}. {option}" for num, option in enumerate(options)]),
+            "-" * 20
+        )))
+        while True:
+            s = input(f"{prompt} >>> ")
+            if s.isdigit() and 0 <= int(s) < len(options):
+                return options[int(s)] if int(s) else None
+
+    def rdl(self):
+        if not self.current_card_pool:
+            self.report_tip("当前未选择卡池")
+            return
+
+        recorder = self.current_card_pool.recorder
+        if recorder.auto_to_file:
+            recorder.compact()
+        else:
+            self.report_tip("自动记录已禁用, 未保存的记录不会显示")
+
+        print("查询抽卡记录".center(50, "-"))
+        t_star = self.select_option("选择星级: (数字编号)", "star", recorder.all_stars())
+        t_type = self.select_option("选择类型: (数字编号)", "type", recorder.all_types())
+        t_tag = self.select_option("选择标签: (数字编号)", "tag", recorder.all_tags())
+        content = input("卡片内容 (留空不选择) >>> ").strip() or None
+
+        num = 20
+        cursors: List[Optional[str]] = [None]     # 已浏览各页的游标
+        while True:
+            page = recorder.query_details(
+                star=t_star, type_=t_type, tag=t_tag, content=content, # type: ignore
+                cursor=cursors[-1], num=num, reverse=True
+            )
+            print("\n".join((
+                f" 第 {len(cursors)} 页 (从最新的记录开始) ".center(50, "-"),
+                *[
+                    f"{order}. {dt.datetime.fromtimestamp(timestamp)} [{tag}] {game} {type_} {star} 星 {card_content}"
+                    for _, (order, timestamp, tag, game, type_, star, card_content) in page.rows
+                ],
+                "-" * 20,
+                "回车: 下一页 | p: 上一页 | q: 退出"
+            )))
+            if not page.rows:
+                print("没有符合条件的记录")
+
+            while True:
+                m = input("page >>> ").strip().lower()
+                if m == "q":
+                    return
+                if m == "p" and len(cursors) > 1:
+                    cursors.pop()
+                    break
+                if not m and page.cursor is not None:
+                    cursors.append(page.cursor)
+                    break
+
     def record_set(self, para_list: List[str]):
         if not self.current_card_pool:
             self.report_tip("当前未选择卡池")
@@ -25,6 +25,7 @@ def main():
 
     backend = Backend()
     engine.rootContext().setContextProperty("backend", backend)
+    app.aboutToQuit.connect(backend.close)
     
     engine.load(QUrl(MAIN_QML_FILE))
 
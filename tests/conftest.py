@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 模块使用 Code 目录下的平级导入
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Code"))
@@ -0,0 +1,87 @@
+import random
+
+import pytest
+
+import Base
+import WishRule
+from Base import Card, CardGroup, SingleTagCardGroup, WishAggregate
+from CardPool import CardPool
+from Const import *
+from WishRule import WishLogic
+
+LOGIC = {
+    "name": "interval-weapon",
+    "rules": {
+        "StarPityRule": {"star_pity": {"5": 80, "4": 10}, "reset_lower_pity": True},
+        "StarProbabilityIntervalIncreaseRule": {"star_increase": {"5": [[63, 700], [70, 100]], "4": [[8, 3000]]}},
+        "StarProbabilityRule": {"star_probability": {"5": 70, "4": 600, "3": 9330}},
+        "UpRule": {"up_probability": {"5": 7500, "4": 7500}, "up_pity": {"5": 1, "4": 1}},
+        "AppointRule": {"appoint_pity": {"5": 2}},
+        "TypeStarProbabilityRule": {"type_probability": {"5": {"Weapon": 10000}, "4": {"Weapon": 10000}, "3": {"Weapon": 10000}}},
+        "StarCounterRule": {"star_list": [5, 4, 3]},
+    },
+}
+
+
+def make_pool(tmp_path, name):
+    standard = SingleTagCardGroup("standard")
+    up = SingleTagCardGroup("up")
+    appoint = SingleTagCardGroup("appoint")
+    for star, num in ((3, 6), (4, 4), (5, 3)):
+        for i in range(num):
+            card = Card(f"w{star}-{i}", "G", star, "Weapon", "fire")
+            standard.add_card(card)
+            if star >= 4 and i == 0:
+                up.add_card(card)
+            if star == 5 and i == 1:
+                appoint.add_card(card)
+    group = CardGroup("group", standard)
+    group.add_tag_group(TAG_UP, up)
+    group.add_tag_group(TAG_APPOINT, appoint)
+    group.set_exclude(True)
+    return CardPool(name, WishLogic(LOGIC), group, str(tmp_path / name), auto_record_to_file=False)
+
+
+def test_aggregate_matches_per_draw_results(tmp_path):
+    random.seed(3)
+    expected = WishAggregate()
+    for packed_card in make_pool(tmp_path, "a").wish_stream(5000):
+        expected.add(packed_card)
+
+    random.seed(3)
+    result = make_pool(tmp_path, "b").wish_aggregate(5000)
+    assert (result.counts, result.card_counts, result.gaps) == (expected.counts, expected.card_counts, expected.gaps)
+    assert result.count_of(star=5, tag=TAG_APPOINT)
+
+
+def test_aggregate_leaves_pool_untouched(tmp_path, monkeypatch):
+    pool = make_pool(tmp_path, "pool")
+    pool.wish_count(37)
+    state = pool.get_logic_state()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("per-draw object allocated")
+    monkeypatch.setattr(Base, "PackedCard", fail)
+    monkeypatch.setattr(WishRule, "LogicResult", fail)
+    result = pool.wish_aggregate(2000)
+    monkeypatch.undo()
+
+    assert result.count == 2000
+    assert pool.get_logic_state() == state
+    assert pool.recorder.total_counter == 37
+
+
+def test_aggregate_record_advances_pool(tmp_path):
+    pool = make_pool(tmp_path, "pool")
+    result = pool.wish_aggregate(100, record=True)
+    assert result.count == 100
+    assert pool.recorder.total_counter == 100
+
+
+def test_unknown_tags_are_rejected():
+    before = dict(TAG_FLAGS)
+    with pytest.raises(ValueError):
+        Base.TagSet.from_tags(["custom"])
+    with pytest.raises(ValueError):
+        CardGroup("group", SingleTagCardGroup("standard")).add_tag_group("custom")
+    assert TAG_FLAGS == before
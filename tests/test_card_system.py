@@ -0,0 +1,55 @@
+import json
+import os
+
+import pytest
+
+from Base import Card
+from ManageSystem import CardSystem
+
+
+@pytest.fixture
+def card_system(tmp_path):
+    """
+    G / Role 配置了 3, 4, 6 星, 其中 6 星没有卡片; G / Weapon 只配置了 3 星
+    """
+    for type_, star, num in (("Role", 3, 4), ("Role", 4, 2), ("Weapon", 3, 3)):
+        dir_path = tmp_path / "G" / type_ / f"Star{star}"
+        dir_path.mkdir(parents=True)
+        for i in range(num):
+            card = {"content": f"{type_}{star}-{i}", "game": "G", "star": star, "type": type_, "attribute": "fire",
+                    "title": "", "profession": "", "image_path": ""}
+            with open(dir_path / f"{i}.json", "w", encoding="utf-8") as f:
+                json.dump(card, f)
+    return CardSystem(str(tmp_path), {"G": {"Role": [3, 4, 6], "Weapon": [3]}}, workers=1)
+
+
+def test_configured_empty_star_returns_no_cards(card_system):
+    assert card_system.get_cards(star=6) == []
+    assert card_system.get_cards(game="G", type_="Role", star=6) == []
+    assert card_system.get_card_page(star=6).cards == []
+
+
+def test_star_configured_only_for_other_type_is_ignored(card_system):
+    # 与原实现一致: 星级只在所选类型的配置范围内判断
+    assert len(card_system.get_cards(type_="Weapon", star=4)) == 3
+
+
+def test_unconfigured_values_are_ignored(card_system):
+    assert len(card_system.get_cards(star=7)) == 9
+    assert len(card_system.get_cards(game="X")) == 9
+    assert len(card_system.get_cards(type_="Role", star=4)) == 2
+
+
+def test_filtered_search_pages_filter_once(card_system, monkeypatch):
+    calls = []
+    query_ids = card_system.query_ids
+    monkeypatch.setattr(card_system, "query_ids", lambda filters: calls.append(filters) or query_ids(filters))
+
+    pages = [card_system.search_cards("Role", star=3, start=start, num=1) for start in range(5)]
+    assert [card for page in pages for card in page] == card_system.search_cards("Role", star=3)
+    assert sorted(card.content for page in pages for card in page) == [f"Role3-{i}" for i in range(4)]
+    assert len(calls) == 1
+
+    card_system.add_card(Card("Role3-new", "G", 3, "Role", "fire"))
+    assert [card.content for card in card_system.search_cards("Role3-new", star=3)] == ["Role3-new"]
+    assert len(calls) == 2
@@ -0,0 +1,42 @@
+import threading
+import time
+
+from FileWatchModule import PollingWatcher
+
+
+def wait_changes(watcher, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        res = watcher.changes()
+        if res:
+            return res
+        time.sleep(0.01)
+    return set()
+
+
+def test_polling_watcher_scans_in_background(tmp_path, monkeypatch):
+    sub = tmp_path / "sub"
+    sub.mkdir()
+    old = sub / "old.json"
+    old.write_text("{}")
+    watcher = PollingWatcher([str(tmp_path)], interval=0.01)
+    try:
+        scan_threads = set()
+        scan = watcher.snapshot
+
+        def snapshot():
+            scan_threads.add(threading.current_thread())
+            return scan()
+        monkeypatch.setattr(watcher, "snapshot", snapshot)
+
+        new = sub / "new.json"
+        new.write_text("{}")
+        old.unlink()
+        (tmp_path / "ignored.txt").write_text("")
+        res = wait_changes(watcher)
+        res |= wait_changes(watcher, 0.1)
+        assert res == {str(new), str(old)}
+        assert threading.current_thread() not in scan_threads
+    finally:
+        watcher.close()
+    assert not watcher.thread.is_alive()
@@ -0,0 +1,89 @@
+import json
+import os
+
+import pytest
+
+import WishRecorder
+from Base import Card, PackedCard
+from Const import *
+
+
+def packed_cards(num):
+    cards = [Card(f"c{star}", "G", star, "Role" if star == 5 else "Weapon", "fire") for star in (3, 4, 5)]
+    return [PackedCard(cards[2] if i % 50 == 49 else cards[1] if i % 10 == 9 else cards[0]) for i in range(num)]
+
+
+def interrupt_compaction(recorder, monkeypatch):
+    """
+    在追加记录文件之后、写入快照之前中断压缩
+    """
+    def crash(self, profile_data):
+        raise KeyboardInterrupt
+    with monkeypatch.context() as m:
+        m.setattr(WishRecorder.JournalWishRecorder, "_write_snapshot", crash)
+        with pytest.raises(KeyboardInterrupt):
+            recorder.compact()
+
+
+@pytest.mark.parametrize("details_format", [DETAILS_FORMAT_CSV, DETAILS_FORMAT_BINARY])
+def test_first_compaction_crash_does_not_duplicate_rows(tmp_path, monkeypatch, details_format):
+    record_dir = str(tmp_path / "record")
+    recorder = WishRecorder.create_recorder(
+        record_dir, 5, storage=RECORDER_STORAGE_JOURNAL, details_format=details_format
+    )
+    for packed_card in packed_cards(3000):
+        recorder.add_record(packed_card)
+    recorder.flush()
+    interrupt_compaction(recorder, monkeypatch)
+
+    recovered = WishRecorder.create_recorder(
+        record_dir, 5, storage=RECORDER_STORAGE_JOURNAL, details_format=details_format
+    )
+    recovered.compact()
+    assert recovered.total_counter == 3000
+    assert len(recovered.details_rows()) == 3000
+    assert len(recovered.query_interval(num=-1).rows) == 60
+    with open(os.path.join(record_dir, "interval.csv"), encoding="utf-8") as f:
+        assert len(f.readlines()) == 60
+
+
+def test_initial_snapshot_records_committed_sizes(tmp_path):
+    record_dir = str(tmp_path / "record")
+    WishRecorder.create_recorder(record_dir, 5, storage=RECORDER_STORAGE_JOURNAL)
+    with open(os.path.join(record_dir, "profile.json"), encoding="utf-8") as f:
+        snapshot = json.load(f)
+    assert (snapshot["journal_seq"], snapshot["details_size"], snapshot["interval_size"]) == (0, 0, 0)
+
+
+def test_missing_committed_sizes_with_pending_journal_refuses_compaction(tmp_path):
+    record_dir = str(tmp_path / "record")
+    recorder = WishRecorder.create_recorder(record_dir, 5, storage=RECORDER_STORAGE_JOURNAL)
+    for packed_card in packed_cards(20):
+        recorder.add_record(packed_card)
+    recorder.flush()
+
+    profile_path = os.path.join(record_dir, "profile.json")
+    with open(profile_path, encoding="utf-8") as f:
+        snapshot = json.load(f)
+    del snapshot["details_size"]
+    with open(profile_path, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f)
+
+    reopened = WishRecorder.create_recorder(record_dir, 5, storage=RECORDER_STORAGE_JOURNAL)
+    assert reopened.total_counter == 20
+    with pytest.raises(ValueError):
+        reopened.compact()
+
+
+def test_profile_directory_switched_to_journal_keeps_history(tmp_path):
+    record_dir = str(tmp_path / "record")
+    recorder = WishRecorder.create_recorder(record_dir, 5)
+    for packed_card in packed_cards(30):
+        recorder.add_record(packed_card)
+    recorder.close()
+
+    journal = WishRecorder.create_recorder(record_dir, 5, storage=RECORDER_STORAGE_JOURNAL)
+    for packed_card in packed_cards(30):
+        journal.add_record(packed_card)
+    journal.compact()
+    assert len(journal.details_rows()) == 60
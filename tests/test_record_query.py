@@ -0,0 +1,52 @@
+import pytest
+
+import WishRecorder
+from Base import Card, PackedCard
+from Const import *
+
+
+def packed_cards(num):
+    cards = [Card(f"c{star}", "G", star, "Role" if star == 5 else "Weapon", "fire") for star in (3, 4, 5)]
+    return [PackedCard(cards[2] if i % 50 == 49 else cards[1] if i % 10 == 9 else cards[0]) for i in range(num)]
+
+
+@pytest.fixture(params=[DETAILS_FORMAT_CSV, DETAILS_FORMAT_BINARY])
+def recorder(tmp_path, request):
+    recorder = WishRecorder.create_recorder(str(tmp_path / "record"), 5, details_format=request.param)
+    for packed_card in packed_cards(5000):
+        recorder.add_record(packed_card)
+    recorder.flush()
+    return recorder
+
+
+def test_query_zero_rows(recorder):
+    page = recorder.query_details(star=5, num=0)
+    assert page.rows == []
+    assert recorder.query_details(star=5, cursor=page.cursor, num=1).rows[0][0] == 49
+
+    page = recorder.query_interval(num=0, reverse=True)
+    assert page.rows == []
+    assert recorder.query_interval(cursor=page.cursor, num=1, reverse=True).rows[0][0] == 99
+
+
+def test_index_follows_writes_without_rereading(recorder, monkeypatch):
+    index = recorder.details_index
+    assert len(index) == 5000
+    assert index.tail.end == index.source.size()
+    assert recorder.interval_index.tail.end == recorder.interval_index.source.size()
+
+    def fail(start, end):
+        raise AssertionError("index re-read the rows it was given")
+    monkeypatch.setattr(index.source, "read", fail)
+    for packed_card in packed_cards(100):
+        recorder.add_record(packed_card)
+    recorder.flush()
+    assert len(index) == 5100
+
+
+def test_index_built_on_write_matches_rebuilt_index(recorder):
+    for index in (recorder.details_index, recorder.interval_index):
+        written = [block.to_json() for block in index.blocks + [index.tail]]
+        index.reset()
+        index.update()
+        assert [block.to_json() for block in index.blocks + [index.tail]] == written
@@ -0,0 +1,72 @@
+import json
+import os
+
+import pytest
+
+import WishRecorder
+from Base import Card, PackedCard
+from Const import *
+
+
+def packed_cards(num):
+    cards = [Card(f"c{star}", "G", star, "Role" if star == 5 else "Weapon", "fire") for star in (3, 4, 5)]
+    return [PackedCard(cards[2] if i % 50 == 49 else cards[1] if i % 10 == 9 else cards[0]) for i in range(num)]
+
+
+def fail_once(monkeypatch, cls, name):
+    """
+    令 cls.name 在下一次调用时先执行原方法再抛出 OSError (模拟追加到一半时写入失败)
+    """
+    original = getattr(cls, name)
+
+    def failing(self, *args, **kwargs):
+        monkeypatch.setattr(cls, name, original)
+        original(self, *args, **kwargs)
+        raise OSError("disk full")
+    monkeypatch.setattr(cls, name, failing)
+
+
+@pytest.mark.parametrize("details_format", [DETAILS_FORMAT_CSV, DETAILS_FORMAT_BINARY])
+@pytest.mark.parametrize("async_write", [False, True])
+def test_failed_batch_is_retried_without_duplicates(tmp_path, monkeypatch, details_format, async_write):
+    recorder = WishRecorder.create_recorder(
+        str(tmp_path / "record"), 5, async_write=async_write, details_format=details_format
+    )
+    cards = packed_cards(200)
+    fail_once(monkeypatch, WishRecorder.WishRecorder, "_write_interval")
+    errors = 0
+    for packed_card in cards[:100]:
+        try:
+            recorder.add_record(packed_card)    # 同步写入时在此抛出
+        except OSError:
+            errors += 1
+    try:
+        recorder.flush()                        # 后台写入时在此抛出
+    except OSError:
+        errors += 1
+    assert errors == 1
+
+    for packed_card in cards[100:]:
+        recorder.add_record(packed_card)
+    recorder.flush()
+    assert [row[0] for _, row in recorder.details_rows()] == list(range(1, 201))
+    assert len(recorder.query_interval(num=-1).rows) == 4
+    with open(os.path.join(recorder.dir, "profile.json"), encoding="utf-8") as f:
+        assert json.load(f)["total"] == 200
+    recorder.close()
+
+
+def test_failed_journal_compaction_keeps_batch(tmp_path, monkeypatch):
+    monkeypatch.setattr(WishRecorder, "JOURNAL_COMPACT_SIZE", 1)
+    recorder = WishRecorder.create_recorder(str(tmp_path / "record"), 5, storage=RECORDER_STORAGE_JOURNAL)
+    cards = packed_cards(100)
+    fail_once(monkeypatch, WishRecorder.JournalWishRecorder, "_write_interval")
+    for packed_card in cards[:50]:
+        recorder.add_record(packed_card)
+    recorder.flush()    # 压缩失败, 记录已写入日志
+
+    for packed_card in cards[50:]:
+        recorder.add_record(packed_card)
+    recorder.flush()
+    assert [row[0] for _, row in recorder.details_rows()] == list(range(1, 101))
+    assert len(recorder.query_interval(num=-1).rows) == 2
@@ -0,0 +1,26 @@
+import pytest
+
+from WishRule import StarProbabilityRule, StarWeightTable, TypeStarProbabilityRule
+
+
+def test_zero_total_star_probability_is_rejected():
+    with pytest.raises(ValueError):
+        StarProbabilityRule({"5": 0, "4": 0})
+
+
+def test_zero_total_type_probability_is_rejected():
+    with pytest.raises(ValueError):
+        TypeStarProbabilityRule({"5": {"Role": 10000}, "4": {"Role": 0, "Weapon": 0}})
+    # 没有可选类型的星级不参与抽取
+    assert 4 not in TypeStarProbabilityRule({"5": {"Role": 10000}, "4": {}}).type_choices
+
+
+def test_star_weight_table_rejects_zero_total_row():
+    # 5 星权重每抽减少 10, 第 10 抽起权重总和为 0
+    def increase(star, counter):
+        return -10 * counter
+    with pytest.raises(ValueError):
+        StarWeightTable({5: 100}, increase, {5: (1, -10)})
+
+    table = StarWeightTable({5: 100, 3: 1}, increase, {5: (1, -10)})
+    assert table.lookup({5: 20}) == (0, 1)